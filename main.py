@@ -1,27 +1,59 @@
 import os
-import shutil
-import uuid
-import requests
 import re
-import random
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException, File, UploadFile
+import json
+import asyncio
+import httpx
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Optional
+from fastapi import FastAPI, HTTPException, File, UploadFile, Depends, Query, Header, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from groq import Groq
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+from utils import dice, effects, simulator
+from utils.encounter import roll_initiative
+from utils.monster_db import DAMAGE_TYPES, attack_profile, defense_profile, load_monster_db, summary as monster_summary
+from utils.beyond import BeyondClient, BeyondError
+from utils.campaigns import Campaign, CampaignRegistry, DEFAULT_CAMPAIGN
+from utils.fog import encode_mask
+from utils.state_db import open_state_db
+from utils.tiles import TileBuilder
+from utils.uploads import (ImmutableStaticFiles, UploadError, find_stored, store_upload,
+                           MAX_MAP_BYTES, MAX_TOKEN_BYTES)
+from utils.response_cache import ResponseCache, make_key
 
 # Környezeti változók betöltése
 load_dotenv()
 
+# ==========================================
+# ALKALMAZÁS INICIALIZÁLÁSA
+# ==========================================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(evict_idle_campaigns())
+    yield
+    sweeper.cancel()
+    # Leállításkor a pool kapcsolatait rendesen lezárjuk
+    if groq_client:
+        await groq_client.close()
+    await beyond_client.close()
+    tile_builder.shutdown()
+    simulator.shutdown()
+    # A még ki nem írt (write-behind) módosítások mentése
+    ai_cache.flush()
+    campaigns.flush()
+    state_db.close()
+
 app = FastAPI(
     title="D&D Kalandmester API - Final Backend",
     description="VTT Motor, AI Asszisztens, Lore Vault és Kockadobó rendszer",
-    version="1.2.0"
+    version="1.2.0",
+    lifespan=lifespan
 )
 
-# CORS beállítások
+# CORS (Frontend engedélyezése)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], 
@@ -30,9 +62,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Groq kliens
+# Groq kliens felébresztése (aszinkron, közös kapcsolat-poollal, hogy ne blokkolja az event loopot)
+GROQ_MODEL = "llama-3.3-70b-versatile"
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "30"))              # mp / kérés
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))  # egyszerre futó AI hívások
+
 api_key = os.getenv("GROQ_API_KEY")
-groq_client = Groq(api_key=api_key) if api_key else None
+if api_key:
+    groq_client = AsyncGroq(
+        api_key=api_key,
+        timeout=httpx.Timeout(GROQ_TIMEOUT, connect=5.0),
+        max_retries=1,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=GROQ_MAX_CONCURRENCY * 2,
+                                max_keepalive_connections=GROQ_MAX_CONCURRENCY)))
+else:
+    groq_client = None
+    print("❌ HIBA: Nem találom a GROQ_API_KEY-t a .env fájlban!")
+
+# A többi asztal kérései akkor se várjanak, ha egyszerre tucatnyi AI hívás fut
+llm_slots = asyncio.Semaphore(GROQ_MAX_CONCURRENCY)
+
+# Válasz-cache a determinisztikus (alacsony hőmérsékletű) módokhoz, pl. szabálykérdések
+ai_cache = ResponseCache(
+    max_size=int(os.getenv("AI_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("AI_CACHE_TTL", str(24 * 3600))),
+    path=os.getenv("AI_CACHE_FILE") or None)
 
 # ==========================================
 # MAPPÁK ÉS STATIKUS FÁJLOK
@@ -45,24 +100,60 @@ LORE_DIR = os.path.join(BASE_UPLOAD, "lore")
 for d in [MAPS_DIR, TOKENS_DIR, LORE_DIR]:
     os.makedirs(d, exist_ok=True)
 
-# Statikus elérhetőség a böngészőnek
-app.mount("/maps", StaticFiles(directory=MAPS_DIR), name="maps")
-app.mount("/tokens", StaticFiles(directory=TOKENS_DIR), name="tokens")
+# Statikus elérhetőség a böngészőnek (a nem alapértelmezett kampányok fájljai almappában: /maps/<kampány>/...)
+# A fájlnév a tartalom sha256-ja, így a válasz "immutable": a böngésző / CDN örökre cache-elheti
+app.mount("/maps", ImmutableStaticFiles(directory=MAPS_DIR), name="maps")
+app.mount("/tokens", ImmutableStaticFiles(directory=TOKENS_DIR), name="tokens")
+
+# Nagy térképek deep-zoom csempézése a háttérben (a kliens csak a látható csempéket tölti le)
+tile_builder = TileBuilder(max_workers=int(os.getenv("TILE_WORKERS", "2")))
+
+def tiles_dir(campaign: Campaign, sha256: str) -> str:
+    return os.path.join(campaign.maps_dir, "tiles", sha256)
+
+# Kaland Kódexe (Lore Vault): kampányonként külön fájl és BM25 index (lásd utils/campaigns.py);
+# a promptba csak a releváns részletek kerülnek, legfeljebb ennyi tokennyi
+LORE_TOKEN_BUDGET = int(os.getenv("LORE_TOKEN_BUDGET", "2000"))
+
+# Helyi SRD szörny adatbázis (offline, a dnd5eapi.co helyett)
+monster_db = load_monster_db()
+
+# D&D Beyond kliens (közös kapcsolat-pool, karakterenkénti ETag cache)
+beyond_client = BeyondClient()
+
+# Tartós tárolás: SQLite (WAL), késleltetett kötegelt írással (CAMPAIGN_DB)
+state_db = open_state_db()
 
-LORE_FILE = os.path.join(LORE_DIR, "campaign_lore.txt")
-if not os.path.exists(LORE_FILE):
-    with open(LORE_FILE, "w", encoding="utf-8") as f:
-        f.write("--- D&D KAMPÁNY KÓDEXE ---\n")
+# Asztalonkénti (kampányonkénti) állapot: harc, dobások, Kódex, feltöltések.
+# Csak az aktív asztalok vannak memóriában; a CAMPAIGN_IDLE_TTL ideje tétleneket kiürítjük,
+# a következő kérésnél a StateDB-ből / a kampány mappájából töltődnek vissza.
+campaigns = CampaignRegistry(
+    state_db, BASE_UPLOAD,
+    idle_ttl=float(os.getenv("CAMPAIGN_IDLE_TTL", "1800")),
+    # Korlátos gyűrűpuffer: egy hétvégés con-asztal több százezer dobása se nőjön a végtelenségig
+    roll_capacity=int(os.getenv("ROLL_HISTORY_CAP", "100000")),
+    lore_header="--- D&D KAMPÁNY KÓDEXE ---\n")
+CAMPAIGN_SWEEP_INTERVAL = float(os.getenv("CAMPAIGN_SWEEP_INTERVAL", "60"))
 
-# Memória alapú tárolás (Harc és Dobások)
-active_encounter = []
-roll_history = []
+async def evict_idle_campaigns():
+    while True:
+        await asyncio.sleep(CAMPAIGN_SWEEP_INTERVAL)
+        campaigns.evict_idle()
+
+async def get_campaign(campaign: str = Query(DEFAULT_CAMPAIGN, description="Kampány / asztal azonosító")) -> Campaign:
+    """Minden asztal-függő végpont a ?campaign= paraméter szerinti kampányon dolgozik."""
+    try:
+        return await campaigns.load(campaign)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # ==========================================
-# ADATMODELLEK
+# ADATMODELLEK (Kommunikáció a React-tel)
 # ==========================================
 class PromptRequest(BaseModel):
     prompt: str
+    stream: bool = False  # True: a tokenek Server-Sent Events-ként jönnek, ahogy a Groq adja őket
+    no_cache: bool = False  # True: a válasz-cache megkerülése (friss válasz kényszerítése)
 
 class AIResponse(BaseModel):
     result: str
@@ -71,6 +162,17 @@ class DiceRollRequest(BaseModel):
     expression: str
     player_name: str = "KM"
 
+class DiceBatchRequest(BaseModel):
+    expressions: List[str]
+    player_name: str = "KM"
+
+class DiceDistributionRequest(BaseModel):
+    expression: str
+    dc: Optional[int] = None
+
+class PartyImportRequest(BaseModel):
+    character_ids: List[str]
+
 class Combatant(BaseModel):
     id: str
     name: str
@@ -79,161 +181,160 @@ class Combatant(BaseModel):
     max_hp: int
     ac: int
     initiative: int = 0
+    dexterity: int = 10  # Holtversenynél a nagyobb ÜGY lép előbb
+    reach: int = 5  # láb; ennyin belül kap alkalmi támadást, aki elhagyja
+    # Szimulációhoz (ha hiányzik, szörnynél az SRD adatbázisból jön)
+    attack_bonus: Optional[int] = None
+    damage: Optional[str] = None
+    attacks: int = 1
+    # Mentődobásokhoz (ha hiányzik, szörnynél az SRD adatbázisból jön)
+    save_bonus: Optional[Dict[str, int]] = None  # pl. {"dex": 2}
+    resistances: Optional[List[str]] = None  # sebzéstípusok, pl. ["fire"]
+    immunities: Optional[List[str]] = None
+    vulnerabilities: Optional[List[str]] = None
+
+class CombatantUpdate(BaseModel):
+    name: Optional[str] = None
+    is_player: Optional[bool] = None
+    hp: Optional[int] = None
+    max_hp: Optional[int] = None
+    ac: Optional[int] = None
+    initiative: Optional[int] = None
+    dexterity: Optional[int] = None
+    reach: Optional[int] = None
+    attack_bonus: Optional[int] = None
+    damage: Optional[str] = None
+    attacks: Optional[int] = None
+    save_bonus: Optional[Dict[str, int]] = None
+    resistances: Optional[List[str]] = None
+    immunities: Optional[List[str]] = None
+    vulnerabilities: Optional[List[str]] = None
+
+class MonsterGroup(BaseModel):
+    monster: str  # SRD név vagy slug, pl. "Goblin"
+    count: int = 1
+    per_group: bool = False  # egy közös kezdeményezés az egész csoportnak
+    name: Optional[str] = None  # alapból az SRD név; a példányok sorszámot kapnak ("Goblin 3")
+
+class SaveEffect(BaseModel):
+    target_ids: List[str]
+    damage: str  # pl. "8d6"
+    ability: Optional[Literal["str", "dex", "con", "int", "wis", "cha"]] = None  # mentő nélkül mindenkit ér
+    dc: Optional[int] = None
+    damage_type: Optional[str] = None  # pl. "fire"
+    half_on_success: bool = True
+    shared_damage: bool = True  # egy sebzésdobás mindenkire (5e), különben célpontonként
+
+class SimCreature(BaseModel):
+    name: str
+    is_player: bool
+    hp: int
+    ac: int
+    attack_bonus: int
+    damage: str  # pl. "1d6+2"
+    attacks: int = 1
+    initiative_bonus: int = 0
+
+class SimulationRequest(BaseModel):
+    trials: int = 10_000
+    max_rounds: int = Field(simulator.MAX_ROUNDS, ge=1, le=simulator.MAX_ROUNDS)
+    creatures: Optional[List[SimCreature]] = None  # alapból a harc jelenlegi résztvevői
+    seed: Optional[int] = None
+
+class GridRequest(BaseModel):
+    cell_px: int  # ennyi pixel egy 5 láb széles négyzet a térképen
+
+class FogOperation(BaseModel):
+    action: Literal["reveal", "hide"]
+    shape: Literal["rect", "circle", "polygon", "all"]
+    # Pixel-koordináták az eredeti térképen; kör: (x0, y0) a középpont
+    x0: float = 0
+    y0: float = 0
+    x1: float = 0
+    y1: float = 0
+    radius: float = 0
+    points: List[List[float]] = []
+
+class WallsRequest(BaseModel):
+    walls: List[List[float]]  # [x0, y0, x1, y1] pixelben, pl. a VTT "Vonal (Távolság/Fal)" vonalai
+
+class TokenPlacement(BaseModel):
+    x: float  # A token középpontja pixelben
+    y: float
+    darkvision: Optional[int] = None  # láb
+    light: Optional[int] = None  # a token által hordozott fény sugara lábban (fáklya: 20)
+
+class LightingRequest(BaseModel):
+    lighting: Literal["bright", "dark"]
+
+class AoeTemplate(BaseModel):
+    shape: Literal["circle", "cone", "line", "cube"]
+    x: float  # Kiindulópont pixelben (kör: a középpont)
+    y: float
+    size: float  # láb: kör sugara, kúp / vonal hossza, kocka éle
+    direction: float = 0  # fok, 0 = kelet, az óramutató járásával
+    width: float = 5  # láb, csak vonalnál
+
+class VisionReveal(BaseModel):
+    tokens: Optional[List[str]] = None  # alapból az összes token
 
 # ==========================================
-# VÉGPONTOK
+# AI SEGÉDFÜGGVÉNYEK
 # ==========================================
+def sse_event(token: str) -> str:
+    return f"data: {json.dumps({'token': token}, ensure_ascii=False)}\n\n"
 
-# 1. KOCKADOBÓ (History-val)
-@app.post("/api/dice/roll")
-async def roll_dice(req: DiceRollRequest):
+async def sse_tokens(messages: list, temperature: float, cache_key: Optional[str] = None):
+    """Groq stream darabjainak továbbítása SSE eseményekként (data: {"token": ...})."""
+    parts = []
     try:
-        match = re.match(r"(\d+)d(\d+)(?:\+(\d+))?", req.expression.lower())
-        if not match:
-            raise HTTPException(status_code=400, detail="Példa: 1d20+5")
-        
-        count, sides = int(match.group(1)), int(match.group(2))
-        mod = int(match.group(3)) if match.group(3) else 0
-        
-        rolls = [random.randint(1, sides) for _ in range(count)]
-        total = sum(rolls) + mod
-        
-        result = {
-            "player": req.player_name,
-            "expression": req.expression,
-            "rolls": rolls,
-            "total": total
-        }
-        roll_history.insert(0, result) # Legfrissebb felül
-        return result
+        async with llm_slots:
+            completion = await groq_client.chat.completions.create(
+                messages=messages, model=GROQ_MODEL, temperature=temperature, stream=True)
+            async for chunk in completion:
+                token = chunk.choices[0].delta.content
+                if token:
+                    parts.append(token)
+                    yield sse_event(token)
+        if cache_key:
+            ai_cache.set(cache_key, "".join(parts))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-# 2. VTT FELTÖLTÉSEK
-@app.post("/api/vtt/upload-{type}")
-async def upload_file(type: str, file: UploadFile = File(...)):
-    target_dir = MAPS_DIR if type == "map" else TOKENS_DIR
-    ext = file.filename.split(".")[-1]
-    fname = f"{uuid.uuid4()}.{ext}"
-    fpath = os.path.join(target_dir, fname)
-    
-    with open(fpath, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    return {"url": f"http://localhost:8000/{type}s/{fname}", "name": fname}
-
-# 3. AI LORE MASTER & IMPROVISE
-@app.post("/api/ai/{mode}", response_model=AIResponse)
-async def ai_assistant(mode: str, req: PromptRequest):
-    if not groq_client: raise HTTPException(status_code=500, detail="Groq API kulcs hiányzik!")
-    
-    lore = ""
-    if os.path.exists(LORE_FILE):
-        with open(LORE_FILE, "r", encoding="utf-8") as f: lore = f.read()
-
-    prompts = {
-        "lore-master": f"Te egy D&D Kalandmester vagy. Lore tudásod: {lore}. Válaszolj a játékosnak!",
-        "improvise": f"Adj 3 kreatív ötletet a szituációra a kampány hangulatában! Lore: {lore}",
-        "rules": "Profi D&D 5e szabálybíró vagy. Idézz szabálykönyvből magyarul!"
-    }
-
-    completion = groq_client.chat.completions.create(
-        messages=[{"role": "system", "content": prompts.get(mode, "Segíts a játékban!")}, 
-                  {"role": "user", "content": req.prompt}],
-        model="llama-3.3-70b-versatile", temperature=0.7)
-    
-    return AIResponse(result=completion.choices[0].message.content)
-
-# 4. ENCOUNTER & BEYOND
-@app.get("/api/beyond/character/{character_id}")
-async def import_beyond(character_id: str):
-    url = f"https://character-service.dndbeyond.com/character/v5/character/{character_id}"
-    resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0"})
-    if resp.status_code != 200: raise HTTPException(status_code=404, detail="Hiba a Beyond elérésekor.")
-    
-    d = resp.json().get("data", {})
-    hp = d.get("baseHitPoints", 0) + d.get("bonusHitPoints", 0)
-    return {"combatant": {"id": f"beyond_{character_id}", "name": d.get("name"), "hp": hp, "max_hp": hp, "ac": 10, "is_player": True}}
-
-@app.post("/api/encounter/add")
-async def add_combatant(c: Combatant):
-    active_encounter.append(c.dict())
-    return {"status": "success"}
-
-@app.get("/api/encounter/current")
-async def get_encounter():
-    return {"combatants": sorted(active_encounter, key=lambda x: x["initiative"], reverse=True)}
-
-@app.delete("/api/encounter/clear")
-async def clear_encounter():
-    active_encounter.clear()
-    return {"message": "Table cleared"}
-
-@app.get("/")
-async def health(): return {"status": "active", "dice": "ready"}
-
-# ==========================================
-# ALKALMAZÁS INICIALIZÁLÁSA
-# ==========================================
-app = FastAPI(
-    title="D&D Kalandmester API",
-    description="Backend motor VTT-hez, AI-hoz, Kaland Kódexhez és Encounter Trackerhez",
-    version="1.0.0"
-)
-
-# CORS (Frontend engedélyezése)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], 
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Groq kliens felébresztése
-api_key = os.getenv("GROQ_API_KEY")
-if api_key:
-    groq_client = Groq(api_key=api_key)
-else:
-    print("❌ HIBA: Nem találom a GROQ_API_KEY-t a .env fájlban!")
-
-# ==========================================
-# MAPPÁK ÉS FÁJLOK BEÁLLÍTÁSA
-# ==========================================
-# Térképek (VTT)
-UPLOAD_DIR = "uploads/maps"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-app.mount("/maps", StaticFiles(directory=UPLOAD_DIR), name="maps")
-
-# Kaland Kódexe (Lore Vault)
-LORE_DIR = "uploads/lore"
-os.makedirs(LORE_DIR, exist_ok=True)
-LORE_FILE = os.path.join(LORE_DIR, "campaign_lore.txt")
-
-if not os.path.exists(LORE_FILE):
-    with open(LORE_FILE, "w", encoding="utf-8") as f:
-        f.write("A kaland kódexe. Itt gyűlnek a Kalandmester titkos jegyzetei:\n\n")
-
-# Encounter memória (Jelenleg futó harc)
-active_encounter = []
-
-# ==========================================
-# ADATMODELLEK (Kommunikáció a React-tel)
-# ==========================================
-class PromptRequest(BaseModel):
-    prompt: str
-
-class AIResponse(BaseModel):
-    result: str
-
-class Combatant(BaseModel):
-    id: str
-    name: str
-    is_player: bool
-    hp: int
-    max_hp: int
-    ac: int
-    initiative: int = 0
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+    yield "event: done\ndata: {}\n\n"
+
+async def sse_cached(text: str):
+    yield sse_event(text)
+    yield "event: done\ndata: {}\n\n"
+
+def sse_response(body) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def chat_response(system_prompt: str, req: PromptRequest, temperature: float,
+                        cache_mode: Optional[str] = None):
+    """Groq hívás; req.stream esetén azonnal streamelt válasz, különben egy AIResponse.
+    cache_mode megadásakor a választ a válasz-cache-ből adjuk / oda mentjük."""
+    cache_key = None
+    if cache_mode and not req.no_cache:
+        cache_key = make_key(cache_mode, GROQ_MODEL, req.prompt)
+        cached = ai_cache.get(cache_key)
+        if cached is not None:
+            return sse_response(sse_cached(cached)) if req.stream else AIResponse(result=cached)
+
+    if not groq_client:
+        raise RuntimeError("Groq API kulcs hiányzik!")
+    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": req.prompt}]
+    if req.stream:
+        return sse_response(sse_tokens(messages, temperature, cache_key))
+    async with llm_slots:
+        completion = await groq_client.chat.completions.create(
+            messages=messages, model=GROQ_MODEL, temperature=temperature)
+    result = completion.choices[0].message.content
+    if cache_key:
+        ai_cache.set(cache_key, result)
+    return AIResponse(result=result)
 
 # ==========================================
 # 1. ALAP VÉGPONTOK ÉS VTT TÉRKÉP
@@ -243,49 +344,260 @@ async def root():
     return {"message": "A D&D Kalandmester Backend aktív és bevetésre kész. 🎲"}
 
 @app.post("/api/vtt/upload-map")
-async def upload_map(file: UploadFile = File(...)):
-    """Térkép feltöltése a virtuális asztalra."""
+async def upload_map(file: UploadFile = File(...), campaign: Campaign = Depends(get_campaign)):
+    """Térkép feltöltése a virtuális asztalra (tartalom-címzett: ugyanaz a kép csak egyszer tárolódik)."""
     try:
-        file_extension = file.filename.split(".")[-1]
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        return {
-            "message": "Térkép feltöltve!", 
-            "url": f"http://localhost:8000/maps/{unique_filename}", 
-            "filename": unique_filename
-        }
+        stored = await store_upload(file, campaign.maps_dir, MAX_MAP_BYTES)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    tiles = tile_builder.schedule(os.path.join(campaign.maps_dir, stored.filename), tiles_dir(campaign, stored.sha256))
+    return {
+        "message": "Ez a térkép már fent van!" if stored.deduplicated else "Térkép feltöltve!",
+        "url": f"http://localhost:8000{campaign.url_path('maps', stored.filename)}",
+        "filename": stored.filename,
+        "sha256": stored.sha256,
+        "size": stored.size,
+        "deduplicated": stored.deduplicated,
+        "tiles": tiles
+    }
+
+@app.post("/api/vtt/upload-{type}")
+async def upload_file(type: str, file: UploadFile = File(...), campaign: Campaign = Depends(get_campaign)):
+    """Általános VTT feltöltés (token, egyéb kép)."""
+    target_dir, max_bytes = (campaign.maps_dir, MAX_MAP_BYTES) if type == "map" else (campaign.tokens_dir, MAX_TOKEN_BYTES)
+    try:
+        stored = await store_upload(file, target_dir, max_bytes)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    if type == "map":
+        tile_builder.schedule(os.path.join(target_dir, stored.filename), tiles_dir(campaign, stored.sha256))
+    kind = "maps" if type == "map" else "tokens"
+    return {"url": f"http://localhost:8000{campaign.url_path(kind, stored.filename)}", "name": stored.filename,
+            "sha256": stored.sha256, "deduplicated": stored.deduplicated}
+
+@app.get("/api/vtt/files/{kind}/{sha256}")
+async def find_uploaded_file(kind: str, sha256: str, campaign: Campaign = Depends(get_campaign)):
+    """Megvan-e már ez a tartalom? A kliens a hash alapján a feltöltést teljesen kihagyhatja."""
+    if kind not in ("maps", "tokens"):
+        raise HTTPException(status_code=404, detail="Ismeretlen fájltípus.")
+    name = find_stored(campaign.maps_dir if kind == "maps" else campaign.tokens_dir, sha256.lower())
+    if name is None:
+        raise HTTPException(status_code=404, detail="Nincs ilyen fájl.")
+    return {"url": f"http://localhost:8000{campaign.url_path(kind, name)}", "name": name}
+
+@app.get("/api/vtt/maps/{sha256}/tiles")
+async def map_tiles(sha256: str, campaign: Campaign = Depends(get_campaign)):
+    """A térkép csempe-piramisának leírása (szintek, méretek, csempe URL minta).
+
+    Amíg a háttérben készül, 202 + status='pending'; a régebben feltöltött térképeknél itt indul el.
+    """
+    sha256 = sha256.lower()
+    name = find_stored(campaign.maps_dir, sha256)
+    if name is None:
+        raise HTTPException(status_code=404, detail="Nincs ilyen térkép.")
+    out_dir = tiles_dir(campaign, sha256)
+    status, manifest = tile_builder.status(out_dir)
+    if status == "missing":
+        tile_builder.schedule(os.path.join(campaign.maps_dir, name), out_dir)
+        status, manifest = tile_builder.status(out_dir)
+    if status == "failed":
+        raise HTTPException(status_code=422, detail=f"A térkép nem csempézhető: {manifest['error']}")
+    if status != "ready":
+        return JSONResponse(status_code=202, content={"status": status})
+    tile_url = campaign.url_path("maps", f"tiles/{sha256}/{{level}}/{{col}}_{{row}}.{manifest['format']}")
+    return {"status": "ready", "tile_url": f"http://localhost:8000{tile_url}", **manifest}
+
+def get_vtt_map(sha256: str, campaign: Campaign):
+    vtt_map = campaign.vtt_map(sha256)
+    if vtt_map is None:
+        raise HTTPException(status_code=404, detail="Nincs ilyen térkép.")
+    return vtt_map
+
+@app.get("/api/vtt/maps/{sha256}/grid")
+async def get_map_grid(sha256: str, campaign: Campaign = Depends(get_campaign)):
+    """A térkép rácsa (pixel / négyzet, oszlopok, sorok)."""
+    return get_vtt_map(sha256, campaign).grid()
+
+@app.put("/api/vtt/maps/{sha256}/grid")
+async def set_map_grid(sha256: str, req: GridRequest, campaign: Campaign = Depends(get_campaign)):
+    """Rácsméret beállítása a térkép négyzethálójához; a köd ilyenkor alaphelyzetbe áll."""
+    if not 8 <= req.cell_px <= 1000:
+        raise HTTPException(status_code=400, detail="A rácsméret 8 és 1000 pixel között lehet.")
+    vtt_map = get_vtt_map(sha256, campaign)
+    async with campaign.lock:
+        vtt_map.set_grid(req.cell_px)
+        campaign.events.publish("fog_reset", {"map": vtt_map.sha256, "version": vtt_map.fog.version, **vtt_map.grid()})
+    return vtt_map.grid()
+
+@app.get("/api/vtt/maps/{sha256}/fog")
+async def get_fog(sha256: str, version: Optional[int] = None, campaign: Campaign = Depends(get_campaign)):
+    """A köd bitmaszkja (soronként, bitenként tömörítve, base64). Ha a kliens verziója friss, csak annyi a válasz."""
+    vtt_map = get_vtt_map(sha256, campaign)
+    if version == vtt_map.fog.version:
+        return {"version": version, "unchanged": True}
+    return {**vtt_map.fog.to_dict(), "cell_px": vtt_map.cell_px, "encoding": "packbits-base64"}
+
+@app.get("/api/vtt/maps/{sha256}/fog.png")
+async def get_fog_png(sha256: str, cell_px: int = 1, campaign: Campaign = Depends(get_campaign)):
+    """A köd átlátszó PNG rétegként (cellánként cell_px pixel, a kliens felnagyíthatja)."""
+    vtt_map = get_vtt_map(sha256, campaign)
+    png = await asyncio.to_thread(vtt_map.fog_png, cell_px)
+    return Response(content=png, media_type="image/png",
+                    headers={"ETag": f'"{vtt_map.fog.version}-{cell_px}"', "Cache-Control": "no-cache"})
+
+@app.post("/api/vtt/maps/{sha256}/fog")
+async def update_fog(sha256: str, op: FogOperation, campaign: Campaign = Depends(get_campaign)):
+    """Köd felfedése / letakarása téglalappal, körrel, sokszöggel vagy az egész térképen."""
+    if op.shape == "polygon" and (len(op.points) < 3 or any(len(p) != 2 for p in op.points)):
+        raise HTTPException(status_code=400, detail="A sokszöghöz legalább 3 [x, y] pont kell.")
+    vtt_map = get_vtt_map(sha256, campaign)
+    async with campaign.lock:
+        region = vtt_map.fog_op(op.shape, op.action == "reveal", op.x0, op.y0, op.x1, op.y1,
+                                points=op.points, radius=op.radius)
+        if region is not None:
+            # A játékosok csak a változott cella-téglalapot kérik le újra
+            campaign.events.publish("fog_changed", {"map": vtt_map.sha256, "version": vtt_map.fog.version,
+                                                    "action": op.action, "region": [int(v) for v in region]})
+    return {"version": vtt_map.fog.version, "changed": region is not None,
+            "region": [int(v) for v in region] if region else None, "coverage": vtt_map.fog.coverage()}
+
+@app.get("/api/vtt/maps/{sha256}/walls")
+async def get_walls(sha256: str, campaign: Campaign = Depends(get_campaign)):
+    vtt_map = get_vtt_map(sha256, campaign)
+    return {"walls": vtt_map.walls, "tokens": vtt_map.tokens, "lighting": vtt_map.lighting}
+
+@app.put("/api/vtt/maps/{sha256}/walls")
+async def set_walls(sha256: str, req: WallsRequest, campaign: Campaign = Depends(get_campaign)):
+    """Az összes fal cseréje; a látómezők a következő lekérdezéskor számolódnak újra."""
+    vtt_map = get_vtt_map(sha256, campaign)
+    async with campaign.lock:
+        try:
+            changed = vtt_map.set_walls(req.walls)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if changed:
+            campaign.events.publish("walls_changed", {"map": vtt_map.sha256, "walls": vtt_map.walls})
+    return {"changed": changed, "count": len(vtt_map.walls)}
+
+@app.put("/api/vtt/maps/{sha256}/tokens/{token_id}")
+async def place_token(sha256: str, token_id: str, req: TokenPlacement, campaign: Campaign = Depends(get_campaign)):
+    """Token elhelyezése / mozgatása a térképen (a token azonosítója pl. a harcoló id-je)."""
+    vtt_map = get_vtt_map(sha256, campaign)
+    async with campaign.lock:
+        if token_id == campaign.encounter.active_id and campaign.turn_start.get(sha256, (None,))[0] != token_id:
+            # Az aktív harcoló első mozgatása a körében: innen indult
+            campaign.set_turn_start(sha256, token_id, vtt_map.position(token_id))
+        token = vtt_map.set_token(token_id, req.x, req.y, req.darkvision, req.light)
+        campaign.events.publish("token_moved", {"map": vtt_map.sha256, "id": token_id, **token})
+    return {"id": token_id, **token}
+
+@app.delete("/api/vtt/maps/{sha256}/tokens/{token_id}")
+async def remove_token(sha256: str, token_id: str, campaign: Campaign = Depends(get_campaign)):
+    vtt_map = get_vtt_map(sha256, campaign)
+    async with campaign.lock:
+        if not vtt_map.remove_token(token_id):
+            raise HTTPException(status_code=404, detail="Nincs ilyen token a térképen.")
+        campaign.events.publish("token_removed", {"map": vtt_map.sha256, "id": token_id})
+    return {"status": "success"}
+
+@app.get("/api/vtt/maps/{sha256}/tokens/near")
+async def tokens_near(sha256: str, x: float, y: float, radius: float = 5, campaign: Campaign = Depends(get_campaign)):
+    """A (pixel) ponttól legfeljebb radius lábra álló tokenek (rácstávolság, az átló is 5 láb)."""
+    return {"tokens": get_vtt_map(sha256, campaign).tokens_near(x, y, radius)}
+
+@app.get("/api/vtt/maps/{sha256}/tokens/{token_id}/around")
+async def tokens_around(sha256: str, token_id: str, radius: float = 5, campaign: Campaign = Depends(get_campaign)):
+    """Ki áll a token körül radius lábon belül (5: szomszédos, 10: pl. paladin aura / hosszú fegyver)."""
+    try:
+        return {"tokens": get_vtt_map(sha256, campaign).around(token_id, radius)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Nincs ilyen token a térképen.")
+
+@app.get("/api/vtt/maps/{sha256}/tokens/{token_id}/nearest")
+async def tokens_nearest(sha256: str, token_id: str, k: int = Query(1, ge=1, le=100),
+                         campaign: Campaign = Depends(get_campaign)):
+    """A k legközelebbi másik token."""
+    try:
+        return {"tokens": get_vtt_map(sha256, campaign).nearest(token_id, k)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Nincs ilyen token a térképen.")
+
+@app.put("/api/vtt/maps/{sha256}/lighting")
+async def set_lighting(sha256: str, req: LightingRequest, campaign: Campaign = Depends(get_campaign)):
+    """Világos térképen a falak szabnak határt, sötétben csak a sötétlátás és a fényforrások."""
+    vtt_map = get_vtt_map(sha256, campaign)
+    async with campaign.lock:
+        vtt_map.set_lighting(req.lighting)
+        campaign.events.publish("lighting_changed", {"map": vtt_map.sha256, "lighting": req.lighting})
+    return {"lighting": req.lighting}
+
+@app.get("/api/vtt/maps/{sha256}/vision")
+async def get_vision(sha256: str, tokens: Optional[str] = None, campaign: Campaign = Depends(get_campaign)):
+    """A megadott (vesszővel elválasztott, alapból az összes) token közös látómezeje cellánként."""
+    vtt_map = get_vtt_map(sha256, campaign)
+    token_ids = [t for t in tokens.split(",") if t] if tokens else None
+    try:
+        view, counts = vtt_map.vision(token_ids)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Nincs ilyen token a térképen: {e.args[0]}")
+    return {"cols": vtt_map.cols, "rows": vtt_map.rows, "cell_px": vtt_map.cell_px, "lighting": vtt_map.lighting,
+            "encoding": "packbits-base64", "mask": encode_mask(view), "tokens": counts}
+
+@app.post("/api/vtt/maps/{sha256}/vision/reveal")
+async def reveal_vision(sha256: str, req: VisionReveal, campaign: Campaign = Depends(get_campaign)):
+    """A köd felszedése ott, ahová a tokenek ellátnak."""
+    vtt_map = get_vtt_map(sha256, campaign)
+    async with campaign.lock:
+        try:
+            region = vtt_map.reveal_vision(req.tokens)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=f"Nincs ilyen token a térképen: {e.args[0]}")
+        if region is not None:
+            campaign.events.publish("fog_changed", {"map": vtt_map.sha256, "version": vtt_map.fog.version,
+                                                    "action": "reveal", "region": list(region)})
+    return {"version": vtt_map.fog.version, "changed": region is not None,
+            "region": list(region) if region else None, "coverage": vtt_map.fog.coverage()}
+
+@app.post("/api/vtt/maps/{sha256}/aoe")
+async def resolve_aoe(sha256: str, req: AoeTemplate, campaign: Campaign = Depends(get_campaign)):
+    """AoE sablon (kör, kúp, vonal, kocka): az érintett cellák és a benne álló tokenek / harcolók."""
+    vtt_map = get_vtt_map(sha256, campaign)
+    try:
+        result = vtt_map.aoe(req.shape, req.x, req.y, req.size, req.direction, req.width)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # A token azonosítója a harcoló id-je, ha a tokent a harcból tették le
+    combatants = [{"id": c["id"], "name": c["name"]}
+                  for c in map(campaign.encounter.get, result["tokens"]) if c is not None]
+    campaign.events.publish("aoe_resolved", {"map": vtt_map.sha256, **req.dict(), "tokens": result["tokens"]})
+    return {**result, "count": len(result["cells"]), "combatants": combatants}
+
 # ==========================================
 # 2. KALAND KÓDEXE ÉS LORE VÉGPONTOK (RAG)
 # ==========================================
 @app.post("/api/lore/upload")
-async def upload_lore(file: UploadFile = File(...)):
+async def upload_lore(file: UploadFile = File(...), campaign: Campaign = Depends(get_campaign)):
     """Szöveges fájl (titkos jegyzet) hozzáadása a Kódexhez."""
     try:
         content = await file.read()
         text_content = content.decode("utf-8")
-        with open(LORE_FILE, "a", encoding="utf-8") as f:
-            f.write(f"\n--- Új bejegyzés: {file.filename} ---\n")
-            f.write(text_content)
-            f.write("\n")
+        async with campaign.lock:
+            campaign.refresh_lore()
+            campaign.lore_store.append(file.filename, text_content)
+            campaign.lore_index.add_document(file.filename, text_content, source_stamp=campaign.lore_store.stamp)
         return {"message": f"'{file.filename}' sikeresen hozzáadva a Kódexhez!"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Hiba a Lore olvasásakor: {str(e)}")
 
 @app.post("/api/ai/lore-master", response_model=AIResponse)
-async def ask_lore_master(req: PromptRequest):
+async def ask_lore_master(req: PromptRequest, campaign: Campaign = Depends(get_campaign)):
     """AI, ami a saját feltöltött jegyzeteid (Kódex) alapján válaszol."""
     try:
-        current_lore = ""
-        if os.path.exists(LORE_FILE):
-            with open(LORE_FILE, "r", encoding="utf-8") as f:
-                current_lore = f.read()
+        current_lore = campaign.lore_context(req.prompt, LORE_TOKEN_BUDGET)
                 
         system_prompt = f"""Te egy D&D Kalandmester asszisztens vagy. A válaszaidat KIZÁRÓLAG az alábbi Kódexre alapozd:
         
@@ -293,10 +605,7 @@ async def ask_lore_master(req: PromptRequest):
         
         Ha a kérdésre nincs válasz a Kódexben, találd ki logikusan a világ hangulatához illően. Magyarul válaszolj!"""
         
-        chat_completion = groq_client.chat.completions.create(
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": req.prompt}],
-            model="llama-3.3-70b-versatile", temperature=0.6)
-        return AIResponse(result=chat_completion.choices[0].message.content)
+        return await chat_response(system_prompt, req, temperature=0.6)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -307,23 +616,22 @@ async def ask_lore_master(req: PromptRequest):
 async def ask_rules_lawyer(req: PromptRequest):
     """5e Szabálybíró."""
     try:
-        chat_completion = groq_client.chat.completions.create(
-            messages=[{"role": "system", "content": "Te egy profi D&D 5e Szabálybíró vagy. Légy pontos és hivatkozz a szabályokra magyarul."}, 
-                      {"role": "user", "content": req.prompt}],
-            model="llama-3.3-70b-versatile", temperature=0.3)
-        return AIResponse(result=chat_completion.choices[0].message.content)
+        system_prompt = "Te egy profi D&D 5e Szabálybíró vagy. Légy pontos és hivatkozz a szabályokra magyarul."
+        return await chat_response(system_prompt, req, temperature=0.3, cache_mode="rules-lawyer")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/ai/cache-stats")
+async def ai_cache_stats():
+    """A válasz-cache találati statisztikái."""
+    return ai_cache.stats()
+
 @app.post("/api/ai/npc-generator", response_model=AIResponse)
 async def generate_npc(req: PromptRequest):
     """NJK (Karakter) Generátor."""
     try:
-        chat_completion = groq_client.chat.completions.create(
-            messages=[{"role": "system", "content": "Te egy kreatív D&D 5e Kalandmester vagy. Készíts izgalmas NJK-t névvel, fajjal, kaszttal, titokkal és jellemmel. Magyarul válaszolj."}, 
-                      {"role": "user", "content": req.prompt}],
-            model="llama-3.3-70b-versatile", temperature=0.8)
-        return AIResponse(result=chat_completion.choices[0].message.content)
+        system_prompt = "Te egy kreatív D&D 5e Kalandmester vagy. Készíts izgalmas NJK-t névvel, fajjal, kaszttal, titokkal és jellemmel. Magyarul válaszolj."
+        return await chat_response(system_prompt, req, temperature=0.8)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -331,30 +639,21 @@ async def generate_npc(req: PromptRequest):
 async def generate_location(req: PromptRequest):
     """Helyszín és hangulat leíró (Read-aloud text)."""
     try:
-        chat_completion = groq_client.chat.completions.create(
-            messages=[{"role": "system", "content": "Te egy profi fantasy író vagy. Generálj magával ragadó helyszínleírást a játékosoknak, bevonva az érzékszerveket. Magyarul válaszolj."}, 
-                      {"role": "user", "content": req.prompt}],
-            model="llama-3.3-70b-versatile", temperature=0.7)
-        return AIResponse(result=chat_completion.choices[0].message.content)
+        system_prompt = "Te egy profi fantasy író vagy. Generálj magával ragadó helyszínleírást a játékosoknak, bevonva az érzékszerveket. Magyarul válaszolj."
+        return await chat_response(system_prompt, req, temperature=0.7)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/ai/improvise", response_model=AIResponse)
-async def improvise_scenario(req: PromptRequest):
+async def improvise_scenario(req: PromptRequest, campaign: Campaign = Depends(get_campaign)):
     """Pánikgomb: 3 kreatív ötlet váratlan helyzetekre."""
     try:
-        current_lore = ""
-        if os.path.exists(LORE_FILE):
-            with open(LORE_FILE, "r", encoding="utf-8") as f:
-                current_lore = f.read()
+        current_lore = campaign.lore_context(req.prompt, LORE_TOKEN_BUDGET)
                 
         system_prompt = f"""A kampány háttere: {current_lore}
         Adj a mesélőnek PONTOSAN 3 KÜLÖNBÖZŐ, kreatív ötletet a kérdésére. Legyen köztük vicces, komoly, és egy váratlan fordulat is. Vázlatpontokban, magyarul!"""
         
-        chat_completion = groq_client.chat.completions.create(
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": req.prompt}],
-            model="llama-3.3-70b-versatile", temperature=0.8)
-        return AIResponse(result=chat_completion.choices[0].message.content)
+        return await chat_response(system_prompt, req, temperature=0.8)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -363,73 +662,318 @@ async def improvise_scenario(req: PromptRequest):
 # ==========================================
 @app.get("/api/encounter/search-monster/{monster_index}")
 async def search_monster(monster_index: str):
-    """Szörny statisztikák letöltése a hivatalos SRD adatbázisból."""
-    try:
-        url = f"https://www.dnd5eapi.co/api/monsters/{monster_index.lower()}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            ac = data["armor_class"][0]["value"] if "armor_class" in data and len(data["armor_class"]) > 0 else 10
-            return {"name": data["name"], "max_hp": data["hit_points"], "ac": ac, "dexterity": data["dexterity"]}
-        else:
-            raise HTTPException(status_code=404, detail="Szörny nem található az SRD-ben.")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """Szörny statisztikák a helyi SRD adatbázisból (slug, név vagy elgépelt név alapján)."""
+    monster = monster_db.get(monster_index)
+    if not monster:
+        raise HTTPException(status_code=404, detail="Szörny nem található az SRD-ben.")
+    return {"index": monster["index"], "name": monster["name"], "max_hp": monster["hp"],
+            "ac": monster["ac"], "dexterity": monster["abilities"]["dex"]}
+
+@app.get("/api/monsters")
+async def list_monsters(q: str = "", cr_min: Optional[float] = None, cr_max: Optional[float] = None,
+                        type: Optional[str] = None, size: Optional[str] = None, limit: int = 20):
+    """Szörnykeresés: prefix és elgépelés-tűrő névkeresés, CR / típus / méret szűrőkkel."""
+    results = monster_db.search(q, cr_min=cr_min, cr_max=cr_max, type=type, size=size, limit=min(limit, 500))
+    return {"results": [monster_summary(m) for m in results]}
+
+@app.get("/api/monsters/{monster_index}")
+async def get_monster(monster_index: str):
+    """Teljes stat block (tulajdonságok, akciók, legendás akciók)."""
+    monster = monster_db.by_index.get(monster_index.lower())
+    if not monster:
+        raise HTTPException(status_code=404, detail="Szörny nem található az SRD-ben.")
+    return monster
 
 @app.get("/api/beyond/character/{character_id}")
 async def import_beyond_character(character_id: str):
     """Karakter azonnali behúzása a D&D Beyond rejtett adatközpontjából."""
     try:
-        url = f"https://character-service.dndbeyond.com/character/v5/character/{character_id}"
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"} 
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            data = response.json().get("data", {})
-            name = data.get("name", "Ismeretlen Hős")
-            
-            base_hp = data.get("baseHitPoints", 0)
-            bonus_hp = data.get("bonusHitPoints", 0)
-            max_hp = base_hp + bonus_hp 
-            
-            dex_stat = next((stat for stat in data.get("stats", []) if stat["id"] == 2), None)
-            dex_value = dex_stat["value"] if dex_stat else 10
-            initiative_mod = (dex_value - 10) // 2
-            base_ac = 10 + initiative_mod
-            
-            return {
-                "message": f"{name} adatai sikeresen letöltve!",
-                "combatant": {
-                    "id": f"beyond_{character_id}",
-                    "name": name,
-                    "is_player": True,
-                    "max_hp": max_hp,
-                    "hp": max_hp,
-                    "ac": base_ac,
-                    "initiative": initiative_mod  # Ezt majd a Reactben lehet módosítani a dobás után
-                }
-            }
-        elif response.status_code in [403, 404]:
-            raise HTTPException(status_code=404, detail="Karakter nem található, vagy privátra van állítva a Beyondban.")
-        else:
-            raise HTTPException(status_code=500, detail="A D&D Beyond szervere nem válaszol.")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Hiba a szinkronizálásakor: {str(e)}")
+        combatant = await beyond_client.fetch(character_id)
+    except BeyondError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return {"message": f"{combatant['name']} adatai sikeresen letöltve!", "combatant": combatant}
+
+@app.post("/api/beyond/party")
+async def import_beyond_party(req: PartyImportRequest):
+    """Egész csapat behúzása egyszerre (párhuzamos letöltés, ETag alapú cache)."""
+    try:
+        combatants, errors = await beyond_client.fetch_party(req.character_ids)
+    except BeyondError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return {"combatants": combatants, "errors": errors}
 
 @app.post("/api/encounter/add")
-async def add_combatant(combatant: Combatant):
+async def add_combatant(combatant: Combatant, campaign: Campaign = Depends(get_campaign)):
     """Karakter/Szörny hozzáadása a harchoz."""
-    active_encounter.append(combatant.dict())
+    async with campaign.lock:
+        added = campaign.encounter.add(combatant.dict())
+        campaign.events.publish("combatant_added", {"combatant": added, "index": campaign.encounter.index_of(added["id"])})
     return {"message": f"{combatant.name} csatlakozott a harchoz!"}
 
+@app.post("/api/encounter/add-group")
+async def add_monster_group(req: MonsterGroup, campaign: Campaign = Depends(get_campaign)):
+    """Szörnycsoport hozzáadása (pl. 12 goblin): a kezdeményezés egy vektorizált dobás
+    (példányonként vagy csoportonként), holtversenynél az ÜGY dönt, a sorszámozás a
+    harcban már meglévő azonos nevűek után folytatódik."""
+    monster = monster_db.get(req.monster)
+    if not monster:
+        raise HTTPException(status_code=404, detail="Szörny nem található az SRD-ben.")
+    name = req.name or monster["name"]
+    dexterity = monster["abilities"]["dex"]
+    try:
+        rolls = roll_initiative(req.count, (dexterity - 10) // 2, req.per_group)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    async with campaign.lock:
+        taken = [c["name"][len(name) + 1:] for c in campaign.encounter.ordered() if c["name"].startswith(name + " ")]
+        first = max([int(n) for n in taken if n.isdigit()], default=0) + 1
+        base_id = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+        group = [Combatant(id=f"{base_id}-{first + i}", name=f"{name} {first + i}", is_player=False,
+                           hp=monster["hp"], max_hp=monster["hp"], ac=monster["ac"], initiative=int(roll),
+                           dexterity=dexterity).dict() for i, roll in enumerate(rolls)]
+        added = campaign.encounter.add_many(group)
+        for combatant in added:
+            campaign.events.publish("combatant_added", {"combatant": combatant,
+                                                        "index": campaign.encounter.index_of(combatant["id"])})
+    return {"message": f"{len(added)} × {name} csatlakozott a harchoz!", "combatants": added}
+
 @app.get("/api/encounter/current")
-async def get_encounter():
-    """Az aktív harc résztvevőinek listája (Kezdeményezés szerint rendezve)."""
-    sorted_encounter = sorted(active_encounter, key=lambda x: x["initiative"], reverse=True)
-    return {"combatants": sorted_encounter}
+async def get_encounter(campaign: Campaign = Depends(get_campaign)):
+    """Az aktív harc résztvevői (Kezdeményezés szerint rendezve), az aktuális körrel."""
+    return campaign.encounter.snapshot()
+
+@app.patch("/api/encounter/combatant/{combatant_id}")
+async def update_combatant(combatant_id: str, changes: CombatantUpdate, campaign: Campaign = Depends(get_campaign)):
+    """Egy résztvevő részleges módosítása (pl. HP); új kezdeményezésnél átsorolódik."""
+    async with campaign.lock:
+        delta = changes.dict(exclude_unset=True)
+        combatant = campaign.encounter.update(combatant_id, delta)
+        if combatant is None:
+            raise HTTPException(status_code=404, detail="Nincs ilyen résztvevő a harcban.")
+        index = campaign.encounter.index_of(combatant_id)
+        # Csak a változott mezők mennek ki, nem az egész lista
+        campaign.events.publish("combatant_updated", {"id": combatant_id, "changes": delta, "index": index})
+        return {"combatant": combatant, "turn": index}
+
+@app.delete("/api/encounter/combatant/{combatant_id}")
+async def remove_combatant(combatant_id: str, campaign: Campaign = Depends(get_campaign)):
+    """Egy résztvevő kivétele a harcból (elesett, elmenekült)."""
+    async with campaign.lock:
+        combatant = campaign.encounter.remove(combatant_id)
+        if combatant is None:
+            raise HTTPException(status_code=404, detail="Nincs ilyen résztvevő a harcban.")
+        campaign.events.publish("combatant_removed", {"id": combatant_id, "active_id": campaign.encounter.active_id,
+                                                      "round": campaign.encounter.round})
+        return {"message": f"{combatant['name']} kikerült a harcból.", "active_id": campaign.encounter.active_id}
+
+@app.post("/api/encounter/next-turn")
+async def next_turn(map: Optional[str] = None, campaign: Campaign = Depends(get_campaign)):
+    """Következő kör: a soron következő résztvevő, körbeérve új harci kör.
+
+    Ha megadják a térképet (?map=<sha256>), jelzi, kik kaphattak alkalmi támadást a kört
+    befejezőre: azok az ellenfelek, akiknek az elérését a köre alatt elhagyta.
+    """
+    vtt_map = get_vtt_map(map, campaign) if map else None
+    async with campaign.lock:
+        ended = campaign.encounter.get(campaign.encounter.active_id) if campaign.encounter.active_id else None
+        combatant = campaign.encounter.next_turn()
+        if combatant is None:
+            raise HTTPException(status_code=400, detail="Nincs senki a harcban.")
+        turn = {"active_id": combatant["id"], "round": campaign.encounter.round,
+                "turn": campaign.encounter.index_of(combatant["id"])}
+        if vtt_map is not None:
+            attacks = []
+            mover, start = campaign.turn_start.get(vtt_map.sha256, (None, None))
+            if ended is not None and mover == ended["id"] and start is not None:
+                # Az elesett (0 HP-s) ellenfél nem támadhat
+                enemies = {c["id"]: c.get("reach", 5) for c in campaign.encounter.ordered()
+                           if c["is_player"] != ended["is_player"] and c["hp"] > 0}
+                attacks = [{"id": cid, "name": campaign.encounter.get(cid)["name"], "target": ended["id"]}
+                           for cid in vtt_map.opportunity_attacks(ended["id"], start, enemies)]
+            campaign.set_turn_start(vtt_map.sha256, combatant["id"], vtt_map.position(combatant["id"]))
+            turn["opportunity_attacks"] = attacks
+        campaign.events.publish("turn_advanced", turn)
+        return {"combatant": combatant, **{k: v for k, v in turn.items() if k != "active_id"}}
+
+def sim_creatures(combatants: List[dict]) -> List[dict]:
+    """A harc résztvevői szimulációs lényként; a hiányzó támadási adat szörnynél az SRD-ből jön."""
+    creatures, missing = [], []
+    for c in combatants:
+        profile = {"attack_bonus": c.get("attack_bonus"), "damage": c.get("damage"), "attacks": c.get("attacks", 1)}
+        if profile["attack_bonus"] is None or not profile["damage"]:
+            monster = None if c["is_player"] else monster_db.for_combatant(c["name"])
+            found = attack_profile(monster) if monster else None
+            if found is None:
+                missing.append(c["name"])
+                continue
+            profile = found
+        creatures.append({"name": c["name"], "is_player": c["is_player"], "hp": max(0, c["hp"]), "ac": c["ac"],
+                          **profile})
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Hiányzó támadási adat (attack_bonus, damage): {', '.join(missing)}")
+    return creatures
+
+@app.post("/api/encounter/simulate")
+async def simulate_encounter(req: SimulationRequest, campaign: Campaign = Depends(get_campaign)):
+    """Monte Carlo nehézségbecslés: győzelmi esély, várható körszám, várhatóan eleső játékosok.
+    A próbák háttérszálon futnak (nagy futásnál, több magon folyamatkészletben), így az event loop szabad marad."""
+    if req.creatures is not None:
+        creatures = [c.dict() for c in req.creatures]
+    else:
+        creatures = sim_creatures([c for c in campaign.encounter.ordered() if c["hp"] > 0])
+    try:
+        return await asyncio.to_thread(simulator.simulate, creatures, req.trials, req.max_rounds, req.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def effect_target(c: dict, ability: Optional[str]) -> dict:
+    """Célpont mentődobáshoz: a hiányzó mentő-bónusz és védelem szörnynél az SRD-ből jön."""
+    monster = None if c["is_player"] else monster_db.for_combatant(c["name"])
+    defenses = defense_profile(monster) if monster else {"save_bonus": {}}
+    target = {"id": c["id"], "name": c["name"], "hp": c["hp"]}
+    for key in ("resistances", "immunities", "vulnerabilities"):
+        target[key] = c.get(key) if c.get(key) is not None else defenses.get(key, [])
+    saves = c.get("save_bonus") or defenses["save_bonus"]
+    target["save_bonus"] = saves.get(ability, 0) if ability else 0
+    return target
+
+@app.post("/api/encounter/resolve-save")
+async def resolve_save(req: SaveEffect, campaign: Campaign = Depends(get_campaign)):
+    """Mentődobásos hatás több célpontra (pl. tűzgolyó: DEX DC 15, 8d6 fire, sikernél fele).
+    Egy vektorizált dobás; a HP-k visszaíródnak a harcba, célpontonkénti bontással."""
+    if (req.ability is None) != (req.dc is None):
+        raise HTTPException(status_code=400, detail="Mentődobáshoz a tulajdonság és a DC is kell.")
+    damage_type = req.damage_type.lower() if req.damage_type else None
+    if damage_type is not None and damage_type not in DAMAGE_TYPES:
+        raise HTTPException(status_code=400, detail=f"Ismeretlen sebzéstípus: {req.damage_type}")
+    async with campaign.lock:
+        combatants = [campaign.encounter.get(cid) for cid in dict.fromkeys(req.target_ids)]
+        missing = [cid for cid, c in zip(dict.fromkeys(req.target_ids), combatants) if c is None]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Nincs ilyen résztvevő a harcban: {', '.join(missing)}")
+        try:
+            results = effects.resolve_save([effect_target(c, req.ability) for c in combatants], req.damage, req.dc,
+                                           damage_type, req.half_on_success,
+                                           req.shared_damage)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        for r in results:
+            campaign.encounter.update(r["id"], {"hp": r["hp_after"]})
+            campaign.events.publish("combatant_updated", {"id": r["id"], "changes": {"hp": r["hp_after"]},
+                                                          "index": campaign.encounter.index_of(r["id"])})
+        return {"results": results, "total_damage": sum(r["damage"] for r in results)}
 
 @app.delete("/api/encounter/clear")
-async def clear_encounter():
+async def clear_encounter(campaign: Campaign = Depends(get_campaign)):
     """A harc befejezése (asztal törlése)."""
-    active_encounter.clear()
+    async with campaign.lock:
+        campaign.encounter.clear()
+        campaign.events.publish("encounter_cleared", {})
     return {"message": "A harc véget ért, az asztal letakarítva!"}
+
+@app.get("/api/campaigns/active")
+async def active_campaigns():
+    """A memóriában lévő (aktív) asztalok; a tétlenek kiürülnek, és igény szerint töltődnek vissza."""
+    return {"campaigns": campaigns.active(), "idle_ttl": campaigns.idle_ttl}
+
+# ==========================================
+# 5. KOCKADOBÓ (History-val)
+# ==========================================
+@app.post("/api/dice/roll")
+async def roll_dice(req: DiceRollRequest, campaign: Campaign = Depends(get_campaign)):
+    """Egy dobás (pl. 1d20+5, 4d6kh3, 1d20adv-1, 2d6!+1d4)."""
+    try:
+        rolled = dice.roll(req.expression)
+    except dice.DiceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = {
+        "player": req.player_name,
+        "expression": req.expression,
+        "rolls": rolled.rolls,
+        "total": rolled.total
+    }
+    entry = campaign.rolls.append(result)
+    campaign.events.publish("roll", entry)
+    return entry
+
+@app.get("/api/dice/history")
+async def dice_history(player: Optional[str] = None, since: Optional[float] = None,
+                       before: Optional[int] = None, limit: int = 50, campaign: Campaign = Depends(get_campaign)):
+    """Dobástörténet, legfrissebb elöl. Lapozás: a next_before értéket kell a következő kérésben before-ként küldeni."""
+    rolls, next_before = campaign.rolls.query(player=player, since=since, before=before, limit=max(1, min(limit, 500)))
+    return {"rolls": rolls, "next_before": next_before, "total": len(campaign.rolls)}
+
+@app.post("/api/dice/roll-batch")
+async def roll_dice_batch(req: DiceBatchRequest):
+    """Tömeges dobás botoknak és csatatér-szimulációhoz (csak összegek, history nélkül)."""
+    try:
+        totals = dice.roll_batch(req.expressions)
+    except dice.DiceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "player": req.player_name,
+        "count": len(req.expressions),
+        "totals": totals.tolist()
+    }
+
+@app.post("/api/dice/distribution")
+async def dice_distribution(req: DiceDistributionRequest):
+    """Pontos eloszlás konvolúcióval ("megöli-e a 8d6 tűzgolyó?"). A pmf[i] a min+i összeg esélye."""
+    try:
+        dist = dice.distribution(req.expression)
+    except dice.DiceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = {
+        "expression": dist.expression,
+        "min": dist.minimum,
+        "max": dist.maximum,
+        "mean": dist.mean,
+        "std": dist.std,
+        "percentiles": {str(q): dist.percentile(q) for q in (5, 25, 50, 75, 95)},
+        "pmf": dist.pmf.tolist()
+    }
+    if req.dc is not None:
+        result["dc"] = req.dc
+        result["p_at_least_dc"] = dist.p_at_least(req.dc)
+    return result
+
+# ==========================================
+# 6. VALÓS IDEJŰ ESEMÉNYEK (WebSocket / SSE)
+# ==========================================
+# Pollozás helyett: csatlakozáskor teljes állapot (snapshot), utána csak a deltak
+# (combatant_added / combatant_updated / combatant_removed / turn_advanced / encounter_cleared / roll).
+# Minden esemény sorszámot (seq) kap; újracsatlakozáskor a cursor='<epoch>:<seq>' alapján
+# csak a kimaradt események jönnek, ha azok még megvannak, különben új snapshot.
+@app.websocket("/ws/table")
+async def table_socket(websocket: WebSocket, campaign: str = DEFAULT_CAMPAIGN, cursor: Optional[str] = None):
+    """Egy asztal élő eseménycsatornája WebSocketen (JSON üzenetek)."""
+    try:
+        table = await campaigns.load(campaign)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    await websocket.accept()
+    stream = table.events.stream(table.snapshot, cursor)
+    try:
+        async for event in stream:
+            await websocket.send_json(event)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        await stream.aclose()
+
+@app.get("/api/events")
+async def table_events(campaign: Campaign = Depends(get_campaign), cursor: Optional[str] = None,
+                       last_event_id: Optional[str] = Header(None)):
+    """Ugyanez Server-Sent Events-ként; a böngésző EventSource-a újracsatlakozáskor magától küldi a Last-Event-ID-t."""
+    async def body():
+        stream = campaign.events.stream(campaign.snapshot, last_event_id or cursor)
+        try:
+            async for event in stream:
+                yield f"id: {campaign.events.epoch}:{event['seq']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            await stream.aclose()
+    return sse_response(body())
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 
+from utils.session_state import init_state, persist_state
+
 st.set_page_config(page_title="Party Dashboard", page_icon="🛡️", layout="wide")
 st.title("🛡️ Party Dashboard & Játékos Követő")
 
@@ -14,16 +16,15 @@ default_players = {
     "Grom": {"max_hp": 65, "hp": 12, "ac": 18, "pp": 11, "conditions": "Mérgezett"}
 }
 
-if "players" not in st.session_state:
-    st.session_state.players = default_players
+# A mentett (SQLite) állapot elsőbbséget élvez, így frissítés / újraindítás után sem vész el semmi
+init_state("players", default_players)
 
-if "party_stash" not in st.session_state:
-    # Egy Pandas DataFrame tökéletes a szerkeszthető kincstárhoz
-    st.session_state.party_stash = pd.DataFrame([
-        {"Tárgy": "Gyógyító ital (Potion of Healing)", "Mennyiség": 3, "Súly (lbs)": 1.5},
-        {"Tárgy": "Aranypénz (gp)", "Mennyiség": 450, "Súly (lbs)": 9.0},
-        {"Tárgy": "Varázslatos kötél", "Mennyiség": 1, "Súly (lbs)": 5.0}
-    ])
+# Egy Pandas DataFrame tökéletes a szerkeszthető kincstárhoz
+init_state("party_stash", pd.DataFrame([
+    {"Tárgy": "Gyógyító ital (Potion of Healing)", "Mennyiség": 3, "Súly (lbs)": 1.5},
+    {"Tárgy": "Aranypénz (gp)", "Mennyiség": 450, "Súly (lbs)": 9.0},
+    {"Tárgy": "Varázslatos kötél", "Mennyiség": 1, "Súly (lbs)": 5.0}
+]))
 
 # ==========================================
 # 2. D&D BEYOND IMPORTÁLÓ (Kísérleti)
@@ -118,3 +119,6 @@ try:
         st.warning("⚠️ Nehéz a zsák! Lehet, hogy kellene egy Bag of Holding vagy egy öszvér...")
 except KeyError:
     st.error("Hiba a súlyszámításban. Kérlek ne nevezd át az oszlopokat!")
+
+# Mentés (csak ha változott; a lemezre írás a háttérben, kötegelve történik)
+persist_state("players", "party_stash")
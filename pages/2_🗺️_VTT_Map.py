@@ -1,51 +1,136 @@
+import hashlib
+import io
+
+import numpy as np
 import streamlit as st
 from streamlit_drawable_canvas import st_canvas
 from PIL import Image
 
+from utils.aoe import template_cells
+from utils.spatial import TokenGrid
+from utils.vision import VisionEngine
+
 st.set_page_config(page_title="VTT Map", page_icon="🗺️", layout="wide")
 st.title("🗺️ VTT Térkép és Háború Ködje")
 
 st.markdown("Töltsd fel a harctéri térképet, majd használd a bal oldali eszközöket a letakarásához vagy a területre ható (AoE) varázslatok berajzolásához.")
 
+CANVAS_WIDTHS = [600, 800, 1000, 1200, 1600]
+TOKEN_COLOR = "#00A2FF"
+AOE_COLOR = "#FF0000"
+AOE_SHAPES = {"circle": "⚪ Kör / gömb", "cone": "🔺 Kúp", "line": "➖ Vonal (5 láb széles)", "cube": "⬜ Kocka"}
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def load_background(_data: bytes, digest: str, width: int) -> Image.Image:
+    """Dekódolt, átméretezett háttér; tartalom-hash + szélesség szerint cache-elve, így a
+    rajzolás miatti rerunok nem dekódolják és méretezik újra a képet."""
+    img = Image.open(io.BytesIO(_data))
+    height = max(1, round(width * img.height / img.width))
+    # JPEG: a dekóder eleve 1/2, 1/4 vagy 1/8 felbontásban bontja ki (ami még nem kisebb a célnál)
+    img.draft("RGB", (width, height))
+    # reducing_gap: előbb gyors egész arányú kicsinyítés, csak a maradékra megy a LANCZOS
+    return img.convert("RGB").resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+def content_digest(uploaded) -> str:
+    """A feltöltés hash-e, feltöltésenként egyszer számolva (nem minden rerunnál)."""
+    cached = st.session_state.get("vtt_bg_digest")
+    if cached and cached[0] == uploaded.file_id:
+        return cached[1]
+    digest = hashlib.blake2b(uploaded.getvalue(), digest_size=16).hexdigest()
+    st.session_state.vtt_bg_digest = (uploaded.file_id, digest)
+    return digest
+
+def object_center(obj: dict) -> tuple:
+    """Fabric.js objektum középpontja vászon-pixelben (bal-felső vagy középső origó esetén is)."""
+    w = obj.get("width", 0) * obj.get("scaleX", 1)
+    h = obj.get("height", 0) * obj.get("scaleY", 1)
+    x = obj["left"] + (w / 2 if obj.get("originX", "left") == "left" else 0)
+    y = obj["top"] + (h / 2 if obj.get("originY", "top") == "top" else 0)
+    return x, y
+
+def canvas_walls(objects: list) -> list:
+    """A 'Vonal (Távolság/Fal)' vonalak falszakaszként, [x0, y0, x1, y1] vászon-pixelben."""
+    walls = []
+    for obj in objects:
+        if obj.get("type") == "line":
+            cx, cy = object_center(obj)
+            sx, sy = obj.get("scaleX", 1), obj.get("scaleY", 1)
+            walls.append([cx + obj["x1"] * sx, cy + obj["y1"] * sy, cx + obj["x2"] * sx, cy + obj["y2"] * sy])
+    return walls
+
+def canvas_tokens(objects: list) -> list:
+    """A Token módban letett pontok középpontjai."""
+    return [object_center(obj) for obj in objects
+            if obj.get("type") == "circle" and obj.get("stroke") == TOKEN_COLOR]
+
+def resolve_canvas_aoe(obj: dict, shape: str, direction: float, tokens: TokenGrid, grid_px: int,
+                       cols: int, rows: int) -> tuple:
+    """Egy megrajzolt AoE kör sablonként: a középpont a kiindulópont, a sugár (5 lábra kerekítve)
+    a kör sugara, ill. a kúp / vonal hossza és a kocka éle. (láb, érintett cellák maszkja, tokenek)"""
+    cx, cy = object_center(obj)
+    size_ft = max(5, round(obj.get("radius", 0) * obj.get("scaleX", 1) / grid_px) * 5)
+    region, inside = template_cells(shape, cx / grid_px, cy / grid_px, size_ft / 5, cols, rows, direction)
+    mask = np.zeros((rows, cols), dtype=bool)
+    hit = []
+    if region is not None:
+        r0, c0, r1, c1 = region
+        mask[r0:r1, c0:c1] = inside
+        # Csak a sablon téglalapjába eső tokeneket kell a maszkkal összevetni
+        for tid in tokens.query_rect(c0 * grid_px, r0 * grid_px, c1 * grid_px, r1 * grid_px):
+            tx, ty = tokens.positions[tid]
+            if mask[min(rows - 1, int(ty // grid_px)), min(cols - 1, int(tx // grid_px))]:
+                hit.append(tid)
+    return size_ft, mask, sorted(hit, key=lambda t: int(t[1:]))
+
+def vision_engine(width: int, height: int, cell: int) -> VisionEngine:
+    """A munkamenet látómotorja; csak a vászon vagy a rács méretének változásakor épül újra,
+    így a tokenenkénti látóvonal-cache túléli a rerunokat."""
+    key = (width, height, cell)
+    cached = st.session_state.get("vtt_vision")
+    if cached is None or cached[0] != key:
+        cached = (key, VisionEngine(-(-width // cell), -(-height // cell)))
+        st.session_state.vtt_vision = cached
+    return cached[1]
+
 uploaded_file = st.file_uploader("Válaszd ki a térképet", type=["png", "jpg", "jpeg"])
 
 if uploaded_file is not None:
+    st.sidebar.header("🛠️ VTT Eszköztár")
+    canvas_width = st.sidebar.select_slider("Vászon szélessége (px)", CANVAS_WIDTHS, value=800)
     try:
-        bg_image = Image.open(uploaded_file).convert("RGB")
-        
-        canvas_width = 800
-        aspect_ratio = bg_image.height / bg_image.width
-        canvas_height = int(canvas_width * aspect_ratio)
-        
-        bg_image = bg_image.resize((canvas_width, canvas_height), Image.Resampling.LANCZOS)
-        
+        bg_image = load_background(uploaded_file.getvalue(), content_digest(uploaded_file), canvas_width)
+        canvas_height = bg_image.height
     except Exception as e:
         st.error(f"❌ Hiba a kép betöltésekor: {str(e)}")
         st.stop()
 
-    st.sidebar.header("🛠️ VTT Eszköztár")
-    
     drawing_mode = st.sidebar.selectbox(
         "Rajzolási Mód",
-        ("rect", "polygon", "transform", "freedraw", "line", "circle"),
+        ("rect", "polygon", "transform", "freedraw", "line", "circle", "point"),
         format_func=lambda x: {
             "rect": "⬛ Szoba letakarása (Téglalap)",
             "polygon": "🛑 Barlang letakarása (Poligon)",
             "transform": "🖐️ Felfedés / Mozgatás (Kijelölés)",
             "freedraw": "✏️ Szabadkézi rajz (Jegyzet)",
             "line": "📏 Vonal (Távolság/Fal)",
-            "circle": "🔥 AoE Sablon (Kör/Tűzgolyó)"
+            "circle": "🔥 AoE Sablon (Kör/Tűzgolyó)",
+            "point": "🧍 Token (Nézőpont)"
         }[x]
     )
 
     stroke_width = st.sidebar.slider("Vonalvastagság", 1, 25, 3)
     
+    grid_px = st.sidebar.slider("Rácsméret a vásznon (px / 5 láb)", 10, 80, 40)
+
     if drawing_mode in ["rect", "polygon"]:
         stroke_color = "#000000"
         fill_color = "rgba(0, 0, 0, 1.0)"
     elif drawing_mode == "circle":
-        stroke_color = "#FF0000"
+        stroke_color = AOE_COLOR
         fill_color = "rgba(255, 0, 0, 0.3)"
+    elif drawing_mode == "point":
+        stroke_color = TOKEN_COLOR
+        fill_color = "rgba(0, 162, 255, 0.8)"
     elif drawing_mode == "transform":
         stroke_color = "#000000"
         fill_color = "rgba(0, 0, 0, 0)"
@@ -53,6 +138,20 @@ if uploaded_file is not None:
         stroke_color = st.sidebar.color_picker("Vonal Színe", "#FFFF00")
         fill_color = "rgba(0, 0, 0, 0)"
 
+    st.sidebar.subheader("🔥 AoE sablon")
+    aoe_shape = st.sidebar.selectbox("A kör sablonként", list(AOE_SHAPES), format_func=AOE_SHAPES.get)
+    aoe_direction = 0
+    if aoe_shape != "circle":
+        aoe_direction = st.sidebar.slider("Irány (fok, 0 = kelet, óramutató szerint)", 0, 345, 0, step=15)
+
+    st.sidebar.subheader("👁️ Látómező")
+    show_vision = st.sidebar.checkbox("Játékosnézet (falak mögé nem látnak)", value=False)
+    if show_vision:
+        lighting = st.sidebar.radio("Megvilágítás", ("bright", "dark"), horizontal=True,
+                                    format_func=lambda x: {"bright": "☀️ Világos", "dark": "🌑 Sötét"}[x])
+        darkvision_ft = st.sidebar.slider("Sötétlátás (láb)", 0, 120, 60, step=30)
+        light_ft = st.sidebar.slider("Tokenek fénye (láb, pl. fáklya: 20)", 0, 60, 0, step=5)
+
     st.markdown("### 🎲 Asztal (Canvas)")
     
     canvas_result = st_canvas(
@@ -65,7 +164,60 @@ if uploaded_file is not None:
         width=canvas_width,
         drawing_mode=drawing_mode,
         key="vtt_combat_canvas", 
+        point_display_radius=6,
     )
 
+    objects = (canvas_result.json_data or {}).get("objects", [])
+    tokens = canvas_tokens(objects)
+
+    # A tokenekhez rendelt harcosok helye (cellában): a Harc oldal ebből jelzi az alkalmi támadásokat
+    names = [c["Név"] for c in st.session_state.get("combatants", [])]
+    if tokens and names:
+        positions = {}
+        with st.sidebar.expander("🧍 Tokenek ↔ harcosok", expanded=False):
+            for i, (x, y) in enumerate(tokens):
+                name = st.selectbox(f"Token {i + 1}", ["—"] + names, key=f"vtt_token_name_{i}")
+                if name != "—":
+                    positions[name] = (x / grid_px, y / grid_px)
+        st.session_state.vtt_positions = positions
+
+    templates = [obj for obj in objects if obj.get("type") == "circle" and obj.get("stroke") == AOE_COLOR]
+    if templates:
+        cols, rows = -(-canvas_width // grid_px), -(-canvas_height // grid_px)
+        token_index = TokenGrid(grid_px * 4)
+        for i, (x, y) in enumerate(tokens):
+            token_index.move(f"t{i}", x, y)
+        st.markdown("### 🔥 AoE eredmény")
+        covered = np.zeros((rows, cols), dtype=bool)
+        for n, obj in enumerate(templates, start=1):
+            size_ft, mask, hit = resolve_canvas_aoe(obj, aoe_shape, aoe_direction, token_index, grid_px, cols, rows)
+            covered |= mask
+            names = ", ".join(f"Token {int(t[1:]) + 1}" for t in hit) or "senki"
+            st.write(f"**#{n}** {AOE_SHAPES[aoe_shape]} {size_ft} láb: {int(mask.sum())} cella — érintett: {names}")
+        pixels = np.repeat(np.repeat(covered, grid_px, axis=0), grid_px, axis=1)[:canvas_height, :canvas_width]
+        tinted = np.asarray(bg_image).copy()
+        tinted[pixels] = tinted[pixels] // 2 + np.array([127, 0, 0], dtype=np.uint8)
+        st.image(tinted, caption="Az érintett cellák (a cella közepe a sablonon belül van)")
+
+    if show_vision:
+        if not tokens:
+            st.info("🧍 Tegyél le legalább egy tokent (Token mód) a látómezőhöz; a vonalak falként számítanak.")
+        else:
+            engine = vision_engine(canvas_width, canvas_height, grid_px)
+            engine.lighting = lighting
+            engine.walls.set(np.asarray(canvas_walls(objects), dtype=float).reshape(-1, 4) / grid_px)
+            for tid in set(engine.tokens) - {f"t{i}" for i in range(len(tokens))}:
+                engine.remove_token(tid)
+            for i, (x, y) in enumerate(tokens):
+                engine.set_token(f"t{i}", x / grid_px, y / grid_px, darkvision_ft / 5, light_ft / 5)
+            view = engine.party_view()
+            # Cellánkénti maszk felnagyítva a vászon méretére; a nem látott rész elsötétül
+            pixels = np.repeat(np.repeat(view, grid_px, axis=0), grid_px, axis=1)[:canvas_height, :canvas_width]
+            shaded = np.asarray(bg_image).copy()
+            shaded[~pixels] = shaded[~pixels] // 5
+            st.markdown("### 👁️ Játékosnézet")
+            st.image(shaded, caption=f"{len(tokens)} token, {len(engine.walls)} fal, "
+                                     f"látott cellák: {int(view.sum())} / {view.size}")
+
 else:
     st.info("Kérlek, tölts fel egy térképet a kezdéshez! 🗺️")
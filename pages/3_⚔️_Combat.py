@@ -1,7 +1,14 @@
+import bisect
+import heapq
+
 import streamlit as st
 import pandas as pd
-import random
-import re
+
+from utils import dice, effects, simulator
+from utils.encounter import MAX_GROUP, roll_initiative
+from utils.monster_db import ABILITIES, DAMAGE_TYPES, attack_profile, defense_profile, load_monster_db
+from utils.session_state import init_state, persist_state
+from utils.spatial import TokenGrid, opportunity_attacks
 
 st.set_page_config(page_title="Combat Tracker", page_icon="⚔️", layout="wide")
 st.title("⚔️ Harcrendszer és Kezdeményezés")
@@ -9,155 +16,402 @@ st.title("⚔️ Harcrendszer és Kezdeményezés")
 # ==========================================
 # 1. ÁLLAPOT INICIALIZÁLÁSA
 # ==========================================
-# Ha valaki egyből ide kattint, ne szálljon el a kód
-if "players" not in st.session_state:
-    st.session_state.players = {}
-
-if "combatants" not in st.session_state:
-    st.session_state.combatants = []
-
-if "round_number" not in st.session_state:
-    st.session_state.round_number = 1
-
-if "current_turn" not in st.session_state:
-    st.session_state.current_turn = 0
+# Ha valaki egyből ide kattint, ne szálljon el a kód (a mentett állapot, ha van, visszatöltődik)
+init_state("players", {})
+init_state("combatants", [])
+init_state("round_number", 1)
+init_state("current_turn", 0)
 
 if "dice_history" not in st.session_state:
     st.session_state.dice_history = []
+# A harcosok listájának verziója: a belőle számolt táblázatok csak ennek változásakor épülnek újra
+if "combatants_rev" not in st.session_state:
+    st.session_state.combatants_rev = 0
 
 # ==========================================
 # 2. SEGÉDFÜGGVÉNYEK
 # ==========================================
 def roll_dice(dice_str):
-    """Szöveges kockadobás értelmezése (pl. '2d6+3', '1d20-1')"""
-    # Eltávolítjuk a szóközöket és kisbetűssé tesszük
-    dice_str = dice_str.replace(" ", "").lower()
-    match = re.match(r'(\d+)d(\d+)(?:([+-])(\d+))?', dice_str)
-    
-    if not match:
-        return None, "Hibás formátum! Használj ilyet: 1d20, 2d6+3, 1d8-1"
-    
-    count = int(match.group(1))
-    sides = int(match.group(2))
-    sign = match.group(3)
-    modifier = match.group(4)
-    
-    if count > 100 or sides > 1000:
-        return None, "Túl sok kocka vagy túl sok oldal!"
-        
-    rolls = [random.randint(1, sides) for _ in range(count)]
-    total = sum(rolls)
-    
-    if modifier:
-        if sign == '+':
-            total += int(modifier)
-        elif sign == '-':
-            total -= int(modifier)
-            
-    mod_str = f" {sign} {modifier}" if modifier else ""
-    return total, f"**{dice_str}** ➡️ {rolls}{mod_str} = **{total}**"
+    """Szöveges kockadobás értelmezése (pl. '2d6+3', '1d20-1', '4d6kh3', '1d20adv')"""
+    try:
+        result = dice.roll(dice_str)
+    except dice.DiceError as e:
+        return None, f"{e} Használj ilyet: 1d20, 2d6+3, 1d8-1, 4d6kh3, 1d20adv"
+
+    mod = result.modifier
+    mod_str = f" {'+' if mod > 0 else '-'} {abs(mod)}" if mod else ""
+    return result.total, f"**{dice.normalize(dice_str)}** ➡️ {result.rolls}{mod_str} = **{result.total}**"
+
+monster_db = load_monster_db()
+CR_OPTIONS = [0, 0.125, 0.25, 0.5] + list(range(1, 31))
+MONSTER_TYPES = sorted(monster_db.by_type)
+
+def format_cr(cr):
+    """0.125 -> '1/8', 2.0 -> '2'"""
+    return {0.125: "1/8", 0.25: "1/4", 0.5: "1/2"}.get(cr, str(int(cr)))
+
+def monster_markdown(m):
+    """SRD stat block markdown formában"""
+    ab = m["abilities"]
+    mod = lambda v: f"{(v - 10) // 2:+d}"
+    speed = ", ".join(f"{k} {v} ft." if k != "walk" else f"{v} ft." for k, v in m["speed"].items())
+    lines = [
+        f"**{m['name']}** ({m['size']} {m['type']}, {m['alignment']})",
+        f"- **AC:** {m['ac']}",
+        f"- **HP:** {m['hp']} ({m['hit_dice']})",
+        f"- **Speed:** {speed}",
+        "- " + " | ".join(f"**{k.upper()}:** {v} ({mod(v)})" for k, v in ab.items()),
+    ]
+    for label, key in [("Skills", "skills"), ("Resistances", "damage_resistances"),
+                       ("Immunities", "damage_immunities"), ("Senses", "senses"), ("Languages", "languages")]:
+        if m[key]:
+            lines.append(f"- **{label}:** {m[key]}")
+    lines.append(f"- **CR:** {format_cr(m['cr'])} ({m['xp']} XP)")
+    for block in m["traits"] + m["actions"]:
+        lines.append(f"- **{block['name']}:** {block['desc']}")
+    return "\n".join(lines)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def search_monsters(query, cr_min, cr_max, monster_type):
+    return monster_db.search(query, cr_min=cr_min, cr_max=cr_max,
+                             type=None if monster_type == "Mind" else monster_type, limit=10)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def monster_card(index):
+    return monster_markdown(monster_db.get(index))
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def monster_attack(name):
+    """A névhez (a sorszám nélkül, pl. 'Goblin 3') pontosan illő SRD szörny támadása, vagy None."""
+    monster = monster_db.for_combatant(str(name))
+    return attack_profile(monster) if monster else None
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def monster_defenses(name):
+    """A névhez pontosan illő SRD szörny mentő-bónuszai és sebzés-védelmei, vagy None."""
+    monster = monster_db.for_combatant(str(name))
+    return defense_profile(monster) if monster else None
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def monster_dexterity(name):
+    """A névhez pontosan illő SRD szörny ÜGY értéke (ismeretlennél 10)."""
+    monster = monster_db.for_combatant(str(name))
+    return monster["abilities"]["dex"] if monster else 10
+
+def opportunity_attack_alerts(mover):
+    """Kik kaphattak alkalmi támadást: a VTT térképen (a tokenekhez rendelt harcosok alapján)
+    azok az ellenfelek, akiknek a szomszédságát a mover a köre alatt elhagyta."""
+    positions = st.session_state.get("vtt_positions", {})
+    start = st.session_state.get("turn_start")
+    if not start or start[0] != mover or start[1] is None or mover not in positions:
+        return []
+    index = TokenGrid()
+    for name, pos in positions.items():
+        index.move(name, *pos)
+    is_player = mover in st.session_state.players
+    enemies = {c["Név"]: 1 for c in st.session_state.combatants
+               if (c["Név"] in st.session_state.players) != is_player and c["Név"] in positions and c["HP"] > 0}
+    return opportunity_attacks(index, mover, start[1], positions[mover], enemies)
+
+def sim_defaults(combatant):
+    """Szimulációs sor egy harcosból: szörnynél az SRD támadása, játékosnál átlagos értékek."""
+    name = combatant["Név"]
+    is_player = name in st.session_state.players
+    profile = (None if is_player else monster_attack(name)) or {"attack_bonus": 5, "damage": "1d8+3", "attacks": 1}
+    return {"Név": name, "Játékos": is_player, "HP": int(combatant["HP"]), "AC": int(combatant["AC"]),
+            "Támadás": profile["attack_bonus"], "Sebzés": profile["damage"], "Támadások": profile["attacks"]}
+
+def save_defaults(names, ability, damage_type):
+    """A mentődobás célpontjai táblázatként: szörnynél az SRD mentő-bónusza és védelmei,
+    játékosnál 0 bónusz és nincs védelem (a táblában átírható)."""
+    rows = []
+    for name in names:
+        defenses = None if name in st.session_state.players else monster_defenses(name)
+        defenses = defenses or {"save_bonus": {}, "resistances": [], "immunities": [], "vulnerabilities": []}
+        rows.append({"Név": name, "Mentő bónusz": defenses["save_bonus"].get(ability, 0) if ability else 0,
+                     "Ellenálló": damage_type in defenses["resistances"],
+                     "Immunis": damage_type in defenses["immunities"],
+                     "Sebezhető": damage_type in defenses["vulnerabilities"]})
+    return pd.DataFrame(rows, columns=["Név", "Mentő bónusz", "Ellenálló", "Immunis", "Sebezhető"])
+
+def apply_save_effect(editor_key, names, ability, dc, damage, damage_type, half_on_success):
+    """Egy vektorizált dobás az összes célpontra; a HP-k vissza a harcosokba és a játékosokba.
+    Gomb-callback: a fragment saját újrafutása már a frissített HP-kat rajzolja ki."""
+    table = save_defaults(names, ability, damage_type)
+    for row, changes in st.session_state.get(editor_key, {}).get("edited_rows", {}).items():
+        for col, value in changes.items():
+            table.at[int(row), col] = value
+    by_name = {c["Név"]: c for c in st.session_state.combatants}
+    kind = damage_type or "untyped"
+    targets = [{"id": r["Név"], "name": r["Név"], "hp": int(by_name[r["Név"]]["HP"]),
+                "save_bonus": int(r["Mentő bónusz"]),
+                "resistances": [kind] if r["Ellenálló"] else [], "immunities": [kind] if r["Immunis"] else [],
+                "vulnerabilities": [kind] if r["Sebezhető"] else []}
+               for r in table.to_dict("records") if r["Név"] in by_name]
+    try:
+        results = effects.resolve_save(targets, damage, dc if ability else None, kind, half_on_success)
+    except ValueError as e:
+        st.session_state.save_error = str(e)
+        return
+    st.session_state.save_error = None
+    st.session_state.save_results = results
+    for r in results:
+        by_name[r["id"]]["HP"] = r["hp_after"]
+        if r["id"] in st.session_state.players:
+            st.session_state.players[r["id"]]["hp"] = r["hp_after"]
+    combatants_changed()
+
+def combatants_changed():
+    st.session_state.combatants_rev += 1
+
+def combatant_dexterity(combatant):
+    """A harcos ÜGY értéke: a tárolt "ÜGY" mező, régebbi bejegyzésnél játékosnak 10, szörnynek az SRD-ből."""
+    if combatant.get("ÜGY") is not None:
+        return int(combatant["ÜGY"])
+    return 10 if combatant["Név"] in st.session_state.players else monster_dexterity(combatant["Név"])
+
+def initiative_key(combatant):
+    """A sorrend egyetlen kulcsa: magasabb kezdeményezés előbb, egyezésnél a nagyobb ÜGY."""
+    return -int(combatant["Kezdeményezés"]), -combatant_dexterity(combatant)
+
+def sort_combatants():
+    """Teljes (stabil) rendezés, az aktív harcos jelölése a helyén marad. Csak a munkamenet
+    elején és a kezdeményezés / ÜGY kézi átírásakor kell; a beszúrások már a helyükre kerülnek."""
+    combatants = st.session_state.combatants
+    active = combatants[st.session_state.current_turn] if 0 <= st.session_state.current_turn < len(combatants) else None
+    for combatant in combatants:
+        combatant["ÜGY"] = combatant_dexterity(combatant)
+    combatants.sort(key=initiative_key)
+    if active is not None:
+        st.session_state.current_turn = next(i for i, c in enumerate(combatants) if c is active)
+    combatants_changed()
+
+def add_combatant(combatant):
+    """Beszúrás a kezdeményezési sorrendbe bisecttel (nem rendezzük újra az egész listát);
+    teljes egyezésnél az újonnan érkező kerül hátrébb. Az aktív harcos jelölése a helyén marad."""
+    combatants = st.session_state.combatants
+    pos = bisect.bisect_right(combatants, initiative_key(combatant), key=initiative_key)
+    if combatants and pos <= st.session_state.current_turn:
+        st.session_state.current_turn += 1
+    combatants.insert(pos, combatant)
+    combatants_changed()
+
+def add_new_combatant():
+    if st.session_state.new_name:
+        add_combatant({"Név": st.session_state.new_name, "Kezdeményezés": st.session_state.new_init,
+                       "ÜGY": st.session_state.new_dex, "HP": st.session_state.new_hp, "AC": st.session_state.new_ac})
+
+def add_monster_group():
+    """N példány egy szörnyből: egy vektorizált kezdeményezés-dobás, sorszámozott nevek, és a
+    meglévő sorrendbe összefésülés (nem teljes újrarendezés); holtversenynél a nagyobb ÜGY lép előbb."""
+    monster = st.session_state.get("group_monster")
+    if not monster:
+        return
+    name, dex = monster["name"], monster_db.by_index[monster["index"]]["abilities"]["dex"]
+    combatants = st.session_state.combatants
+    taken = [c["Név"][len(name) + 1:] for c in combatants if c["Név"].startswith(name + " ")]
+    first = max([int(n) for n in taken if n.isdigit()], default=0) + 1
+    rolls = roll_initiative(st.session_state.group_count, (dex - 10) // 2, st.session_state.group_shared)
+    group = sorted(({"Név": f"{name} {first + i}", "Kezdeményezés": int(roll), "ÜGY": dex,
+                     "HP": monster["hp"], "AC": monster["ac"]} for i, roll in enumerate(rolls)), key=initiative_key)
+    active = combatants[st.session_state.current_turn] if combatants else None
+    st.session_state.combatants = list(heapq.merge(combatants, group, key=initiative_key))
+    if active is not None:
+        st.session_state.current_turn = next(i for i, c in enumerate(st.session_state.combatants) if c is active)
+    combatants_changed()
+
+def pull_players():
+    present = {c["Név"] for c in st.session_state.combatants}
+    for p_name, p_data in st.session_state.players.items():
+        # Ellenőrizzük, hogy nincs-e már bent
+        if p_name not in present:
+            add_combatant({"Név": p_name, "Kezdeményezés": 0, "ÜGY": 10,  # Ezeket majd a DM beírja
+                           "HP": p_data["hp"], "AC": p_data["ac"]})
+
+def clear_combat():
+    st.session_state.combatants = []
+    st.session_state.round_number = 1
+    st.session_state.current_turn = 0
+    st.session_state.oa_alerts = (None, [])
+    st.session_state.save_targets = []
+    st.session_state.save_results = []
+    combatants_changed()
+
+def tracker_frame():
+    """A sorrend táblázata az "Aktív" jelöléssel; csak a harcosok vagy az aktív kör változásakor épül újra."""
+    key = (st.session_state.combatants_rev, st.session_state.current_turn)
+    cached = st.session_state.get("combat_frame")
+    if cached is None or cached[0] != key:
+        df = pd.DataFrame(st.session_state.combatants)
+        df.insert(0, "Aktív", ["🟢" if i == st.session_state.current_turn else "" for i in range(len(df))])
+        cached = (key, df)
+        st.session_state.combat_frame = cached
+    return cached[1]
+
+def sim_frame():
+    key = st.session_state.combatants_rev
+    cached = st.session_state.get("sim_frame")
+    if cached is None or cached[0] != key:
+        cached = (key, pd.DataFrame([sim_defaults(c) for c in st.session_state.combatants]))
+        st.session_state.sim_frame = cached
+    return cached[1]
+
+def apply_edits(editor_key):
+    """A data_editor módosított cellái (és csak azok) vissza a harcosokba; a játékosok HP-ja a globális state-be."""
+    combatants = st.session_state.combatants
+    reorder = False
+    for row, changes in st.session_state[editor_key]["edited_rows"].items():
+        combatant = combatants[int(row)]
+        combatant.update({col: value for col, value in changes.items() if col != "Aktív"})
+        reorder |= "Kezdeményezés" in changes or "ÜGY" in changes
+        if "HP" in changes and combatant["Név"] in st.session_state.players:
+            st.session_state.players[combatant["Név"]]["hp"] = combatant["HP"]
+    if reorder:
+        sort_combatants()
+    else:
+        combatants_changed()
 
 def next_turn():
     """Lépteti a kört és a kezdeményezést"""
     if not st.session_state.combatants:
         return
-        
+
+    mover = st.session_state.combatants[st.session_state.current_turn % len(st.session_state.combatants)]["Név"]
+    st.session_state.oa_alerts = (mover, opportunity_attack_alerts(mover))
+
     st.session_state.current_turn += 1
     # Ha körbeértünk, új harci kör kezdődik
     if st.session_state.current_turn >= len(st.session_state.combatants):
         st.session_state.current_turn = 0
         st.session_state.round_number += 1
 
+    # Az új aktív harcos kiinduló helye a térképen (ha van tokenje)
+    active = st.session_state.combatants[st.session_state.current_turn]["Név"]
+    st.session_state.turn_start = (active, st.session_state.get("vtt_positions", {}).get(active))
+
+# Régebbi (ÜGY nélkül mentett) lista egyszeri rendbetétele a munkamenet elején
+if "combatants_sorted" not in st.session_state:
+    sort_combatants()
+    st.session_state.combatants_sorted = True
+
 # ==========================================
 # 3. FELÜLET KIALAKÍTÁSA (Két oszlop)
 # ==========================================
-col_tracker, col_tools = st.columns([2, 1])
-
-# --- BAL OSZLOP: KEZDEMÉNYEZÉS KÖVETŐ ---
-with col_tracker:
+# A részek fragmentként futnak: egy gombnyomás csak a saját részét futtatja újra, nem az egész oldalt.
+@st.fragment(key="initiative_tracker")
+def initiative_tracker():
     st.header(f"⏱️ Harci Kör: {st.session_state.round_number}")
-    
+
     # Harcosok hozzáadása
     with st.expander("➕ Új harcos hozzáadása", expanded=False):
-        c1, c2, c3, c4 = st.columns(4)
-        new_name = c1.text_input("Név", key="new_name")
-        new_init = c2.number_input("Kezdeményezés", value=10, key="new_init")
-        new_hp = c3.number_input("HP", value=10, key="new_hp")
-        new_ac = c4.number_input("AC (Vért)", value=10, key="new_ac")
-        
+        c1, c2, c3, c4, c5 = st.columns(5)
+        c1.text_input("Név", key="new_name")
+        c2.number_input("Kezdeményezés", value=10, key="new_init")
+        c3.number_input("ÜGY", value=10, key="new_dex")
+        c4.number_input("HP", value=10, key="new_hp")
+        c5.number_input("AC (Vért)", value=10, key="new_ac")
+
         btn_col1, btn_col2 = st.columns(2)
-        if btn_col1.button("Hozzáadás", use_container_width=True):
-            if new_name:
-                st.session_state.combatants.append({
-                    "Név": new_name, "Kezdeményezés": new_init, "HP": new_hp, "AC": new_ac
-                })
-                # Újrarendezzük csökkenő sorrendbe kezdeményezés alapján
-                st.session_state.combatants = sorted(st.session_state.combatants, key=lambda x: x["Kezdeményezés"], reverse=True)
-                st.rerun()
-                
-        if btn_col2.button("Játékosok áthúzása a Dashboardról", use_container_width=True):
-            if st.session_state.players:
-                for p_name, p_data in st.session_state.players.items():
-                    # Ellenőrizzük, hogy nincs-e már bent
-                    if not any(c["Név"] == p_name for c in st.session_state.combatants):
-                        st.session_state.combatants.append({
-                            "Név": p_name, 
-                            "Kezdeményezés": 0, # Ezt majd a DM beírja
-                            "HP": p_data["hp"], 
-                            "AC": p_data["ac"]
-                        })
-                st.session_state.combatants = sorted(st.session_state.combatants, key=lambda x: x["Kezdeményezés"], reverse=True)
-                st.rerun()
+        btn_col1.button("Hozzáadás", use_container_width=True, on_click=add_new_combatant)
+        btn_col2.button("Játékosok áthúzása a Dashboardról", use_container_width=True, on_click=pull_players)
+
+    with st.expander("👹 Szörnycsoport hozzáadása (SRD)", expanded=False):
+        g1, g2 = st.columns([2, 1])
+        group_query = g1.text_input("Szörny", placeholder="pl. Goblin", key="group_query")
+        g2.number_input("Darab", min_value=1, max_value=MAX_GROUP, value=4, key="group_count")
+        if group_query:
+            st.selectbox("Találatok", search_monsters(group_query, 0, 30, "Mind"), key="group_monster",
+                         format_func=lambda m: f"{m['name']} (CR {format_cr(m['cr'])}, HP {m['hp']}, AC {m['ac']})")
+            st.checkbox("Közös kezdeményezés a csoportnak", key="group_shared")
+            st.button("🎲 Kezdeményezés dobása és hozzáadás", use_container_width=True, on_click=add_monster_group)
 
     # Harci sorrend megjelenítése (Interaktív táblázat)
     if st.session_state.combatants:
         # Gombok a vezérléshez
         c_prev, c_next, c_clear = st.columns([1, 2, 1])
-        if c_next.button("⏭️ Következő Kör (Next Turn)", type="primary", use_container_width=True):
-            next_turn()
-            st.rerun()
-        if c_clear.button("🗑️ Harc vége (Törlés)"):
-            st.session_state.combatants = []
-            st.session_state.round_number = 1
-            st.session_state.current_turn = 0
-            st.rerun()
+        c_next.button("⏭️ Következő Kör (Next Turn)", type="primary", use_container_width=True, on_click=next_turn)
+        mover, attackers = st.session_state.get("oa_alerts", (None, []))
+        if attackers:
+            st.warning(f"⚠️ Alkalmi támadás! **{mover}** elhagyta a közelségét: {', '.join(attackers)}")
+        c_clear.button("🗑️ Harc vége (Törlés)", on_click=clear_combat)
 
         # Vizuális jelzés, kinek a köre van
         st.markdown("### Sorrend")
-        
-        # A st.data_editor-t használjuk itt is, de dinamikusan formázzuk
-        # DataFrame-be rakjuk a szebb megjelenítésért
-        df = pd.DataFrame(st.session_state.combatants)
-        
-        # Hozzáadunk egy vizuális mutatót az aktív körhöz
-        df.insert(0, "Aktív", ["🟢" if i == st.session_state.current_turn else "" for i in range(len(df))])
-        
-        edited_combatants = st.data_editor(
-            df,
+
+        # A szerkesztő kulcsa a lista verziójával változik, így a régi sorindexű módosítások
+        # nem csúsznak át egy beszúrás után másik harcosra
+        editor_key = f"combat_editor_{st.session_state.combatants_rev}"
+        st.data_editor(
+            tracker_frame(),
             hide_index=True,
             use_container_width=True,
             disabled=["Aktív"], # Az aktív oszlopot nem szerkesztheti manuálisan
-            key="combat_editor"
+            key=editor_key,
+            on_change=apply_edits,
+            args=(editor_key,),
         )
-        
-        # Visszamentjük a szerkesztett adatokat (pl. ha valaki sebződött)
-        if not edited_combatants.equals(df):
-            # Frissítjük a session state-t a módosított adatokkal, de az "Aktív" oszlopot eldobjuk
-            st.session_state.combatants = edited_combatants.drop(columns=["Aktív"]).to_dict('records')
-            # Visszaírjuk a játékosok HP-ját a globális state-be, ha az változott
-            for combatant in st.session_state.combatants:
-                if combatant["Név"] in st.session_state.players:
-                    st.session_state.players[combatant["Név"]]["hp"] = combatant["HP"]
-            # Itt nem hívunk rerun-t, mert végtelen ciklust okozhat a data_editor-ral, 
-            # de a háttérben már frissültek az adatok.
+
+        with st.expander("💥 Mentődobás / sebzés több célpontra", expanded=False):
+            st.caption("Pl. tűzgolyó: DEX mentő DC 15, 8d6 fire, sikernél fele. A sebzést egyszer dobjuk "
+                       "mindenkire, a mentőt célpontonként.")
+            names = st.multiselect("Célpontok", [c["Név"] for c in st.session_state.combatants], key="save_targets")
+            s1, s2, s3, s4 = st.columns(4)
+            ability = s1.selectbox("Mentő", [None] + list(ABILITIES), index=2,
+                                   format_func=lambda a: "Nincs" if a is None else a.upper())
+            dc = s2.number_input("DC", min_value=1, max_value=30, value=15)
+            damage = s3.text_input("Sebzés", value="8d6")
+            damage_type = s4.selectbox("Típus", [None] + list(DAMAGE_TYPES), index=DAMAGE_TYPES.index("fire") + 1,
+                                       format_func=lambda t: "—" if t is None else t)
+            half = st.checkbox("Sikernél fele sebzés", value=True)
+            if names:
+                save_key = f"save_editor_{'|'.join(names)}_{ability}_{damage_type}"
+                st.data_editor(save_defaults(names, ability, damage_type), hide_index=True,
+                               use_container_width=True, disabled=["Név"], key=save_key)
+                st.button("💥 Alkalmazás", use_container_width=True, on_click=apply_save_effect,
+                          args=(save_key, names, ability, dc, damage, damage_type, half))
+            if st.session_state.get("save_error"):
+                st.error(st.session_state.save_error)
+            if st.session_state.get("save_results"):
+                st.dataframe(pd.DataFrame([{"Név": r["name"], "Mentő": r["save_total"],
+                                            "Siker": "✅" if r["success"] else "❌", "Dobás": r["rolled"],
+                                            "Sebzés": r["damage"], "HP": f"{r['hp_before']} ➡️ {r['hp_after']}"}
+                                           for r in st.session_state.save_results]),
+                             hide_index=True, use_container_width=True)
+
+        with st.expander("📊 Nehézség becslése (Monte Carlo szimuláció)", expanded=False):
+            st.caption("A harcot sokezerszer lejátsszuk: mindenki véletlen, még álló ellenfelet támad. "
+                       "A szörnyek támadása az SRD-ből jön, a játékosoké átírható.")
+            sim_table = st.data_editor(sim_frame(), hide_index=True, use_container_width=True,
+                                       key=f"sim_editor_{st.session_state.combatants_rev}")
+            trials = st.select_slider("Próbák száma", [1000, 5000, 10000, 20000], value=10000)
+            if st.button("🎲 Szimuláció indítása", use_container_width=True):
+                creatures = [{"name": r["Név"], "is_player": bool(r["Játékos"]), "hp": int(r["HP"]), "ac": int(r["AC"]),
+                              "attack_bonus": int(r["Támadás"]), "damage": str(r["Sebzés"]),
+                              "attacks": int(r["Támadások"])} for r in sim_table.to_dict("records")]
+                try:
+                    with st.spinner("Szimuláció fut..."):
+                        result = simulator.simulate(creatures, trials)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    m1, m2, m3 = st.columns(3)
+                    m1.metric("Győzelmi esély", f"{result['win_probability']:.0%}")
+                    m2.metric("Várható körök", result["expected_rounds"] or "—")
+                    m3.metric("Eleső játékosok (várható)", result["expected_downed_pcs"])
+                    st.bar_chart(pd.Series(result["downed_pcs_distribution"], name="Valószínűség"),
+                                 x_label="Eleső játékosok", y_label="Valószínűség")
+                    st.caption(f"{result['trials']} próba, {result['elapsed_ms']:.0f} ms")
 
     else:
         st.info("A harcmező üres. Adj hozzá résztvevőket!")
 
-# --- JOBB OSZLOP: KOCKADOBÓ ÉS SZÖRNYEK ---
-with col_tools:
+    # Mentés (csak ha változott; a lemezre írás a háttérben, kötegelve történik)
+    persist_state("players", "combatants", "round_number", "current_turn")
+
+@st.fragment(key="dice_roller")
+def dice_roller():
     st.subheader("🎲 DM Kockadobó (Rejtett)")
-    
+
     dice_input = st.text_input("Makró (pl. 1d20+5, 8d6):", value="1d20", key="dice_input")
     if st.button("Dobás!", use_container_width=True):
         total, result_text = roll_dice(dice_input)
@@ -168,29 +422,36 @@ with col_tools:
             st.session_state.dice_history = st.session_state.dice_history[:5]
         else:
             st.error(result_text)
-            
+
     # Dobástörténet megjelenítése
     for hist in st.session_state.dice_history:
         st.info(hist)
 
-    st.divider()
-    
+@st.fragment(key="monster_lookup")
+def monster_lookup():
     st.subheader("🐉 Gyors Szörny Statisztika")
-    st.caption("Későbbi fejlesztés: Open5e API integráció vagy helyi adatbázis (JSON).")
-    search_monster = st.text_input("Szörny keresése (Demó):", placeholder="pl. Goblin")
-    
-    if search_monster.lower() == "goblin":
-        st.markdown("""
-        **Goblin** (Small humanoid)
-        - **AC:** 15 (Leather armor, shield)
-        - **HP:** 7 (2d6)
-        - **Speed:** 30 ft.
-        - **STR:** 8 (-1) | **DEX:** 14 (+2) | **CON:** 10 (+0)
-        - **Skills:** Stealth +6
-        - **Senses:** Darkvision 60 ft., Passive Perception 9
-        - **Nimble Escape:** The goblin can take the Disengage or Hide action as a bonus action.
-        - **Scimitar:** +4 to hit, 1d6 + 2 slashing dmg.
-        - **Shortbow:** +4 to hit, 1d6 + 2 piercing dmg.
-        """)
-    elif search_monster:
-        st.warning("Szörny nem található a demó adatbázisban. (Próbáld: 'Goblin')")
+    st.caption("Helyi SRD adatbázis (offline). Elgépelést is tűr, pl. 'gbolin'.")
+    search_monster = st.text_input("Szörny keresése:", placeholder="pl. Goblin")
+    f_cr, f_type = st.columns(2)
+    cr_range = f_cr.select_slider("CR", options=CR_OPTIONS, value=(0, 30))
+    monster_type = f_type.selectbox("Típus", ["Mind"] + MONSTER_TYPES)
+
+    if search_monster or monster_type != "Mind" or cr_range != (0, 30):
+        results = search_monsters(search_monster, cr_range[0], cr_range[1], monster_type)
+        if results:
+            picked = st.selectbox("Találatok", results, format_func=lambda m: f"{m['name']} (CR {format_cr(m['cr'])})")
+            st.markdown(monster_card(picked["index"]))
+        else:
+            st.warning("Szörny nem található az SRD adatbázisban.")
+
+col_tracker, col_tools = st.columns([2, 1])
+
+# --- BAL OSZLOP: KEZDEMÉNYEZÉS KÖVETŐ ---
+with col_tracker:
+    initiative_tracker()
+
+# --- JOBB OSZLOP: KOCKADOBÓ ÉS SZÖRNYEK ---
+with col_tools:
+    dice_roller()
+    st.divider()
+    monster_lookup()
@@ -32,10 +32,8 @@ with tab1:
 
         # Válasz generálása a utils-ból
         with st.chat_message("assistant"):
-            with st.spinner("A szabálykönyvek lapozgatása..."):
-                # Itt hívjuk meg a tiszta függvényünket!
-                response_text = ask_rules_lawyer(st.session_state.chat_history)
-                st.markdown(response_text)
+            # Streamelve: az első token azonnal megjelenik, nem kell a teljes válaszra várni
+            response_text = st.write_stream(ask_rules_lawyer(st.session_state.chat_history, stream=True))
                 
             st.session_state.chat_history.append({"role": "assistant", "content": response_text})
 
@@ -54,15 +52,13 @@ with tab2:
         npc_vibe = st.text_input("Hangulat / Jellemző", "Barátságos, de kicsit kapzsi")
 
     if st.button("🎭 NJK Generálása", use_container_width=True):
-        with st.spinner("Az istenek formálják a lelket..."):
-            # Itt hívjuk meg a tiszta NJK generátor függvényünket!
-            npc_result = generate_npc(npc_race, npc_role, npc_vibe)
-            
-            if "Hiba" in npc_result:
-                st.error(npc_result)
-            else:
-                st.success("NJK Sikeresen Legenerálva!")
-                st.markdown(npc_result)
+        # Streamelve írjuk ki, ahogy az istenek formálják a lelket
+        npc_result = st.write_stream(generate_npc(npc_race, npc_role, npc_vibe, stream=True))
+
+        if "Hiba" in npc_result:
+            st.error("Az NJK generálása nem sikerült.")
+        else:
+            st.success("NJK Sikeresen Legenerálva!")
 
 # ==========================================
 # 3. FÜL: HELYSZÍN LEÍRÁS
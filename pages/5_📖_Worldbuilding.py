@@ -2,42 +2,40 @@ import streamlit as st
 import pandas as pd
 from streamlit_agraph import agraph, Node, Edge, Config
 
+from utils.session_state import init_state, persist_state
+
 st.set_page_config(page_title="Worldbuilding", page_icon="📖", layout="wide")
 st.title("📖 Világépítés és Kampány Menedzsment")
 
 # ==========================================
 # 1. ÁLLAPOT INICIALIZÁLÁSA
 # ==========================================
-if "calendar" not in st.session_state:
-    st.session_state.calendar = {"nap": 14, "honap": "Tavasz", "idojaras": "Enyhe eső", "ido": "14:30"}
+# A mentett (SQLite) állapot elsőbbséget élvez az alapértelmezettekkel szemben
+init_state("calendar", {"nap": 14, "honap": "Tavasz", "idojaras": "Enyhe eső", "ido": "14:30"})
 
-if "factions" not in st.session_state:
-    st.session_state.factions = pd.DataFrame([
-        {"Frakció": "A Korona Őrsége", "Hírnév (Reputation)": 10, "Státusz": "Szövetséges", "Vezető": "Lord Kaelen"},
-        {"Frakció": "Zhentarim (Fekete Hálózat)", "Hírnév (Reputation)": -5, "Státusz": "Gyanakvó", "Vezető": "Ismeretlen"},
-        {"Frakció": "Tolvajcéh", "Hírnév (Reputation)": 0, "Státusz": "Semleges", "Vezető": "A Keresztapa"}
-    ])
+init_state("factions", pd.DataFrame([
+    {"Frakció": "A Korona Őrsége", "Hírnév (Reputation)": 10, "Státusz": "Szövetséges", "Vezető": "Lord Kaelen"},
+    {"Frakció": "Zhentarim (Fekete Hálózat)", "Hírnév (Reputation)": -5, "Státusz": "Gyanakvó", "Vezető": "Ismeretlen"},
+    {"Frakció": "Tolvajcéh", "Hírnév (Reputation)": 0, "Státusz": "Semleges", "Vezető": "A Keresztapa"}
+]))
 
-if "graph_nodes" not in st.session_state:
-    # Alapértelmezett csomópontok (Szereplők / Frakciók)
-    st.session_state.graph_nodes = [
-        {"id": "Party", "label": "Kalandorok", "color": "#FFD700", "size": 25, "shape": "star"},
-        {"id": "King", "label": "A Király", "color": "#4169E1", "size": 20, "shape": "dot"},
-        {"id": "Zhentarim", "label": "Zhentarim", "color": "#8B0000", "size": 20, "shape": "dot"},
-        {"id": "Bob", "label": "Bob, a Kocsmáros", "color": "#228B22", "size": 15, "shape": "dot"}
-    ]
+# Alapértelmezett csomópontok (Szereplők / Frakciók)
+init_state("graph_nodes", [
+    {"id": "Party", "label": "Kalandorok", "color": "#FFD700", "size": 25, "shape": "star"},
+    {"id": "King", "label": "A Király", "color": "#4169E1", "size": 20, "shape": "dot"},
+    {"id": "Zhentarim", "label": "Zhentarim", "color": "#8B0000", "size": 20, "shape": "dot"},
+    {"id": "Bob", "label": "Bob, a Kocsmáros", "color": "#228B22", "size": 15, "shape": "dot"}
+])
 
-if "graph_edges" not in st.session_state:
-    # Alapértelmezett kapcsolatok (Élek)
-    st.session_state.graph_edges = [
-        {"source": "Party", "target": "Bob", "label": "Törzsvendégek"},
-        {"source": "Party", "target": "King", "label": "Megbízottjai"},
-        {"source": "Zhentarim", "target": "Party", "label": "Vadásznak rájuk"},
-        {"source": "Zhentarim", "target": "King", "label": "Beépültek"}
-    ]
+# Alapértelmezett kapcsolatok (Élek)
+init_state("graph_edges", [
+    {"source": "Party", "target": "Bob", "label": "Törzsvendégek"},
+    {"source": "Party", "target": "King", "label": "Megbízottjai"},
+    {"source": "Zhentarim", "target": "Party", "label": "Vadásznak rájuk"},
+    {"source": "Zhentarim", "target": "King", "label": "Beépültek"}
+])
 
-if "dm_notes" not in st.session_state:
-    st.session_state.dm_notes = "Ide írhatod a titkos DM jegyzeteidet a kampányhoz..."
+init_state("dm_notes", "Ide írhatod a titkos DM jegyzeteidet a kampányhoz...")
 
 # ==========================================
 # 2. FELÜLET KIALAKÍTÁSA (Fülek)
@@ -125,4 +123,7 @@ with tab3:
 with tab4:
     st.subheader("Kalandmesteri Jegyzetek")
     st.session_state.dm_notes = st.text_area("Wiki / Titkok / Emlékeztetők", value=st.session_state.dm_notes, height=300)
-    st.caption("Ezek az adatok a munkamenet (Session) végéig megmaradnak. Később ide beköthetünk egy Mentés fájlba (JSON/SQLite) gombot is.")
+    st.caption("Az adatok automatikusan mentődnek (SQLite), így böngészőfrissítés és újraindítás után is megmaradnak.")
+
+# Mentés (csak ha változott; a lemezre írás a háttérben, kötegelve történik)
+persist_state("calendar", "factions", "graph_nodes", "graph_edges", "dm_notes")
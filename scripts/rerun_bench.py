@@ -0,0 +1,146 @@
+"""A Combat oldal újrafutási idejének mérése N harcossal (Streamlit AppTest).
+
+Futtatás:  python scripts/rerun_bench.py 10 40 80
+
+Két számot mér a "Következő Kör" gombra: a teljes szkript újrafutását és a böngészőbeli
+viselkedést, amikor csak a gombot tartalmazó fragment (initiative_tracker) fut újra.
+Az AppTest magától mindig a teljes szkriptet futtatja; a fragment-futáshoz a kérésbe
+beletesszük a fragment azonosítóját, ahogy a böngésző is teszi. Az idő a szkript-szál
+futásideje: az AppTest saját várakozása (pollozás) nincs benne, és a lefordított szkriptet
+futások között megtartjuk (mint a szerver), különben minden futás a fordítást mérné.
+
+A mérés ideiglenes adatbázisba ír (CAMPAIGN_DB), a valódi campaign.db-hez nem nyúl.
+
+A fragment-futás és az időmérés a Streamlit belső (nem publikus) részeire épül; a szkript
+a TESTED_STREAMLIT verzióval készült (pip install streamlit==1.66.0). Más verziónál
+figyelmeztet, és ha a belső részek megváltoztak, érthető hibával áll le.
+"""
+import os
+import sys
+import tempfile
+
+# Még az oldal (és a utils.state_db) betöltése előtt, hogy a mentett harc ne íródjon felül
+_db_dir = tempfile.TemporaryDirectory(prefix="rerun-bench-")
+os.environ["CAMPAIGN_DB"] = os.path.join(_db_dir.name, "bench.db")
+
+import functools
+import statistics
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+
+import streamlit
+from streamlit.testing.v1 import AppTest
+
+TESTED_STREAMLIT = "1.66.0"
+
+
+def unsupported(what: str, error: Exception) -> SystemExit:
+    return SystemExit(f"A rerun_bench a Streamlit {TESTED_STREAMLIT} belső részeire épül, "
+                      f"a telepített {streamlit.__version__} eltér: {what} ({error!r}). "
+                      f"Futtasd: pip install streamlit=={TESTED_STREAMLIT}")
+
+
+try:
+    from streamlit.runtime.scriptrunner import RerunData
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+    # A lenti mock.patch-ek célpontjai
+    for owner, name in ((local_script_runner.LocalScriptRunner, "_run_script_thread"),
+                        (local_script_runner, "RerunData"), (local_script_runner, "ScriptCache")):
+        getattr(owner, name)
+except (ImportError, AttributeError) as e:
+    raise unsupported("hiányzó belső modul / attribútum", e)
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+COMBAT_PAGE = ROOT / "pages" / "3_⚔️_Combat.py"
+CLICKS = 10
+
+
+def seed_combatants(n: int) -> list:
+    return [{"Név": f"Goblin {i + 1}", "Kezdeményezés": 20 - i % 20, "HP": 7, "AC": 15} for i in range(n)]
+
+
+@contextmanager
+def fragment_rerun(at: AppTest, fragment_key: str):
+    """A következő at.run() csak a megadott fragmentet futtatja (mint a böngészőben egy
+    fragmenten belüli kattintás). Az AppTest ezt nem támogatja, ezért a belső tárolóból
+    vesszük a fragment azonosítóját."""
+    try:
+        fragment_id = next(iter(at._fragment_storage._ids_by_target_key[fragment_key]))
+    except (AttributeError, KeyError, StopIteration) as e:
+        raise unsupported(f"a(z) '{fragment_key}' fragment azonosítója nem olvasható ki", e)
+    rerun = functools.partial(RerunData, fragment_id_queue=[fragment_id])
+    with mock.patch.object(local_script_runner, "RerunData", rerun):
+        yield
+
+
+@contextmanager
+def timed_runs():
+    """A szkript-szál futásideje (ms) futásonként a visszaadott listába."""
+    times = []
+    original = local_script_runner.LocalScriptRunner._run_script_thread
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            original(self)
+        finally:
+            times.append((time.perf_counter() - started) * 1000)
+
+    with mock.patch.object(local_script_runner.LocalScriptRunner, "_run_script_thread", run):
+        yield times
+
+
+def click_next_turn(at: AppTest, fragment: bool) -> float:
+    button = next(b for b in at.button if "Következő Kör" in b.label)
+    turn = at.session_state.current_turn
+    with timed_runs() as times:
+        if fragment:
+            with fragment_rerun(at, "initiative_tracker"):
+                button.click().run()
+        else:
+            button.click().run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    if at.session_state.current_turn == turn:
+        raise RuntimeError("A gombnyomás nem léptette a kört.")
+    return sum(times)
+
+
+def measure(n: int, clicks: int = CLICKS) -> dict:
+    """Első futás, valamint a "Következő Kör" medián ideje ms-ben teljes és fragment újrafutással."""
+    cache = ScriptCache()
+    with mock.patch.object(local_script_runner, "ScriptCache", lambda: cache):
+        return _measure(n, clicks)
+
+
+def _measure(n: int, clicks: int) -> dict:
+    at = AppTest.from_file(str(COMBAT_PAGE), default_timeout=60)
+    at.session_state["players"] = {}
+    at.session_state["combatants"] = seed_combatants(n)
+    at.session_state["current_turn"] = 0
+    with timed_runs() as times:
+        at.run()
+    first = sum(times)
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    full = [click_next_turn(at, fragment=False) for _ in range(clicks)]
+    fragment = [click_next_turn(at, fragment=True) for _ in range(clicks)]
+    return {"combatants": n, "first_ms": round(first, 1),
+            "full_rerun_ms": round(statistics.median(full), 1),
+            "fragment_rerun_ms": round(statistics.median(fragment), 1)}
+
+
+if __name__ == "__main__":
+    if streamlit.__version__ != TESTED_STREAMLIT:
+        print(f"Figyelem: a mérés a Streamlit {TESTED_STREAMLIT}-hez készült, "
+              f"a telepített {streamlit.__version__}.", file=sys.stderr)
+    for n in [int(a) for a in sys.argv[1:]] or [10, 40, 80]:
+        result = measure(n)
+        print(f"{result['combatants']:>4} harcos: első futás {result['first_ms']:>7.1f} ms, "
+              f"Következő Kör: teljes {result['full_rerun_ms']:>6.1f} ms, "
+              f"fragment {result['fragment_rerun_ms']:>6.1f} ms")
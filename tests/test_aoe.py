@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from utils.aoe import template_cells
+
+
+def cells(*args, **kwargs) -> set:
+    """Az érintett cellák (sor, oszlop) halmaza."""
+    region, mask = template_cells(*args, **kwargs)
+    if region is None:
+        return set()
+    r0, c0, _, _ = region
+    return {(r0 + int(r), c0 + int(c)) for r, c in zip(*np.nonzero(mask))}
+
+
+def test_circle_on_a_grid_corner():
+    assert cells("circle", 2.0, 2.0, 1.0, 10, 10) == {(1, 1), (1, 2), (2, 1), (2, 2)}
+
+
+def test_circle_edge_through_cell_centers_counts_as_hit():
+    # A sugár pontosan a szomszédos cellák középpontjáig ér
+    assert cells("circle", 2.5, 2.5, 1.0, 10, 10) == {(2, 2), (1, 2), (3, 2), (2, 1), (2, 3)}
+    assert len(cells("circle", 2.5, 2.5, 1.5, 10, 10)) == 9
+
+
+def test_line_half_covered_rows_are_included():
+    # 1 széles vonal a 2-es sor felső élén: az 1. és 2. sor középpontja pontosan a szélén van
+    assert cells("line", 0.0, 2.0, 3.0, 10, 10, direction=0) == {(r, c) for r in (1, 2) for c in range(3)}
+
+
+def test_cube_from_face_center():
+    assert cells("cube", 2.0, 2.0, 2.0, 10, 10, direction=0) == {(1, 2), (1, 3), (2, 2), (2, 3)}
+
+
+def test_cone_widens_with_distance():
+    assert cells("cone", 0.0, 2.5, 3.0, 10, 10, direction=0) == {(2, 0), (2, 1), (2, 2), (1, 2), (3, 2)}
+
+
+def test_direction_is_clockwise_with_y_down():
+    # 90 fok = dél (lefelé)
+    assert cells("line", 2.5, 0.0, 2.0, 10, 10, direction=90, width=0.5) == {(0, 2), (1, 2)}
+
+
+def test_clipped_to_the_map():
+    assert cells("circle", 0.0, 0.0, 1.0, 5, 5) == {(0, 0)}
+    region, mask = template_cells("circle", -10.0, -10.0, 2.0, 5, 5)
+    assert region is None and mask.size == 0
+
+
+@pytest.mark.parametrize("shape, size", [("hexagon", 3.0), ("circle", 0.0), ("cone", -1.0)])
+def test_invalid_templates(shape, size):
+    with pytest.raises(ValueError):
+        template_cells(shape, 1.0, 1.0, size, 5, 5)
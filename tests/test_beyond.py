@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+import pytest
+
+from utils.beyond import MAX_PARTY, BeyondClient, BeyondError
+
+CHARACTER = {"data": {
+    "name": "Thorin",
+    "stats": [{"id": i, "value": 14} for i in range(1, 7)],
+    "classes": [{"level": 3}],
+    "baseHitPoints": 24,
+    "removedHitPoints": 4,
+}}
+
+
+class StubBeyond:
+    """Helyi Beyond stub: ETag-et ad, és If-None-Match egyezésnél 304-et."""
+
+    def __init__(self, body=CHARACTER, etag='"v1"'):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.url.path.rstrip("/").endswith("/404"):
+            return httpx.Response(404)
+        if request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304)
+        if isinstance(self.body, str):
+            return httpx.Response(200, text=self.body, headers={"etag": self.etag})
+        return httpx.Response(200, json=self.body, headers={"etag": self.etag})
+
+
+def client(stub: StubBeyond, **kwargs) -> BeyondClient:
+    http = httpx.AsyncClient(transport=httpx.MockTransport(stub))
+    return BeyondClient(http=http, base_url="https://beyond.test/character", **kwargs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_304_revalidation_returns_cached_copy():
+    stub = StubBeyond()
+    beyond = client(stub)
+    first = run(beyond.fetch("123"))
+    first["hp"] = 0  # a hívó módosítása nem szennyezheti a cache-t
+    second = run(beyond.fetch("123"))
+
+    assert [r.headers.get("if-none-match") for r in stub.requests] == [None, '"v1"']
+    assert second["name"] == "Thorin"
+    assert second["hp"] == second["max_hp"] - 4
+
+
+def test_changed_character_is_parsed_again():
+    stub = StubBeyond()
+    beyond = client(stub)
+    run(beyond.fetch("123"))
+    stub.etag = '"v2"'
+    stub.body = {"data": dict(CHARACTER["data"], name="Thorin II")}
+    assert run(beyond.fetch("123"))["name"] == "Thorin II"
+
+
+def test_cache_is_bounded_lru():
+    stub = StubBeyond()
+    beyond = client(stub, cache_size=2)
+    for cid in ("1", "2", "1", "3"):
+        run(beyond.fetch(cid))
+    assert list(beyond._cache) == ["1", "3"]
+
+
+def test_character_id_must_be_digits():
+    stub = StubBeyond()
+    with pytest.raises(BeyondError) as e:
+        run(client(stub).fetch("../123"))
+    assert e.value.status_code == 400
+    assert not stub.requests
+
+
+def test_party_reports_bad_json_per_id():
+    stub = StubBeyond(body="<html>nem json</html>")
+    combatants, errors = run(client(stub).fetch_party(["1", "404"]))
+    assert combatants == []
+    assert set(errors) == {"1", "404"}
+    assert "érvénytelen" in errors["1"]
+
+
+def test_party_size_is_capped():
+    with pytest.raises(BeyondError) as e:
+        run(client(StubBeyond()).fetch_party([str(i) for i in range(MAX_PARTY + 1)]))
+    assert e.value.status_code == 400
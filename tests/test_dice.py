@@ -0,0 +1,118 @@
+import itertools
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from utils import dice
+
+
+@pytest.mark.parametrize("expression, terms, modifier", [
+    ("1d20+5", [(1, 20, 1, None, 0)], 5),
+    ("4d6kh3", [(4, 6, 1, "h", 3)], 0),
+    ("4d6dl1", [(4, 6, 1, "h", 3)], 0),
+    ("1d20adv", [(2, 20, 1, "h", 1)], 0),
+    ("2d20dis-1d4+2", [(4, 20, 1, "l", 2), (1, 4, -1, None, 0)], 2),
+    ("D%", [(1, 100, 1, None, 0)], 0),
+])
+def test_compile(expression, terms, modifier):
+    plan = dice.compile_expression(expression)
+    assert [(t.count, t.sides, t.sign, t.keep, t.keep_n) for t in plan.terms] == terms
+    assert plan.modifier == modifier
+
+
+@pytest.mark.parametrize("expression", [
+    "", "1d20+", "d0", "0d6", "1d6!1", "1d1!", "4d6kh0", "4d6kh5", "1d20advkh1",
+    f"{dice.MAX_DICE + 1}d6", f"1d{dice.MAX_SIDES + 1}", f"1d20+{dice.MAX_CONSTANT + 1}",
+    f"1d20+{dice.MAX_CONSTANT}+{dice.MAX_CONSTANT}", "1d20+" + "9" * 40, "9" * 40 + "d6",
+    "+".join(["1d4"] * (dice.MAX_TERMS + 1)),
+])
+def test_invalid_expressions_raise_dice_error(expression):
+    with pytest.raises(dice.DiceError):
+        dice.compile_expression(expression)
+
+
+def test_roll_respects_bounds_and_keep():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        result = dice.roll("4d6kh3+2", rng)
+        assert len(result.dice[0]) == 4 and len(result.kept[0]) == 3
+        assert sorted(result.kept[0]) == sorted(result.dice[0])[1:]
+        assert result.total == sum(result.kept[0]) + 2
+
+
+def test_roll_many_range():
+    totals = dice.roll_many(dice.compile_expression("2d6-1d4"), 10_000, np.random.default_rng(2))
+    assert totals.min() >= 2 - 4 and totals.max() <= 12 - 1
+
+
+
+# --- Pontos eloszlás: összevetés teljes felsorolással ---
+def brute_force(expression: str) -> dict:
+    """{összeg: valószínűség} az összes kockakimenet végigjárásával (kis, nem robbanó kifejezésekre)."""
+    plan = dice.compile_expression(expression)
+    outcomes = {plan.modifier: 1.0}
+    for term in plan.terms:
+        sums = Counter()
+        for faces in itertools.product(range(1, term.sides + 1), repeat=term.count):
+            kept = sorted(faces, reverse=term.keep == "h")[:term.kept]
+            sums[term.sign * sum(kept)] += term.sides ** -term.count
+        combined = Counter()
+        for a, pa in outcomes.items():
+            for b, pb in sums.items():
+                combined[a + b] += pa * pb
+        outcomes = combined
+    return outcomes
+
+
+def explode_brute_force(sides: int, depth: int = dice.EXPLODE_DEPTH) -> dict:
+    """Egy robbanó kocka: maximumnál újra dob, legfeljebb depth ráadáskockáig."""
+    outcomes = Counter()
+
+    def chain(total: int, p: float, level: int):
+        for face in range(1, sides + 1):
+            if face == sides and level < depth:
+                chain(total + face, p / sides, level + 1)
+            else:
+                outcomes[total + face] += p / sides
+
+    chain(0, 1.0, 0)
+    return outcomes
+
+
+def as_dict(dist: dice.Distribution) -> dict:
+    return {dist.minimum + i: p for i, p in enumerate(dist.pmf) if p > 0}
+
+
+@pytest.mark.parametrize("expression", [
+    "1d20", "2d6+3", "3d4-2", "2d6-1d4", "4d6kh3", "4d6kl2", "5d4dh2", "1d20adv", "1d20dis+5", "2d8adv",
+])
+def test_distribution_matches_brute_force(expression):
+    expected = brute_force(expression)
+    got = as_dict(dice.distribution(expression))
+    assert set(got) == set(expected)
+    for total, p in expected.items():
+        assert got[total] == pytest.approx(p, abs=1e-12)
+
+
+def test_exploding_distribution_matches_brute_force():
+    expected = explode_brute_force(3)
+    got = as_dict(dice.distribution("1d3!"))
+    assert set(got) == set(expected)
+    for total, p in expected.items():
+        assert got[total] == pytest.approx(p, rel=1e-9)
+
+
+def test_distribution_summary():
+    dist = dice.distribution("2d6")
+    assert (dist.minimum, dist.maximum) == (2, 12)
+    assert dist.mean == pytest.approx(7.0)
+    assert dist.percentile(50) == 7
+    assert dist.p_at_least(12) == pytest.approx(1 / 36)
+    assert dist.p_at_least(2) == 1.0 and dist.p_at_least(13) == 0.0
+
+
+def test_large_distribution_is_normalized():
+    dist = dice.distribution("100d100+40d12")
+    assert dist.pmf.sum() == pytest.approx(1.0)
+    assert dist.mean == pytest.approx(100 * 50.5 + 40 * 6.5)
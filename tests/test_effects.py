@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from utils.effects import MAX_TARGETS, resolve_save
+from utils.monster_db import damage_types, defense_profile, load_monster_db
+
+ALWAYS_SAVES, NEVER_SAVES = 100, -100
+
+
+def target(name: str, save_bonus: int, hp: int = 50, **defenses) -> dict:
+    return {"id": name, "name": name, "hp": hp, "save_bonus": save_bonus, **defenses}
+
+
+def by_name(results) -> dict:
+    return {r["name"]: r for r in results}
+
+
+def test_halving_happens_before_resistance_and_vulnerability():
+    targets = [
+        target("plain", ALWAYS_SAVES),
+        target("resistant", ALWAYS_SAVES, resistances=["fire"]),
+        target("vulnerable", ALWAYS_SAVES, vulnerabilities=["fire"]),
+        target("immune", NEVER_SAVES, immunities=["fire"]),
+        target("failed", NEVER_SAVES, vulnerabilities=["fire"]),
+    ]
+    results = by_name(resolve_save(targets, "11", dc=15, damage_type="fire", rng=np.random.default_rng(0)))
+    assert results["plain"]["damage"] == 5        # 11 // 2
+    assert results["resistant"]["damage"] == 2    # (11 // 2) // 2
+    assert results["vulnerable"]["damage"] == 10  # (11 // 2) * 2, nem 22 // 2 = 11
+    assert results["immune"]["damage"] == 0
+    assert results["failed"]["damage"] == 22
+    assert results["failed"]["hp_after"] == 28
+
+
+def test_other_damage_types_are_not_reduced():
+    results = resolve_save([target("a", NEVER_SAVES, resistances=["fire"])], "8", dc=10, damage_type="cold")
+    assert results[0]["damage"] == 8
+
+
+def test_no_damage_on_success_and_no_save_without_dc():
+    results = resolve_save([target("a", ALWAYS_SAVES)], "9", dc=12, half_on_success=False)
+    assert results[0]["success"] and results[0]["damage"] == 0
+    results = resolve_save([target("a", ALWAYS_SAVES, hp=5)], "9")
+    assert results[0]["save_roll"] is None and not results[0]["success"]
+    assert (results[0]["damage"], results[0]["hp_after"]) == (9, 0)
+
+
+def test_shared_damage_is_rolled_once():
+    targets = [target(f"t{i}", NEVER_SAVES) for i in range(200)]
+    shared = resolve_save(targets, "8d6", dc=10, rng=np.random.default_rng(1))
+    assert len({r["rolled"] for r in shared}) == 1
+    separate = resolve_save(targets, "8d6", dc=10, shared_damage=False, rng=np.random.default_rng(1))
+    assert len({r["rolled"] for r in separate}) > 1
+
+
+@pytest.mark.parametrize("targets, damage", [([], "1d6"), ([target("a", 0)] * (MAX_TARGETS + 1), "1d6"),
+                                             ([target("a", 0)], "1d6+")])
+def test_invalid_input(targets, damage):
+    with pytest.raises(ValueError):
+        resolve_save(targets, damage, dc=10)
+
+
+def test_conditional_defenses_do_not_apply_to_spells():
+    assert damage_types("bludgeoning, piercing, and slashing from nonmagical weapons") == []
+    assert damage_types("fire, poison; bludgeoning, piercing, and slashing from nonmagical attacks") == ["fire", "poison"]
+    profile = defense_profile(load_monster_db().by_index["fire-elemental"])
+    assert profile["immunities"] == ["fire", "poison"] and profile["resistances"] == []
+    assert profile["save_bonus"]["dex"] == 3
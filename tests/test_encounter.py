@@ -0,0 +1,115 @@
+import random
+
+import numpy as np
+import pytest
+
+from utils.encounter import MAX_GROUP, EncounterStore, roll_initiative
+from utils.state_db import StateDB
+
+
+def combatant(cid: str, initiative: int, dexterity: int = 10, **extra) -> dict:
+    return {"id": cid, "name": cid, "initiative": initiative, "dexterity": dexterity, "hp": 10, **extra}
+
+
+def order(store: EncounterStore) -> list:
+    return [c["id"] for c in store.ordered()]
+
+
+def test_order_by_initiative_then_dexterity_then_arrival():
+    store = EncounterStore()
+    store.add(combatant("a", 12, 10))
+    store.add(combatant("b", 15, 8))
+    store.add(combatant("c", 12, 14))
+    store.add(combatant("d", 12, 10))
+    assert order(store) == ["b", "c", "a", "d"]
+    assert store.index_of("a") == 2
+
+
+def test_add_many_matches_one_by_one_inserts():
+    rng = random.Random(7)
+    existing = [combatant(f"p{i}", rng.randint(1, 20), rng.randint(8, 18)) for i in range(15)]
+    group = [combatant(f"g{i}", rng.randint(1, 20), rng.randint(8, 18)) for i in range(30)]
+    one_by_one, batched = EncounterStore(), EncounterStore()
+    for c in existing:
+        one_by_one.add(c)
+        batched.add(c)
+    for c in group:
+        one_by_one.add(c)
+    batched.add_many(group)
+    assert order(batched) == order(one_by_one)
+
+
+def test_add_many_replaces_existing_ids():
+    store = EncounterStore()
+    store.add(combatant("a", 5))
+    store.add_many([combatant("a", 18), combatant("b", 10)])
+    assert order(store) == ["a", "b"]
+    assert len(store) == 2
+
+
+def test_update_moves_only_on_initiative_or_dexterity_change():
+    store = EncounterStore()
+    for cid, init in (("a", 15), ("b", 10), ("c", 5)):
+        store.add(combatant(cid, init))
+    store.update("c", {"hp": 3})
+    assert order(store) == ["a", "b", "c"]
+    store.update("c", {"initiative": 12})
+    assert order(store) == ["a", "c", "b"]
+    store.update("a", {"initiative": 12, "dexterity": 9})
+    assert order(store) == ["c", "a", "b"]
+
+
+def test_turns_and_removing_the_active_combatant():
+    store = EncounterStore()
+    for cid, init in (("a", 15), ("b", 10), ("c", 5)):
+        store.add(combatant(cid, init))
+    assert [store.next_turn()["id"] for _ in range(3)] == ["a", "b", "c"]
+    assert store.round == 1
+    store.remove("c")  # az utolsó volt soron: körbeér
+    assert (store.active_id, store.round) == ("a", 2)
+
+
+@pytest.fixture
+def db(tmp_path):
+    state_db = StateDB(str(tmp_path / "state.db"))
+    yield state_db
+    state_db.close()
+
+
+def test_restore_keeps_order_and_turn(db):
+    store = EncounterStore(db=db, namespace="encounter:t")
+    store.add(combatant("a", 12))
+    store.add_many([combatant("b", 12), combatant("c", 20)])
+    store.next_turn()
+    store.next_turn()
+    db.flush()
+    restored = EncounterStore(db=db, namespace="encounter:t")
+    assert order(restored) == order(store) == ["c", "a", "b"]
+    assert (restored.active_id, restored.round) == ("a", 1)
+    restored.add(combatant("d", 12))
+    assert order(restored) == ["c", "a", "b", "d"]
+
+
+# --- Csoportos kezdeményezés ---
+def test_roll_initiative_per_instance_and_per_group():
+    rng = np.random.default_rng(3)
+    rolls = roll_initiative(50, bonus=2, rng=rng)
+    assert rolls.shape == (50,) and rolls.min() >= 3 and rolls.max() <= 22
+    assert len(set(rolls.tolist())) > 1
+    group = roll_initiative(12, bonus=-1, per_group=True, rng=rng)
+    assert len(set(group.tolist())) == 1 and 0 <= group[0] <= 19
+
+
+@pytest.mark.parametrize("count", [0, MAX_GROUP + 1])
+def test_roll_initiative_rejects_bad_counts(count):
+    with pytest.raises(ValueError):
+        roll_initiative(count)
+
+
+def test_group_ties_break_on_dexterity_against_existing():
+    store = EncounterStore()
+    store.add(combatant("hero", 14, 16))
+    store.add(combatant("ogre", 14, 8))
+    goblins = [combatant(f"goblin_{i}", 14, 14) for i in range(3)]
+    store.add_many(goblins)
+    assert order(store) == ["hero", "goblin_0", "goblin_1", "goblin_2", "ogre"]
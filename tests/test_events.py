@@ -0,0 +1,67 @@
+import asyncio
+
+from utils import events
+from utils.events import EventHub
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def snapshot():
+    return {"encounter": "állapot"}
+
+
+def test_resume_from_cursor_replays_only_missed_events():
+    hub = EventHub()
+    hub.publish("roll", {"n": 1})
+    cursor = hub.cursor
+    hub.publish("roll", {"n": 2})
+    hub.publish("roll", {"n": 3})
+
+    async def first_two():
+        stream = hub.stream(snapshot, cursor)
+        try:
+            return [await stream.__anext__(), await stream.__anext__()]
+        finally:
+            await stream.aclose()
+
+    assert [e["data"]["n"] for e in run(first_two())] == [2, 3]
+    assert len(hub) == 0
+
+
+def test_unusable_cursors_get_a_snapshot():
+    hub = EventHub(backlog=3)
+    old = hub.cursor
+    for n in range(5):
+        hub.publish("roll", {"n": n})
+    assert hub.missed(old) is None                         # kicsúszott a backlogból
+    assert hub.missed(f"{hub.epoch}:{hub.seq + 1}") is None  # jövőbeli seq
+    assert hub.missed(f"másik:{hub.seq}") is None           # másik hub (újraindítás)
+    assert hub.missed("szemét") is None
+    assert hub.missed(hub.cursor) == []
+    assert [e["seq"] for e in hub.missed(f"{hub.epoch}:{hub.seq - 3}")] == [3, 4, 5]
+
+
+def test_slow_subscriber_gets_a_fresh_snapshot_on_overflow(monkeypatch):
+    monkeypatch.setattr(events, "SUBSCRIBER_QUEUE", 4)
+    hub = EventHub()
+
+    async def scenario():
+        stream = hub.stream(snapshot)
+        try:
+            first = await stream.__anext__()
+            for n in range(10):  # a kliens közben nem olvas
+                hub.publish("roll", {"n": n})
+            resync = await stream.__anext__()
+            hub.publish("roll", {"n": "élő"})
+            live = await stream.__anext__()
+            return first, resync, live
+        finally:
+            await stream.aclose()
+
+    first, resync, live = run(scenario())
+    assert first["type"] == "snapshot" and first["seq"] == 0
+    assert resync["type"] == "snapshot" and resync["seq"] == 10
+    assert live["data"]["n"] == "élő" and live["seq"] == 11
+    assert len(hub) == 0
@@ -0,0 +1,45 @@
+import numpy as np
+
+from utils.fog import FogMask, decode_mask, encode_mask
+
+
+def test_mask_roundtrip_with_odd_sizes():
+    rng = np.random.default_rng(0)
+    mask = rng.random((7, 13)) < 0.5
+    assert np.array_equal(decode_mask(13, 7, encode_mask(mask)), mask)
+    fog = FogMask(13, 7, mask=mask, version=4)
+    restored = FogMask.from_dict(fog.to_dict())
+    assert np.array_equal(restored.mask, mask) and restored.version == 4
+
+
+def test_rect_reveals_by_cell_center_and_reports_region():
+    fog = FogMask(10, 10)
+    assert fog.rect(4.5, 2, 1, 3.9) == (2, 1, 4, 5)  # a sarkok sorrendje mindegy
+    assert not fog.mask[2:4, 1:5].any()
+    assert fog.mask[4:, :].all() and fog.mask[:, 5:].all()
+    assert fog.version == 1
+
+
+def test_unchanged_operation_keeps_version():
+    fog = FogMask(10, 10)
+    fog.circle(5, 5, 2)
+    version = fog.version
+    assert fog.circle(5, 5, 2) is None
+    assert fog.rect(20, 20, 30, 30) is None
+    assert fog.version == version
+
+
+def test_polygon_and_fill():
+    fog = FogMask(10, 10)
+    fog.polygon([(0, 0), (4, 0), (0, 4)])  # derékszögű háromszög
+    assert not fog.mask[0, 0] and not fog.mask[2, 0] and fog.mask[3, 3]
+    assert fog.fill() == (0, 0, 10, 10)
+    assert fog.coverage() == 1.0
+
+
+def test_reveal_mask_limits_region_to_hits():
+    fog = FogMask(8, 8)
+    cells = np.zeros((8, 8), dtype=bool)
+    cells[2, 3] = cells[5, 6] = True
+    assert fog.reveal_mask(cells) == (2, 3, 6, 7)
+    assert fog.mask.sum() == 62
@@ -0,0 +1,40 @@
+import pytest
+
+from utils.monster_db import attack_profile, load_monster_db, slugify
+
+
+@pytest.fixture(scope="module")
+def db():
+    return load_monster_db()
+
+
+@pytest.mark.parametrize("name, index", [
+    ("Goblin", "goblin"),
+    ("Goblin 3", "goblin"),
+    ("goblin 12", "goblin"),
+    ("Adult Red Dragon 2", "adult-red-dragon"),
+])
+def test_for_combatant_strips_the_instance_number(db, name, index):
+    assert db.for_combatant(name)["index"] == index
+
+
+@pytest.mark.parametrize("name", ["Gobln", "Bob", "Werewolf", "Goblin Boss Kevin", ""])
+def test_for_combatant_never_guesses(db, name):
+    # A get() elgépelés-tűrő, de egy harcos nevéhez csak pontos egyezés tartozhat
+    assert db.for_combatant(name) is None
+
+
+def test_get_still_falls_back_to_fuzzy_search(db):
+    assert db.get("Gobln")["index"] == "goblin"
+
+
+def test_slugify():
+    assert slugify("Adult Red Dragon") == "adult-red-dragon"
+    assert slugify("Will-o'-Wisp") == "will-o-wisp"
+
+
+def test_attack_profile(db):
+    profile = attack_profile(db.for_combatant("Goblin 1"))
+    assert profile["attack_bonus"] == 4
+    assert profile["damage"] == "1d6+2"
+    assert profile["attacks"] == 1
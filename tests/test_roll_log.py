@@ -0,0 +1,61 @@
+from utils.roll_log import RollLog
+
+
+def fill(log: RollLog, n: int, players=("Anna", "Bence")):
+    for i in range(n):
+        log.append({"player": players[i % len(players)], "total": i, "timestamp": 1000.0 + i})
+
+
+def test_ring_buffer_wraps_around():
+    log = RollLog(capacity=5)
+    fill(log, 12)
+    assert len(log) == 5
+    assert log.oldest == 7
+    page, next_before = log.query(limit=10)
+    assert [e["seq"] for e in page] == [11, 10, 9, 8, 7]
+    assert next_before is None
+
+
+def test_player_index_drops_evicted_rolls():
+    log = RollLog(capacity=4)
+    fill(log, 9)  # Anna: 0, 2, 4, 6, 8 - ebből csak a 6 és a 8 maradt
+    page, _ = log.query(player="Anna")
+    assert [e["seq"] for e in page] == [8, 6]
+    log.append({"player": "Cili", "total": 0})
+    for _ in range(4):
+        log.append({"player": "Anna", "total": 0})
+    assert log.query(player="Cili") == ([], None)
+
+
+def test_before_cursor_pages_without_gaps():
+    log = RollLog(capacity=100)
+    fill(log, 23)
+    seen, before = [], None
+    while True:
+        page, before = log.query(player="Bence", before=before, limit=4)
+        seen += [e["seq"] for e in page]
+        if before is None:
+            break
+    assert seen == list(range(21, 0, -2))
+
+
+def test_since_and_before_combined():
+    log = RollLog(capacity=8)
+    fill(log, 20)  # a pufferben a 12..19 seq, timestamp 1012..1019
+    page, next_before = log.query(since=1015.0, limit=2)
+    assert [e["seq"] for e in page] == [19, 18]
+    assert next_before == 18
+    page, next_before = log.query(since=1015.0, before=next_before, limit=10)
+    assert [e["seq"] for e in page] == [17, 16, 15]
+    assert next_before is None
+    # A puffernél régebbi 'since' sem ad vissza kiesett bejegyzést
+    page, _ = log.query(since=0.0, limit=100)
+    assert [e["seq"] for e in page] == list(range(19, 11, -1))
+
+
+def test_clear_restarts_sequence():
+    log = RollLog(capacity=3)
+    fill(log, 5)
+    log.clear()
+    assert len(log) == 0
+    assert log.append({"player": "Anna"})["seq"] == 0
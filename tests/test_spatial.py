@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from utils.spatial import LINEAR_SCAN, TokenGrid, grid_distance
+
+
+def brute_nearest(grid: TokenGrid, x: float, y: float, k: int, exclude=None):
+    ranked = sorted((grid_distance((x, y), pos), t) for t, pos in grid.positions.items() if t != exclude)
+    return [(t, d) for d, t in ranked[:k]]
+
+
+@pytest.mark.parametrize("spread", [8, 200, 100_000])
+def test_nearest_matches_brute_force(spread):
+    rng = random.Random(spread)
+    grid = TokenGrid(bucket=4)
+    for i in range(LINEAR_SCAN * 4):
+        grid.move(f"t{i}", rng.uniform(0, spread), rng.uniform(0, spread))
+    for _ in range(50):
+        x, y, k = rng.uniform(0, spread), rng.uniform(0, spread), rng.randint(1, 12)
+        exclude = rng.choice([None, "t0"])
+        assert grid.nearest(x, y, k, exclude) == brute_nearest(grid, x, y, k, exclude)
+
+
+def test_nearest_with_k_above_token_count():
+    grid = TokenGrid()
+    for i in range(LINEAR_SCAN + 5):
+        grid.move(f"t{i}", i * 3, 0)
+    assert len(grid.nearest(0, 0, k=1000)) == LINEAR_SCAN + 5
+    assert grid.nearest(0, 0, k=1000, exclude="t0")[0] == ("t1", 3)
+
+
+def test_nearest_far_outlier():
+    grid = TokenGrid()
+    for i in range(LINEAR_SCAN * 2):
+        grid.move(f"t{i}", i % 8, i // 8)
+    grid.move("far", 1e6, 1e6)
+    assert grid.nearest(5e5, 5e5, k=1) == brute_nearest(grid, 5e5, 5e5, 1)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from utils.vision import VisionEngine, cast_rays
+
+
+def test_cast_rays_hits_nearest_wall():
+    walls = np.array([[3, -5, 3, 5], [6, -5, 6, 5]], dtype=float)
+    hit = cast_rays(0, 0, walls, 4)  # kelet, dél, nyugat, észak
+    assert hit[0] == pytest.approx(3, abs=1e-5)
+    assert np.isinf(hit[1:]).all()
+
+
+def test_wall_blocks_line_of_sight():
+    vision = VisionEngine(10, 5)
+    vision.set_token("hero", 1.5, 2.5)
+    vision.walls.set([[5, 0, 5, 5]])
+    seen = vision.visible("hero")
+    assert seen[:, :5].all()
+    assert not seen[:, 5:].any()
+
+
+def test_darkness_limits_to_darkvision_and_light():
+    vision = VisionEngine(20, 3, lighting="dark")
+    vision.set_token("elf", 0.5, 1.5, darkvision=3)
+    seen = vision.visible("elf")
+    assert seen[1, :3].all() and not seen[1, 4:].any()
+    vision.set_token("torch", 15.5, 1.5, light=2)
+    seen = vision.visible("elf")
+    assert seen[1, 14:18].all() and not seen[1, 10]
+
+
+def test_cached_los_follows_wall_changes():
+    vision = VisionEngine(10, 5)
+    vision.set_token("hero", 1.5, 2.5)
+    assert vision.visible("hero")[2, 8]
+    vision.walls.set([[5, 0, 5, 5]])
+    assert not vision.visible("hero")[2, 8]
+    assert not vision.walls.set([[5, 0, 5, 5]])  # ugyanaz: nincs új verzió
+
+
+def test_party_view_is_union():
+    vision = VisionEngine(10, 5)
+    vision.walls.set([[5, 0, 5, 5]])
+    vision.set_token("a", 1.5, 2.5)
+    vision.set_token("b", 8.5, 2.5)
+    assert vision.party_view().all()
+    assert np.array_equal(vision.party_view(["a"]), vision.visible("a"))
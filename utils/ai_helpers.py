@@ -1,9 +1,14 @@
 import streamlit as st
 from groq import Groq
 
+from utils.response_cache import ResponseCache, make_key
+
 # Globális modell beállítás
 DEFAULT_MODEL = "llama3-70b-8192"
 
+# A modul a Streamlit rerunok között is betöltve marad, így a cache is megmarad
+rules_cache = ResponseCache(max_size=256, ttl=24 * 3600)
+
 def get_groq_client():
     """Inicializálja és visszaadja a Groq klienst a secrets alapján."""
     try:
@@ -12,8 +17,36 @@ def get_groq_client():
         st.error("Hiányzik a Groq API kulcs! Kérlek, állítsd be a `.streamlit/secrets.toml` fájlban.")
         st.stop()
 
-def ask_rules_lawyer(chat_history, model=DEFAULT_MODEL):
-    """Lekérdezi a Rules Lawyer AI-t az eddigi chat történet alapján."""
+def stream_completion(client, error_prefix, cache_key=None, **kwargs):
+    """Groq stream szövegdarabjai, ahogy érkeznek (st.write_stream-hez).
+    cache_key megadásakor a sikeres, teljes választ a rules_cache-be mentjük."""
+    parts = []
+    try:
+        for chunk in client.chat.completions.create(stream=True, **kwargs):
+            token = chunk.choices[0].delta.content
+            if token:
+                parts.append(token)
+                yield token
+    except Exception as e:
+        yield f"{error_prefix}: {e}"
+        return
+    if cache_key:
+        rules_cache.set(cache_key, "".join(parts))
+
+def ask_rules_lawyer(chat_history, model=DEFAULT_MODEL, stream=False, use_cache=True):
+    """Lekérdezi a Rules Lawyer AI-t az eddigi chat történet alapján.
+    stream=True esetén szöveg-generátort ad vissza a teljes válasz helyett.
+    use_cache=False esetén a korábbi azonos kérdésre adott választ sem használjuk."""
+    cache_key = None
+    if use_cache:
+        # Kulcs: a legutóbbi kérdés + az előtte feltett kérdés (egy rövid ráadáskérdés csak azzal
+        # együtt értelmes), így az ismételt kérdés a beszélgetés közepén is találatot ad
+        questions = [m["content"] for m in chat_history if m["role"] == "user"]
+        cache_key = make_key("rules-lawyer", model, "\n".join(questions[-2:]))
+        cached = rules_cache.get(cache_key)
+        if cached is not None:
+            return iter([cached]) if stream else cached
+
     client = get_groq_client()
     
     messages = [
@@ -22,18 +55,26 @@ def ask_rules_lawyer(chat_history, model=DEFAULT_MODEL):
     # Konvertáljuk a Streamlit session_state formátumot a Groq által vártra
     messages.extend([{"role": m["role"], "content": m["content"]} for m in chat_history])
 
+    if stream:
+        return stream_completion(client, "Hiba történt a generálás során", cache_key=cache_key,
+                                 model=model, messages=messages, temperature=0.3)
+
     try:
         response = client.chat.completions.create(
             model=model,
             messages=messages,
             temperature=0.3, # Alacsony, hogy ragaszkodjon a szabályokhoz
         )
-        return response.choices[0].message.content
+        result = response.choices[0].message.content
+        if cache_key:
+            rules_cache.set(cache_key, result)
+        return result
     except Exception as e:
         return f"Hiba történt a generálás során: {e}"
 
-def generate_npc(race, role, vibe, model=DEFAULT_MODEL):
-    """Legenerál egy komplett D&D 5e NJK-t a paraméterek alapján."""
+def generate_npc(race, role, vibe, model=DEFAULT_MODEL, stream=False):
+    """Legenerál egy komplett D&D 5e NJK-t a paraméterek alapján.
+    stream=True esetén szöveg-generátort ad vissza a teljes válasz helyett."""
     client = get_groq_client()
     
     system_prompt = """
@@ -46,14 +87,19 @@ def generate_npc(race, role, vibe, model=DEFAULT_MODEL):
     - **Szófordulat / Jellemző viselkedés:** (Hogyan játssza el a DM? Egy idézet, amit gyakran mond)
     """
     user_prompt = f"Kérlek generálj egy NJK-t: Faj: {race}, Foglalkozás: {role}, Hangulat/Extra: {vibe}."
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+    if stream:
+        return stream_completion(client, "Hiba történt az NJK generálásakor",
+                                 model=model, messages=messages, temperature=0.8)
 
     try:
         response = client.chat.completions.create(
             model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            messages=messages,
             temperature=0.8, # Magasabb, hogy kreatívabb legyen
         )
         return response.choices[0].message.content
@@ -0,0 +1,45 @@
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils.fog import Region
+
+SHAPES = ("circle", "cone", "line", "cube")
+# 5e: a kúp szélessége bármely pontján akkora, mint a távolsága a kiindulóponttól
+CONE_HALF_WIDTH = 0.5
+# A sablon szélére eső cellaközéppont (pontosan félig fedett cella) érintettnek számít
+EPS = 1e-9
+
+
+def template_cells(shape: str, x: float, y: float, size: float, cols: int, rows: int,
+                   direction: float = 0.0, width: float = 1.0) -> Tuple[Optional[Region], np.ndarray]:
+    """A sablon által érintett cellák: (régió, a régió bool maszkja) vagy (None, üres).
+
+    Koordináták és méretek cellában; egy cella akkor érintett, ha a középpontja a sablonba esik.
+    circle: size a sugár; cone / line / cube: a kiindulópontból direction irányba (fok,
+    0 = kelet, az óramutató járásával, mert y lefelé nő) size hosszan; line: width széles,
+    cube: a kiindulópont a kocka egyik lapjának közepe.
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"Ismeretlen sablon: {shape}")
+    if size <= 0:
+        raise ValueError("A sablon mérete legyen pozitív.")
+    reach = size if shape == "circle" else math.hypot(size, max(size, width))
+    c0, c1 = max(0, math.floor(x - reach)), min(cols, math.ceil(x + reach))
+    r0, r1 = max(0, math.floor(y - reach)), min(rows, math.ceil(y + reach))
+    if r0 >= r1 or c0 >= c1:
+        return None, np.zeros((0, 0), dtype=bool)
+
+    dx = np.arange(c0, c1) + 0.5 - x
+    dy = (np.arange(r0, r1) + 0.5)[:, None] - y
+    if shape == "circle":
+        inside = dx ** 2 + dy ** 2 <= size ** 2 + EPS
+    else:
+        # Tengely menti (along) és rá merőleges (across) távolság az irányhoz képest
+        rad = math.radians(direction)
+        along = dx * math.cos(rad) + dy * math.sin(rad)
+        across = np.abs(dy * math.cos(rad) - dx * math.sin(rad))
+        half = {"cone": along * CONE_HALF_WIDTH, "line": width / 2, "cube": size / 2}[shape]
+        inside = (along >= -EPS) & (along <= size + EPS) & (across <= half + EPS)
+    return (r0, c0, r1, c1), inside
@@ -0,0 +1,192 @@
+import asyncio
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+# Tesztekben / offline módban egy helyi stubra irányítható
+BEYOND_CHARACTER_URL = os.getenv(
+    "BEYOND_CHARACTER_URL", "https://character-service.dndbeyond.com/character/v5/character")
+BEYOND_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+CHARACTER_ID_RE = re.compile(r"^[0-9]{1,12}$")  # a Beyond karakter azonosítók számok
+MAX_PARTY = 20                                    # egy csapat-importban legfeljebb ennyi karakter
+
+# A D&D Beyond stat azonosítói (stats[].id)
+ABILITIES = {1: "strength", 2: "dexterity", 3: "constitution", 4: "intelligence", 5: "wisdom", 6: "charisma"}
+# armorTypeId: 1 = könnyű, 2 = közepes, 3 = nehéz vért, 4 = pajzs
+LIGHT, MEDIUM, HEAVY, SHIELD = 1, 2, 3, 4
+# characterValues typeId: 1 = AC felülírás, 2 = mágikus AC bónusz, 3 = egyéb AC bónusz
+AC_OVERRIDE, AC_MAGIC_BONUS, AC_OTHER_BONUS = 1, 2, 3
+
+
+class BeyondError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _modifiers(data: dict) -> List[dict]:
+    """Az összes forrás (faj, kaszt, háttér, tárgy, képesség) módosítói egy listában."""
+    return [m for group in (data.get("modifiers") or {}).values() for m in (group or [])]
+
+
+def ability_scores(data: dict) -> Dict[str, int]:
+    """Végső tulajdonságértékek: alap + bónusz + módosítók, felülírásokkal."""
+    base = {s["id"]: s.get("value") or 10 for s in data.get("stats", [])}
+    bonus = {s["id"]: s.get("value") or 0 for s in data.get("bonusStats", [])}
+    override = {s["id"]: s.get("value") for s in data.get("overrideStats", [])}
+    mods = _modifiers(data)
+
+    scores = {}
+    for stat_id, name in ABILITIES.items():
+        if override.get(stat_id):
+            scores[name] = override[stat_id]
+            continue
+        score = base.get(stat_id, 10) + bonus.get(stat_id, 0)
+        score += sum(m.get("value") or 0 for m in mods if m.get("type") == "bonus" and m.get("subType") == f"{name}-score")
+        for m in mods:
+            if m.get("type") == "set" and m.get("subType") == f"{name}-score":
+                score = max(score, m.get("value") or 0)
+        scores[name] = score
+    return scores
+
+
+def ability_mod(score: int) -> int:
+    return (score - 10) // 2
+
+
+def armor_class(data: dict, scores: Dict[str, int]) -> int:
+    """AC a felszerelt vértből, pajzsból, vértelen védekezésből és a bónuszokból."""
+    values = {v.get("typeId"): v.get("value") for v in data.get("characterValues", []) if v.get("value") is not None}
+    if values.get(AC_OVERRIDE):
+        return values[AC_OVERRIDE]
+
+    dex = ability_mod(scores["dexterity"])
+    mods = _modifiers(data)
+    equipped = [i["definition"] for i in data.get("inventory", [])
+                if i.get("equipped") and (i.get("definition") or {}).get("armorTypeId")]
+    armor = [d for d in equipped if d["armorTypeId"] in (LIGHT, MEDIUM, HEAVY)]
+    shields = [d for d in equipped if d["armorTypeId"] == SHIELD]
+
+    if armor:
+        best = max(armor, key=lambda d: d.get("armorClass") or 0)
+        ac = best.get("armorClass") or 10
+        if best["armorTypeId"] == LIGHT:
+            ac += dex
+        elif best["armorTypeId"] == MEDIUM:
+            ac += min(dex, 2)
+        ac += sum(m.get("value") or 0 for m in mods if m.get("subType") == "armored-armor-class")
+    else:
+        # Vértelen védekezés (barbár: KON, szerzetes: BÖL, sárkányvérű varázsló: fix +3)
+        unarmored = [ability_mod(scores[ABILITIES[m["statId"]]]) if m.get("statId") in ABILITIES else (m.get("value") or 0)
+                     for m in mods if m.get("subType") == "unarmored-armor-class"]
+        ac = 10 + dex + max(unarmored, default=0)
+
+    ac += sum(d.get("armorClass") or 2 for d in shields[:1])
+    ac += sum(m.get("value") or 0 for m in mods if m.get("type") == "bonus" and m.get("subType") == "armor-class")
+    ac += (values.get(AC_MAGIC_BONUS) or 0) + (values.get(AC_OTHER_BONUS) or 0)
+    return ac
+
+
+def initiative_bonus(data: dict, scores: Dict[str, int]) -> int:
+    """ÜGY módosító + kezdeményezés bónuszok (pl. Alert feat)."""
+    bonus = sum(m.get("value") or 0 for m in _modifiers(data)
+                if m.get("type") == "bonus" and m.get("subType") == "initiative")
+    return ability_mod(scores["dexterity"]) + bonus
+
+
+def parse_character(character_id: str, data: dict) -> dict:
+    """A Beyond karakter JSON-jából harcos (combatant) szótár."""
+    scores = ability_scores(data)
+    level = sum(c.get("level") or 0 for c in data.get("classes", [])) or 1
+    if data.get("overrideHitPoints"):
+        max_hp = data["overrideHitPoints"]
+    else:
+        max_hp = (data.get("baseHitPoints") or 0) + (data.get("bonusHitPoints") or 0) \
+            + ability_mod(scores["constitution"]) * level
+    hp = max(0, max_hp - (data.get("removedHitPoints") or 0))
+    return {
+        "id": f"beyond_{character_id}",
+        "name": data.get("name", "Ismeretlen Hős"),
+        "is_player": True,
+        "max_hp": max_hp,
+        "hp": hp,
+        "ac": armor_class(data, scores),
+        "initiative": initiative_bonus(data, scores),  # Bónusz; a tényleges dobás után felülírható
+        "dexterity": scores["dexterity"],
+    }
+
+
+class BeyondClient:
+    """Közös (poolozott) aszinkron kliens a Beyondhoz, ETag / Last-Modified alapú cache-sel."""
+
+    def __init__(self, http: Optional[httpx.AsyncClient] = None, base_url: str = BEYOND_CHARACTER_URL,
+                 max_concurrency: int = 6, cache_size: int = 512):
+        self.http = http or httpx.AsyncClient(
+            headers=BEYOND_HEADERS,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency))
+        self.base_url = base_url.rstrip("/")
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # id -> (etag, last_modified, combatant), LRU sorrendben, legfeljebb cache_size elem
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[Optional[str], Optional[str], dict]]" = OrderedDict()
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def fetch(self, character_id: str) -> dict:
+        """Egy karakter; ha a szerver 304-et ad, a korábban feldolgozott példányt adjuk vissza."""
+        if not CHARACTER_ID_RE.match(character_id):
+            raise BeyondError(400, "Érvénytelen karakter azonosító (csak számjegyek).")
+        headers = {}
+        cached = self._cache.get(character_id)
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        async with self._slots:
+            try:
+                resp = await self.http.get(f"{self.base_url}/{character_id}", headers=headers)
+            except httpx.HTTPError as e:
+                raise BeyondError(502, f"A D&D Beyond szervere nem válaszol: {e}")
+
+        if resp.status_code == 304 and cached:
+            if character_id in self._cache:
+                self._cache.move_to_end(character_id)
+            return dict(cached[2])
+        if resp.status_code in (403, 404):
+            raise BeyondError(404, "Karakter nem található, vagy privátra van állítva a Beyondban.")
+        if resp.status_code != 200:
+            raise BeyondError(502, "A D&D Beyond szervere nem válaszol.")
+
+        try:
+            body = resp.json()
+            combatant = parse_character(character_id, body.get("data") or {})
+        except (ValueError, AttributeError, KeyError, TypeError):
+            raise BeyondError(502, "A D&D Beyond érvénytelen karakteradatot küldött.")
+        self._cache[character_id] = (resp.headers.get("etag"), resp.headers.get("last-modified"), combatant)
+        self._cache.move_to_end(character_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return dict(combatant)
+
+    async def fetch_party(self, character_ids: List[str]) -> Tuple[List[dict], Dict[str, str]]:
+        """Több karakter párhuzamosan; (sikeres harcosok, {id: hibaüzenet}).
+        BeyondError(400), ha MAX_PARTY-nál több azonosítót kapunk."""
+        if len(character_ids) > MAX_PARTY:
+            raise BeyondError(400, f"Egyszerre legfeljebb {MAX_PARTY} karakter importálható.")
+        results = await asyncio.gather(*(self.fetch(cid) for cid in character_ids), return_exceptions=True)
+        combatants, errors = [], {}
+        for cid, result in zip(character_ids, results):
+            if isinstance(result, Exception):
+                errors[cid] = result.detail if isinstance(result, BeyondError) else str(result)
+            else:
+                combatants.append(result)
+        return combatants, errors
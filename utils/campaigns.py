@@ -0,0 +1,193 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.encounter import EncounterStore
+from utils.events import EventHub
+from utils.lore_index import LoreIndex
+from utils.lore_store import LoreStore
+from utils.roll_log import RollLog
+from utils.state_db import StateDB
+from utils.uploads import find_stored
+from utils.vtt_map import VttMap
+
+DEFAULT_CAMPAIGN = "default"
+# Fájlnévben és URL-ben is biztonságos azonosító
+CAMPAIGN_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Az alapértelmezett kampány mappáiban használt nevek (pl. maps/tiles/<sha>), nem lehetnek kampányok
+RESERVED_CAMPAIGN_IDS = {"tiles"}
+
+
+def validate_campaign_id(campaign_id: str) -> str:
+    if not CAMPAIGN_ID_RE.match(campaign_id or ""):
+        raise ValueError("Érvénytelen kampány azonosító (csak betű, szám, '-' és '_', max. 64 karakter).")
+    if campaign_id.lower() in RESERVED_CAMPAIGN_IDS:
+        raise ValueError(f"A '{campaign_id}' foglalt név, nem lehet kampány azonosító.")
+    return campaign_id
+
+
+def namespace(kind: str, campaign_id: str) -> str:
+    """StateDB névtér; az alapértelmezett kampány a régi (egykampányos) nevet tartja meg."""
+    return kind if campaign_id == DEFAULT_CAMPAIGN else f"{kind}:{campaign_id}"
+
+
+def campaign_subdir(campaign_id: str) -> str:
+    """Feltöltési almappa; az alapértelmezett kampány fájljai a gyökérben maradnak."""
+    return "" if campaign_id == DEFAULT_CAMPAIGN else campaign_id
+
+
+class Campaign:
+    """Egy asztal teljes állapota: harc, dobások, Kódex és feltöltési mappák, saját zárral."""
+
+    def __init__(self, campaign_id: str, db: StateDB, upload_dir: str, roll_capacity: int = 100_000,
+                 lore_header: str = ""):
+        self.id = campaign_id
+        self.db = db
+        sub = campaign_subdir(campaign_id)
+        self.maps_dir = os.path.join(upload_dir, "maps", sub)
+        self.tokens_dir = os.path.join(upload_dir, "tokens", sub)
+        self.lore_dir = os.path.join(upload_dir, "lore", sub)
+        for d in (self.maps_dir, self.tokens_dir, self.lore_dir):
+            os.makedirs(d, exist_ok=True)
+
+        self.encounter = EncounterStore(db=db, namespace=namespace("encounter", campaign_id))
+        self.rolls = RollLog(capacity=roll_capacity, db=db, campaign=campaign_id)
+        self.lore_store = LoreStore(os.path.join(self.lore_dir, "campaign_lore.txt"), header=lore_header)
+        self.lore_index = LoreIndex(os.path.join(self.lore_dir, "lore_index.json"))
+        self.lore_index.sync(self.lore_store.stamp, self.lore_store.entries)
+        # Térképenkénti rács / köd, az első használatkor betöltve
+        self._maps: Dict[str, VttMap] = {}
+        # Térképenként: kinek a köre van, és honnan indult (az alkalmi támadások jelzéséhez);
+        # mentve, így kiürítés / újraindítás után is jelezhető a kör végén
+        self.turn_start: Dict[str, Tuple[str, Optional[Tuple[float, float]]]] = {
+            sha: (saved["id"], tuple(saved["position"]) if saved["position"] else None)
+            for sha, saved in db.get_all(namespace("turn_start", campaign_id)).items()}
+        # Valós idejű deltak (WebSocket / SSE) az asztal klienseinek
+        self.events = EventHub()
+        # Ugyanazon asztal egymásba futó módosításai sorban mennek, a többi asztal nem vár
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    def url_path(self, kind: str, filename: str) -> str:
+        """'/maps/<kampány>/<fájl>' (az alapértelmezett kampánynál '/maps/<fájl>')."""
+        sub = campaign_subdir(self.id)
+        return f"/{kind}/{sub}/{filename}" if sub else f"/{kind}/{filename}"
+
+    def vtt_map(self, sha256: str) -> Optional[VttMap]:
+        """A feltöltött térkép asztali modellje (rács, köd), vagy None, ha nincs ilyen térkép."""
+        sha256 = sha256.lower()
+        if sha256 not in self._maps:
+            name = find_stored(self.maps_dir, sha256)
+            if name is None:
+                return None
+            self._maps[sha256] = VttMap(sha256, os.path.join(self.maps_dir, name), self.db,
+                                        namespace("maps", self.id))
+        return self._maps[sha256]
+
+    def set_turn_start(self, sha256: str, combatant_id: str, position: Optional[Tuple[float, float]]):
+        self.turn_start[sha256] = (combatant_id, position)
+        self.db.put(namespace("turn_start", self.id), sha256,
+                    {"id": combatant_id, "position": list(position) if position else None})
+
+    def snapshot(self, recent_rolls: int = 20) -> dict:
+        """Teljes állapot (újracsatlakozó kliensnek): harc + a legutóbbi dobások."""
+        return {"encounter": self.encounter.snapshot(), "rolls": self.rolls.query(limit=recent_rolls)[0]}
+
+    def refresh_lore(self):
+        """Ha a Kódex fájlt kívülről szerkesztették, újraolvassuk és újraindexeljük."""
+        if self.lore_store.refresh():
+            self.lore_index.sync(self.lore_store.stamp, self.lore_store.entries)
+
+    def lore_context(self, query: str, token_budget: int) -> str:
+        """A kérdéshez releváns Kódex részletek."""
+        self.refresh_lore()
+        return self.lore_index.context(query, token_budget)
+
+
+class CampaignRegistry:
+    """Csak az aktív asztalok élnek memóriában; a tétleneket kiürítjük, és igény szerint újratöltjük.
+
+    Minden állapot a StateDB-ben / a kampány mappájában van, így a kiürítés veszteségmentes.
+    """
+
+    def __init__(self, db: StateDB, upload_dir: str, idle_ttl: float = 1800, roll_capacity: int = 100_000,
+                 lore_header: str = ""):
+        self.db = db
+        self.upload_dir = upload_dir
+        self.idle_ttl = idle_ttl
+        self.roll_capacity = roll_capacity
+        self.lore_header = lore_header
+        self._campaigns: Dict[str, Campaign] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._campaigns)
+
+    def __contains__(self, campaign_id: str) -> bool:
+        return campaign_id in self._campaigns
+
+    def get(self, campaign_id: str = DEFAULT_CAMPAIGN) -> Campaign:
+        """A kampány (lustán betöltve); ValueError érvénytelen azonosítónál."""
+        validate_campaign_id(campaign_id)
+        with self._lock:
+            campaign = self._campaigns.get(campaign_id)
+            if campaign is None:
+                campaign = self._open(campaign_id)
+                self._campaigns[campaign_id] = campaign
+            campaign.last_used = time.monotonic()
+            return campaign
+
+    async def load(self, campaign_id: str = DEFAULT_CAMPAIGN) -> Campaign:
+        """Mint a get(), de a hideg betöltés (lemez, DB, Kódex index) háttérszálon fut, így nem
+        állítja meg az event loopot; ugyanarra a kampányra egyszerre érkező kérések egy
+        betöltést várnak meg."""
+        validate_campaign_id(campaign_id)
+        with self._lock:
+            campaign = self._campaigns.get(campaign_id)
+            if campaign is not None:
+                campaign.last_used = time.monotonic()
+                return campaign
+        task = self._loading.get(campaign_id)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(self._load, campaign_id))
+            self._loading[campaign_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(campaign_id, None))
+        return await asyncio.shield(task)
+
+    def _open(self, campaign_id: str) -> Campaign:
+        return Campaign(campaign_id, self.db, self.upload_dir, self.roll_capacity, self.lore_header)
+
+    def _load(self, campaign_id: str) -> Campaign:
+        campaign = self._open(campaign_id)
+        with self._lock:
+            # Közben egy szinkron get() már betölthette: azt tartjuk meg
+            campaign = self._campaigns.setdefault(campaign_id, campaign)
+            campaign.last_used = time.monotonic()
+            return campaign
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """Az idle_ttl óta nem használt (épp nem zárolt, élő kapcsolat nélküli) kampányok kiürítése."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [cid for cid, c in self._campaigns.items()
+                    if now - c.last_used > self.idle_ttl and not c.lock.locked() and not len(c.events)]
+            evicted = [self._campaigns.pop(cid) for cid in idle]
+        for campaign in evicted:
+            campaign.lore_index.flush()
+        return idle
+
+    def flush(self):
+        """A betöltött kampányok függő (késleltetett) lore index mentései; leállításkor hívjuk."""
+        with self._lock:
+            campaigns = list(self._campaigns.values())
+        for campaign in campaigns:
+            campaign.lore_index.flush()
+
+    def active(self) -> List[dict]:
+        now = time.monotonic()
+        return [{"id": cid, "idle_seconds": round(now - c.last_used, 1), "combatants": len(c.encounter),
+                 "rolls": len(c.rolls), "listeners": len(c.events)} for cid, c in self._campaigns.items()]
@@ -0,0 +1,355 @@
+import math
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Korlátok, hogy egy elgépelt makró ne egye meg a szervert
+MAX_DICE = 1000          # kocka / tag
+MAX_SIDES = 1000         # oldalszám
+MAX_TERMS = 20           # tagok száma egy kifejezésben
+MAX_BATCH = 10000        # kifejezés / kötegelt kérés
+EXPLODE_DEPTH = 10       # robbanó kocka maximális láncolása
+MAX_KEEP_WORK = 2_000_000  # kh/kl pontos eloszlásának lépésszám-plafonja
+MAX_CONSTANT = 10 ** 6     # konstans tag és a módosítók összege (abszolút érték)
+
+_rng = np.random.default_rng()
+
+# Egy tag: előjel + (kocka | konstans). Pl. "+4d6!kh3", "-1d4", "+5", "1d20adv"
+_TERM_RE = re.compile(
+    r"(?P<sign>[+-])?"
+    r"(?:(?P<count>\d*)d(?P<sides>\d+|%)(?P<explode>!)?"
+    r"(?:(?P<keep>kh|kl|dh|dl|k)(?P<keep_n>\d+))?(?P<adv>adv|dis)?"
+    r"|(?P<const>\d+))"
+)
+
+
+class DiceError(ValueError):
+    """Érvénytelen kockakifejezés."""
+
+
+@dataclass(frozen=True)
+class DiceTerm:
+    """Egy kockatag lefordított alakja (pl. 4d6kh3)."""
+    count: int
+    sides: int
+    sign: int = 1
+    keep: Optional[str] = None   # "h" = legmagasabbak, "l" = legalacsonyabbak
+    keep_n: int = 0
+    explode: bool = False
+
+    @property
+    def kept(self) -> int:
+        return self.keep_n if self.keep else self.count
+
+
+@dataclass(frozen=True)
+class DicePlan:
+    """Egyszer lefordított, újrahasznosítható dobási terv."""
+    expression: str
+    terms: Tuple[DiceTerm, ...]
+    modifier: int = 0
+
+
+@dataclass
+class RollResult:
+    total: int
+    dice: List[List[int]]     # tagonként az összes dobott érték
+    kept: List[List[int]]     # tagonként a beszámított értékek
+    modifier: int
+
+    @property
+    def rolls(self) -> List[int]:
+        """A beszámított kockák egy listában (a régi API formátuma)."""
+        return [v for term in self.kept for v in term]
+
+
+def normalize(expression: str) -> str:
+    """Kisbetűs, szóköz nélküli alak; ez a cache kulcsa."""
+    return expression.replace(" ", "").lower()
+
+
+def compile_expression(expression: str) -> DicePlan:
+    """Kifejezés lefordítása tervvé (normalizált alakonként cache-elve)."""
+    return _compile(normalize(expression))
+
+
+def _number(text: str, limit: int) -> int:
+    """Szám a kifejezésből; a túl hosszú számjegysort int() előtt utasítjuk el."""
+    if len(text) > len(str(limit)) or int(text) > limit:
+        raise DiceError(f"Túl nagy szám a kifejezésben (legfeljebb {limit})!")
+    return int(text)
+
+
+@lru_cache(maxsize=4096)
+def _compile(expr: str) -> DicePlan:
+    if not expr:
+        raise DiceError("Üres kifejezés! Példa: 1d20+5")
+
+    terms = []
+    modifier = 0
+    pos = 0
+    while pos < len(expr):
+        m = _TERM_RE.match(expr, pos)
+        if not m or m.end() == pos or (pos > 0 and not m.group("sign")):
+            raise DiceError(f"Hibás formátum a(z) {pos + 1}. karakternél! Példa: 1d20+5, 4d6kh3, 2d6!-1")
+        pos = m.end()
+        sign = -1 if m.group("sign") == "-" else 1
+
+        if m.group("const") is not None:
+            modifier += sign * _number(m.group("const"), MAX_CONSTANT)
+            if abs(modifier) > MAX_CONSTANT:
+                raise DiceError(f"Túl nagy módosító (legfeljebb {MAX_CONSTANT})!")
+            continue
+
+        count = _number(m.group("count") or "1", MAX_DICE)
+        sides = 100 if m.group("sides") == "%" else _number(m.group("sides"), MAX_SIDES)
+        if count < 1 or sides < 1:
+            raise DiceError("A kockák száma és oldalszáma legalább 1 legyen!")
+        if count > MAX_DICE or sides > MAX_SIDES:
+            raise DiceError("Túl sok kocka vagy túl sok oldal!")
+
+        keep, keep_n = None, 0
+        if m.group("adv"):
+            # Előny / hátrány: még egy kocka, a jobbat / rosszabbat tartjuk meg
+            if m.group("keep"):
+                raise DiceError("Az adv/dis nem kombinálható kh/kl-lel!")
+            keep, keep_n = ("h" if m.group("adv") == "adv" else "l"), count
+            count *= 2
+            if count > MAX_DICE:
+                raise DiceError("Túl sok kocka vagy túl sok oldal!")
+        elif m.group("keep"):
+            n = _number(m.group("keep_n"), MAX_DICE)
+            op = m.group("keep")
+            if op in ("dh", "dl"):
+                # Eldobás = a maradék megtartása a másik oldalról
+                keep, keep_n = ("l" if op == "dh" else "h"), count - n
+            else:
+                keep, keep_n = ("l" if op == "kl" else "h"), n
+            if not 0 < keep_n <= count:
+                raise DiceError("A megtartott kockák száma 1 és a kockaszám közé essen!")
+            if keep_n == count:
+                keep, keep_n = None, 0
+
+        explode = bool(m.group("explode"))
+        if explode and sides == 1:
+            raise DiceError("Egyoldalú kocka nem robbanhat!")
+
+        terms.append(DiceTerm(count, sides, sign, keep, keep_n, explode))
+        if len(terms) > MAX_TERMS:
+            raise DiceError("Túl sok tag a kifejezésben!")
+
+    return DicePlan(expr, tuple(terms), modifier)
+
+
+def _roll_term(term: DiceTerm, n: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """Egy tag dobása n példányban: (összes kocka [n, count], tag összege [n])."""
+    dice = rng.integers(1, term.sides + 1, size=(n, term.count))
+    if term.explode:
+        live = dice == term.sides
+        for _ in range(EXPLODE_DEPTH):
+            if not live.any():
+                break
+            extra = rng.integers(1, term.sides + 1, size=dice.shape)
+            dice += extra * live
+            live &= extra == term.sides
+    if term.keep:
+        ordered = np.sort(dice, axis=1)
+        kept = ordered[:, -term.keep_n:] if term.keep == "h" else ordered[:, :term.keep_n]
+        return dice, term.sign * kept.sum(axis=1)
+    return dice, term.sign * dice.sum(axis=1)
+
+
+def roll_many(plan: DicePlan, n: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """Ugyanannak a tervnek n független dobása, csak az összegek (int64 tömb)."""
+    rng = rng or _rng
+    totals = np.full(n, plan.modifier, dtype=np.int64)
+    for term in plan.terms:
+        totals += _roll_term(term, n, rng)[1]
+    return totals
+
+
+def roll(expression: str, rng: Optional[np.random.Generator] = None) -> RollResult:
+    """Egyetlen dobás, kockánkénti részletekkel (a kockadobó felületekhez)."""
+    plan = compile_expression(expression)
+    rng = rng or _rng
+    total = plan.modifier
+    dice, kept = [], []
+    for term in plan.terms:
+        values, subtotal = _roll_term(term, 1, rng)
+        row = values[0].tolist()
+        dice.append(row)
+        if term.keep:
+            ordered = sorted(row)
+            kept.append(ordered[-term.keep_n:] if term.keep == "h" else ordered[:term.keep_n])
+        else:
+            kept.append(row)
+        total += int(subtotal[0])
+    return RollResult(total=total, dice=dice, kept=kept, modifier=plan.modifier)
+
+
+def roll_batch(expressions: Sequence[str], rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """Sok kifejezés dobása egyszerre; az azonos kifejezések egy vektorizált hívásban mennek."""
+    if len(expressions) > MAX_BATCH:
+        raise DiceError(f"Egy kérésben legfeljebb {MAX_BATCH} dobás lehet!")
+    groups = {}
+    for i, expr in enumerate(expressions):
+        groups.setdefault(normalize(expr), []).append(i)
+
+    totals = np.empty(len(expressions), dtype=np.int64)
+    for expr, idx in groups.items():
+        totals[idx] = roll_many(_compile(expr), len(idx), rng)
+    return totals
+
+
+# ==========================================
+# PONTOS ELOSZLÁS (konvolúcióval, mintavétel nélkül)
+# ==========================================
+@dataclass
+class Distribution:
+    """Egy kifejezés pontos kimeneti eloszlása; pmf[i] = P(összeg == minimum + i)."""
+    expression: str
+    minimum: int
+    pmf: np.ndarray
+    cdf: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.cdf = np.cumsum(self.pmf)
+        self.pmf.flags.writeable = False
+        self.cdf.flags.writeable = False
+
+    @property
+    def maximum(self) -> int:
+        return self.minimum + len(self.pmf) - 1
+
+    @property
+    def mean(self) -> float:
+        return float(self.minimum + np.dot(np.arange(len(self.pmf)), self.pmf))
+
+    @property
+    def std(self) -> float:
+        offsets = np.arange(len(self.pmf)) - (self.mean - self.minimum)
+        return float(math.sqrt(max(np.dot(offsets * offsets, self.pmf), 0.0)))
+
+    def percentile(self, q: float) -> int:
+        """A legkisebb érték, amire P(összeg <= érték) >= q/100."""
+        idx = int(np.searchsorted(self.cdf, q / 100.0 - 1e-12))
+        return self.minimum + min(idx, len(self.pmf) - 1)
+
+    def p_at_least(self, dc: int) -> float:
+        """P(összeg >= DC), pl. mentődobás vagy 'megöli-e a tűzgolyó'."""
+        idx = dc - self.minimum
+        if idx <= 0:
+            return 1.0
+        if idx >= len(self.pmf):
+            return 0.0
+        return float(max(0.0, 1.0 - self.cdf[idx - 1]))
+
+
+def distribution(expression: str) -> Distribution:
+    """Pontos eloszlás (normalizált kifejezésenként LRU-cache-elve)."""
+    return _distribution(normalize(expression))
+
+
+@lru_cache(maxsize=512)
+def _distribution(expr: str) -> Distribution:
+    plan = _compile(expr)
+    minimum = plan.modifier
+    pmf = np.ones(1)
+    for term in plan.terms:
+        term_min, term_pmf = _term_pmf(term)
+        minimum += term_min
+        pmf = _convolve(pmf, term_pmf)
+    return Distribution(plan.expression, minimum, pmf)
+
+
+def _convolve(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Két eloszlás konvolúciója; nagy tömböknél FFT-vel."""
+    if min(len(a), len(b)) < 64 or len(a) * len(b) < 1_000_000:
+        return np.convolve(a, b)
+    n = len(a) + len(b) - 1
+    size = 1 << (n - 1).bit_length()
+    out = np.fft.irfft(np.fft.rfft(a, size) * np.fft.rfft(b, size), size)[:n]
+    # Az FFT kerekítési zaja apró negatív értékeket adhat
+    np.clip(out, 0.0, None, out=out)
+    return out / out.sum()
+
+
+def _convolve_power(p: np.ndarray, n: int) -> np.ndarray:
+    """p önmagával vett n-szeres konvolúciója (gyorshatványozással)."""
+    result = np.ones(1)
+    while n:
+        if n & 1:
+            result = _convolve(result, p)
+        n >>= 1
+        if n:
+            p = _convolve(p, p)
+    return result
+
+
+def _die_pmf(term: DiceTerm) -> np.ndarray:
+    """Egyetlen kocka eloszlása az 1-es értéktől (robbanással együtt)."""
+    s = term.sides
+    if not term.explode:
+        return np.full(s, 1.0 / s)
+    # A dobó EXPLODE_DEPTH ráadáskockáig robbant, az utolsó már nem robban tovább
+    pmf = np.zeros(s * (EXPLODE_DEPTH + 1))
+    for j in range(EXPLODE_DEPTH + 1):
+        last = j == EXPLODE_DEPTH
+        pmf[s * j: s * j + (s if last else s - 1)] = float(s) ** -(j + 1)
+    return pmf
+
+
+def _term_pmf(term: DiceTerm) -> Tuple[int, np.ndarray]:
+    """Egy tag (minimum, pmf) párja, előjellel együtt."""
+    die = _die_pmf(term)
+    if term.keep:
+        minimum, pmf = _keep_pmf(die, term.count, term.keep_n, term.keep == "h")
+    else:
+        minimum, pmf = term.count, _convolve_power(die, term.count)
+    if term.sign < 0:
+        return -(minimum + len(pmf) - 1), pmf[::-1].copy()
+    return minimum, pmf
+
+
+def _keep_pmf(die: np.ndarray, n: int, k: int, highest: bool) -> Tuple[int, np.ndarray]:
+    """n kockából a k legnagyobb (legkisebb) összegének eloszlása rendezett mintás DP-vel.
+
+    Az értékeket csökkenő (ill. növekvő) sorrendben járjuk be; az állapot az eddig
+    kiosztott kockák száma és a megtartott összeg, az átmenet binomiális súlyú.
+    """
+    values = np.nonzero(die)[0] + 1
+    if highest:
+        values = values[::-1]
+    if len(values) * n * n > MAX_KEEP_WORK:
+        raise DiceError("Ez a kh/kl kifejezés túl nagy a pontos eloszláshoz!")
+
+    top = int(values.max()) * k
+    # dp[c] = megtartott összeg eloszlása, ha már c kocka kapott értéket
+    dp = np.zeros((n + 1, top + 1))
+    dp[0, 0] = 1.0
+    for v in values:
+        p = die[v - 1]
+        new = np.zeros_like(dp)
+        for c in range(n + 1):
+            row = dp[c]
+            if not row.any():
+                continue
+            for m in range(n - c + 1):
+                weight = math.comb(n - c, m) * p ** m
+                if weight == 0.0:
+                    break
+                shift = int(v) * min(m, max(0, k - c))
+                if shift:
+                    new[c + m, shift:] += weight * row[:-shift]
+                else:
+                    new[c + m] += weight * row
+        dp = new
+
+    pmf = dp[n]
+    nonzero = np.nonzero(pmf)[0]
+    lo, hi = int(nonzero[0]), int(nonzero[-1])
+    pmf = pmf[lo:hi + 1]
+    return lo, pmf / pmf.sum()
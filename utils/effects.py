@@ -0,0 +1,53 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from utils import dice
+
+MAX_TARGETS = 1000
+
+
+def resolve_save(targets: Sequence[dict], damage: str, dc: Optional[int] = None, damage_type: Optional[str] = None,
+                 half_on_success: bool = True, shared_damage: bool = True,
+                 rng: Optional[np.random.Generator] = None) -> List[dict]:
+    """Mentődobásos sebzés sok célpontra egyszerre (pl. DEX mentő DC 15, 8d6 tűz, sikernél fele).
+
+    targets: {id, name, hp, save_bonus, resistances, immunities, vulnerabilities}; a mentők
+    és a sebzés egy-egy vektorizált dobás. shared_damage: a sebzést egyszer dobjuk mindenkire
+    (5e szabály a területre ható varázslatoknál), különben célpontonként. dc nélkül nincs mentő.
+    Sorrend: siker esetén felezés (vagy 0), majd immunitás / ellenállás (lefelé kerekítve
+    felezve) / sebezhetőség (dupla). Célpontonkénti bontást ad vissza. ValueError hibás bemenetnél.
+    """
+    if not 1 <= len(targets) <= MAX_TARGETS:
+        raise ValueError(f"A célpontok száma 1 és {MAX_TARGETS} között lehet.")
+    try:
+        plan = dice.compile_expression(damage)
+    except dice.DiceError as e:
+        raise ValueError(f"Hibás sebzés: {e}")
+    rng = rng or np.random.default_rng()
+    n = len(targets)
+
+    rolled = np.maximum(dice.roll_many(plan, 1 if shared_damage else n, rng), 0)
+    rolled = np.broadcast_to(rolled, n)
+    if dc is None:
+        d20 = totals = np.zeros(n, dtype=np.int64)
+        success = np.zeros(n, dtype=bool)
+    else:
+        d20 = rng.integers(1, 21, size=n)
+        totals = d20 + np.array([int(t.get("save_bonus", 0)) for t in targets], dtype=np.int64)
+        success = totals >= dc
+    taken = np.where(success, rolled // 2 if half_on_success else 0, rolled)
+    if damage_type:
+        has = lambda key: np.array([damage_type in (t.get(key) or ()) for t in targets], dtype=bool)
+        taken = np.where(has("resistances"), taken // 2, taken)
+        taken = np.where(has("vulnerabilities"), taken * 2, taken)
+        taken = np.where(has("immunities"), 0, taken)
+    hp = np.array([int(t["hp"]) for t in targets], dtype=np.int64)
+    hp_after = np.maximum(hp - taken, 0)
+
+    return [{"id": t.get("id"), "name": t.get("name"),
+             "save_roll": int(d20[i]) if dc is not None else None,
+             "save_total": int(totals[i]) if dc is not None else None,
+             "success": bool(success[i]), "rolled": int(rolled[i]), "damage": int(taken[i]),
+             "hp_before": int(hp[i]), "hp_after": int(hp_after[i])}
+            for i, t in enumerate(targets)]
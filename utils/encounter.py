@@ -0,0 +1,204 @@
+import bisect
+import heapq
+import itertools
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.state_db import StateDB
+
+MAX_GROUP = 100
+
+# Rendezési kulcs: (-kezdeményezés, -ügyesség, beszúrási sorszám, id)
+# Magasabb kezdeményezés előbb; egyezésnél a nagyobb ÜGY; utána az érkezési sorrend.
+SortKey = Tuple[int, int, int, str]
+
+
+def roll_initiative(count: int, bonus: int = 0, per_group: bool = False,
+                    rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """count példány kezdeményezése (d20 + bonus) egy vektorizált dobással; per_group esetén
+    az egész csoport egyetlen dobással lép (5e DMG: azonos szörnyek együtt). ValueError hibás számnál."""
+    if not 1 <= count <= MAX_GROUP:
+        raise ValueError(f"Egy csoportban 1 és {MAX_GROUP} közötti példány lehet.")
+    rng = rng or np.random.default_rng()
+    rolls = rng.integers(1, 21, size=1 if per_group else count) + bonus
+    return np.broadcast_to(rolls, count).copy()
+
+
+class EncounterStore:
+    """Mindig kezdeményezés szerint rendezett harc, id szerinti eléréssel és körmutatóval.
+
+    A sorrendet egy rendezett kulcslista tartja, amibe bisecttel szúrunk be (O(log n)
+    keresés), így a lekérdezésnél nem kell rendezni; a kész listát a következő
+    módosításig cache-eljük. Ha kap StateDB-t, minden változást (késleltetve) ment,
+    és induláskor onnan tölt vissza.
+    """
+
+    def __init__(self, db: Optional[StateDB] = None, namespace: str = "encounter"):
+        self._by_id: Dict[str, dict] = {}
+        self._keys: Dict[str, SortKey] = {}
+        self._order: List[SortKey] = []
+        self._seq = itertools.count()
+        self._cached: Optional[List[dict]] = None
+        self._lock = threading.RLock()
+        self.round = 1
+        self.active_id: Optional[str] = None
+        self.db = db
+        self.namespace = namespace
+        if db is not None:
+            self._restore()
+
+    # --- Perzisztencia ---
+    def _restore(self):
+        saved = sorted(self.db.get_all(self.namespace).values(), key=lambda item: item["seq"])
+        for item in saved:
+            self._insert(item["combatant"], item["seq"], persist=False)
+        self._seq = itertools.count(saved[-1]["seq"] + 1 if saved else 0)
+        turn = self.db.get(self.namespace + ".turn", "turn") or {}
+        self.round = turn.get("round", 1)
+        self.active_id = turn.get("active_id") if turn.get("active_id") in self._by_id else None
+
+    def _save(self, combatant_id: str):
+        if self.db is not None:
+            self.db.put(self.namespace, combatant_id,
+                        {"combatant": self._by_id[combatant_id], "seq": self._keys[combatant_id][2]})
+
+    def _save_turn(self):
+        if self.db is not None:
+            self.db.put(self.namespace + ".turn", "turn", {"round": self.round, "active_id": self.active_id})
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, combatant_id: str) -> bool:
+        return combatant_id in self._by_id
+
+    @staticmethod
+    def _key(c: dict, seq: int) -> SortKey:
+        return (-int(c.get("initiative", 0)), -int(c.get("dexterity", 10)), seq, c["id"])
+
+    def _insert(self, c: dict, seq: Optional[int] = None, persist: bool = True):
+        key = self._key(c, next(self._seq) if seq is None else seq)
+        bisect.insort(self._order, key)
+        self._keys[c["id"]] = key
+        self._by_id[c["id"]] = c
+        self._cached = None
+        if persist:
+            self._save(c["id"])
+
+    def _detach(self, combatant_id: str) -> SortKey:
+        key = self._keys.pop(combatant_id)
+        del self._order[bisect.bisect_left(self._order, key)]
+        self._cached = None
+        return key
+
+    def get(self, combatant_id: str) -> Optional[dict]:
+        return self._by_id.get(combatant_id)
+
+    def index_of(self, combatant_id: str) -> int:
+        return bisect.bisect_left(self._order, self._keys[combatant_id])
+
+    def add(self, combatant: dict) -> dict:
+        """Beszúrás a helyére; létező id esetén csere."""
+        with self._lock:
+            c = dict(combatant)
+            if c["id"] in self._keys:
+                self._detach(c["id"])
+            self._insert(c)
+            return c
+
+    def add_many(self, combatants: Sequence[dict]) -> List[dict]:
+        """Csoportos beszúrás: az új kulcsokat egyszer rendezzük, majd egy lineáris
+        összefésüléssel kerülnek a meglévő sorrendbe (nincs teljes újrarendezés)."""
+        with self._lock:
+            added = {c["id"]: dict(c) for c in combatants}
+            for combatant_id in added:
+                if combatant_id in self._keys:
+                    self._detach(combatant_id)
+            keys = sorted(self._key(c, next(self._seq)) for c in added.values())
+            self._order = list(heapq.merge(self._order, keys))
+            for key in keys:
+                self._keys[key[3]] = key
+                self._by_id[key[3]] = added[key[3]]
+                self._save(key[3])
+            self._cached = None
+            return [added[key[3]] for key in keys]
+
+    def update(self, combatant_id: str, changes: dict) -> Optional[dict]:
+        """Részleges módosítás; csak kezdeményezés / ÜGY változásakor mozdul a sorrendben."""
+        with self._lock:
+            c = self._by_id.get(combatant_id)
+            if c is None:
+                return None
+            reorder = any(k in changes and changes[k] != c.get(k) for k in ("initiative", "dexterity"))
+            if reorder:
+                seq = self._detach(combatant_id)[2]
+                c.update(changes)
+                self._insert(c, seq)
+            else:
+                c.update(changes)
+                self._cached = None
+                self._save(combatant_id)
+            return c
+
+    def remove(self, combatant_id: str) -> Optional[dict]:
+        """Eltávolítás; ha épp ő következett, a kör a sorban utána jövőre lép."""
+        with self._lock:
+            if combatant_id not in self._keys:
+                return None
+            idx = self.index_of(combatant_id)
+            self._detach(combatant_id)
+            if self.active_id == combatant_id:
+                if self._order:
+                    if idx >= len(self._order):
+                        idx = 0
+                        self.round += 1
+                    self.active_id = self._order[idx][3]
+                else:
+                    self.active_id = None
+                self._save_turn()
+            if self.db is not None:
+                self.db.delete(self.namespace, combatant_id)
+            return self._by_id.pop(combatant_id)
+
+    def next_turn(self) -> Optional[dict]:
+        """Lépteti a kezdeményezést; körbeérve új harci kör kezdődik."""
+        with self._lock:
+            if not self._order:
+                return None
+            if self.active_id is None:
+                self.active_id = self._order[0][3]
+            else:
+                idx = self.index_of(self.active_id) + 1
+                if idx >= len(self._order):
+                    idx = 0
+                    self.round += 1
+                self.active_id = self._order[idx][3]
+            self._cached = None
+            self._save_turn()
+            return self._by_id[self.active_id]
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._keys.clear()
+            self._order.clear()
+            self._cached = None
+            self.round = 1
+            self.active_id = None
+            if self.db is not None:
+                self.db.clear(self.namespace)
+                self.db.clear(self.namespace + ".turn")
+
+    def ordered(self) -> List[dict]:
+        """A résztvevők kezdeményezési sorrendben (a következő módosításig cache-elve)."""
+        with self._lock:
+            if self._cached is None:
+                self._cached = [self._by_id[k[3]] for k in self._order]
+            return self._cached
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            turn = self.index_of(self.active_id) if self.active_id in self._keys else 0
+            return {"combatants": self.ordered(), "round": self.round, "turn": turn, "active_id": self.active_id}
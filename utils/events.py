@@ -0,0 +1,97 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import Callable, Optional, Set
+
+BACKLOG_SIZE = 1000       # ennyi legutóbbi eseményből lehet újracsatlakozáskor pótolni
+SUBSCRIBER_QUEUE = 256    # ha egy lassú kliens ennél többel lemarad, teljes állapotot kap helyette
+HEARTBEAT = 15.0          # mp; ennyi csend után 'ping' (a halott kapcsolatok így derülnek ki)
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.overflowed = False
+
+
+class EventHub:
+    """Egy asztal valós idejű eseménycsatornája (harc és dobás deltái sorszámmal).
+
+    Minden esemény szigorúan növekvő seq-et kap; a kurzor 'epoch:seq' alakú, az epoch
+    a hub példányát azonosítja (újraindítás / kiürítés után a régi kurzor érvénytelen).
+    """
+
+    def __init__(self, backlog: int = BACKLOG_SIZE):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self._backlog: deque = deque(maxlen=backlog)
+        self._subscribers: Set[Subscriber] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def cursor(self) -> str:
+        return f"{self.epoch}:{self.seq}"
+
+    def publish(self, type: str, data: dict) -> dict:
+        self.seq += 1
+        event = {"seq": self.seq, "type": type, "data": data, "ts": time.time()}
+        self._backlog.append(event)
+        for sub in list(self._subscribers):
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                sub.overflowed = True
+                self._subscribers.discard(sub)
+        return event
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber()
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+
+    def missed(self, cursor: Optional[str]) -> Optional[list]:
+        """A kurzor óta kimaradt események, vagy None, ha ezekből már nem pótolható (snapshot kell)."""
+        if not cursor:
+            return None
+        epoch, _, seq = cursor.partition(":")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        since = int(seq)
+        if self._backlog and since < self._backlog[0]["seq"] - 1:
+            return None
+        return [e for e in self._backlog if e["seq"] > since]
+
+    async def stream(self, snapshot: Callable[[], dict], cursor: Optional[str] = None):
+        """Aszinkron eseményfolyam egy kliensnek: snapshot vagy pótlás, aztán élő deltak.
+
+        A feliratkozás és a snapshot / pótlás között nincs await, így egy esemény sem
+        vész el és nem duplázódik.
+        """
+        sub = self.subscribe()
+        try:
+            missed = self.missed(cursor)
+            if missed is None:
+                yield self._snapshot_event(snapshot)
+            else:
+                for event in missed:
+                    yield event
+            while True:
+                if sub.overflowed:
+                    # Lemaradt: az eldobott deltak helyett friss teljes állapot
+                    sub = self.subscribe()
+                    yield self._snapshot_event(snapshot)
+                try:
+                    yield await asyncio.wait_for(sub.queue.get(), timeout=HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield {"seq": self.seq, "type": "ping", "data": {}}
+        finally:
+            self.unsubscribe(sub)
+
+    def _snapshot_event(self, snapshot: Callable[[], dict]) -> dict:
+        return {"seq": self.seq, "type": "snapshot", "epoch": self.epoch, "data": snapshot()}
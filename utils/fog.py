@@ -0,0 +1,157 @@
+import base64
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+# Cella-régió: (sor0, oszlop0, sor1, oszlop1), a végek kizárva
+Region = Tuple[int, int, int, int]
+
+
+def encode_mask(mask: np.ndarray) -> str:
+    """Bool rács bitenként tömörítve, base64: egy 100x100-as rács ~1,7 KB."""
+    return base64.b64encode(np.packbits(mask, axis=None).tobytes()).decode("ascii")
+
+
+def decode_mask(cols: int, rows: int, data: str) -> np.ndarray:
+    bits = np.unpackbits(np.frombuffer(base64.b64decode(data), dtype=np.uint8), count=rows * cols)
+    return bits.astype(bool).reshape(rows, cols)
+
+
+class FogMask:
+    """Rács alapú háború köde: cellánként egy bit (True = takarva).
+
+    A műveletek a cellák középpontját vizsgálják, és csak az alakzat befoglaló
+    téglalapján dolgoznak, így egy kis felfedés egy nagy térképen is olcsó.
+    Koordináták cellában (lebegőpontos is lehet); az (x, y) = (oszlop, sor).
+    """
+
+    def __init__(self, cols: int, rows: int, fogged: bool = True, mask: Optional[np.ndarray] = None,
+                 version: int = 0):
+        self.cols = cols
+        self.rows = rows
+        self.mask = mask if mask is not None else np.full((rows, cols), fogged, dtype=bool)
+        self.version = version
+
+    # --- Alakzatok ---
+    def _clip(self, x0: float, y0: float, x1: float, y1: float) -> Optional[Region]:
+        c0, c1 = max(0, int(np.floor(x0))), min(self.cols, int(np.ceil(x1)))
+        r0, r1 = max(0, int(np.floor(y0))), min(self.rows, int(np.ceil(y1)))
+        return (r0, c0, r1, c1) if r0 < r1 and c0 < c1 else None
+
+    def _centers(self, region: Region) -> Tuple[np.ndarray, np.ndarray]:
+        r0, c0, r1, c1 = region
+        return np.arange(c0, c1) + 0.5, (np.arange(r0, r1) + 0.5)[:, None]
+
+    def _apply(self, region: Optional[Region], inside: Optional[np.ndarray], reveal: bool) -> Optional[Region]:
+        if region is None:
+            return None
+        r0, c0, r1, c1 = region
+        view = self.mask[r0:r1, c0:c1]
+        before = view.copy()
+        if inside is None:
+            view[...] = not reveal
+        else:
+            view[inside] = not reveal
+        if np.array_equal(before, view):
+            return None
+        self.version += 1
+        return region
+
+    def rect(self, x0: float, y0: float, x1: float, y1: float, reveal: bool = True) -> Optional[Region]:
+        """Téglalap (a sarkok sorrendje mindegy). Visszaadja a változott régiót, vagy None-t."""
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        region = self._clip(x0, y0, x1, y1)
+        if region is None:
+            return None
+        xs, ys = self._centers(region)
+        inside = (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+        return self._apply(region, inside, reveal)
+
+    def circle(self, cx: float, cy: float, radius: float, reveal: bool = True) -> Optional[Region]:
+        """Kör (pl. fényforrás sugara): a középpontjukkal a körbe eső cellák."""
+        region = self._clip(cx - radius, cy - radius, cx + radius, cy + radius)
+        if region is None:
+            return None
+        xs, ys = self._centers(region)
+        return self._apply(region, (xs - cx) ** 2 + (ys - cy) ** 2 <= radius ** 2, reveal)
+
+    def polygon(self, points: Iterable[Tuple[float, float]], reveal: bool = True) -> Optional[Region]:
+        """Sokszög (even-odd szabály), a befoglaló téglalap összes cellájára egyszerre."""
+        pts = np.asarray(list(points), dtype=float)
+        if len(pts) < 3:
+            return None
+        region = self._clip(pts[:, 0].min(), pts[:, 1].min(), pts[:, 0].max(), pts[:, 1].max())
+        if region is None:
+            return None
+        xs, ys = self._centers(region)
+        inside = np.zeros((len(ys), len(xs)), dtype=bool)
+        for (ax, ay), (bx, by) in zip(pts, np.roll(pts, -1, axis=0)):
+            if ay == by:
+                continue
+            crosses = (ay > ys) != (by > ys)
+            x_at = ax + (ys - ay) * (bx - ax) / (by - ay)
+            inside ^= crosses & (xs < x_at)
+        return self._apply(region, inside, reveal)
+
+    def fill(self, reveal: bool = False) -> Optional[Region]:
+        """Az egész térkép letakarása (vagy felfedése)."""
+        return self._apply((0, 0, self.rows, self.cols), None, reveal)
+
+    def reveal_mask(self, cells: np.ndarray) -> Optional[Region]:
+        """A maszkban igaz cellák felfedése (pl. a tokenek látómezeje)."""
+        hit = np.argwhere(cells)
+        if not len(hit):
+            return None
+        (r0, c0), (r1, c1) = hit.min(axis=0), hit.max(axis=0) + 1
+        return self._apply((int(r0), int(c0), int(r1), int(c1)), cells[r0:r1, c0:c1], True)
+
+    def coverage(self) -> float:
+        return float(self.mask.mean()) if self.mask.size else 0.0
+
+    # --- Szerializálás ---
+    def encode(self) -> str:
+        return encode_mask(self.mask)
+
+    @classmethod
+    def decode(cls, cols: int, rows: int, data: str, version: int = 0) -> "FogMask":
+        return cls(cols, rows, mask=decode_mask(cols, rows, data), version=version)
+
+    def to_dict(self) -> dict:
+        return {"cols": self.cols, "rows": self.rows, "version": self.version, "mask": self.encode()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FogMask":
+        return cls.decode(data["cols"], data["rows"], data["mask"], data.get("version", 0))
+
+
+class FogOverlay:
+    """A köd RGBA rétegként, cellánként cell_px pixellel; újrarajzoláskor csak a változott
+    (az előző rajzoláshoz képest eltérő) cellák befoglaló téglalapja számolódik újra."""
+
+    def __init__(self, cell_px: int, color: Tuple[int, int, int] = (0, 0, 0), alpha: int = 255):
+        self.cell_px = cell_px
+        self.color = np.array(color, dtype=np.uint8)
+        self.alpha = alpha
+        self.pixels: Optional[np.ndarray] = None
+        self._drawn: Optional[np.ndarray] = None
+
+    def render(self, fog: FogMask) -> np.ndarray:
+        """(sorok*cell_px, oszlopok*cell_px, 4) uint8 tömb; a hívók ne módosítsák."""
+        cp = self.cell_px
+        if self._drawn is None or self._drawn.shape != fog.mask.shape:
+            self.pixels = np.zeros((fog.rows * cp, fog.cols * cp, 4), dtype=np.uint8)
+            self.pixels[..., :3] = self.color
+            region = (0, 0, fog.rows, fog.cols)
+        else:
+            changed = np.argwhere(self._drawn != fog.mask)
+            if not len(changed):
+                return self.pixels
+            (r0, c0), (r1, c1) = changed.min(axis=0), changed.max(axis=0) + 1
+            region = (r0, c0, r1, c1)
+        r0, c0, r1, c1 = region
+        cells = fog.mask[r0:r1, c0:c1]
+        block = np.repeat(np.repeat(cells, cp, axis=0), cp, axis=1)
+        self.pixels[r0 * cp:r1 * cp, c0 * cp:c1 * cp, 3] = block * np.uint8(self.alpha)
+        self._drawn = fog.mask.copy()
+        return self.pixels
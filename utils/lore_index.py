@@ -0,0 +1,197 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+CHUNK_WORDS = 150        # egy darab (chunk) hozzávetőleges mérete szavakban
+CHUNK_OVERLAP = 30       # átfedés a hosszú bekezdések darabolásánál
+INDEX_VERSION = 2
+SAVE_DELAY = 2.0         # mp: ennyi ideig gyűjtjük a változásokat egy kiírás előtt
+
+# Gyakori, keresésre értéktelen szavak (magyar + angol)
+STOP_WORDS = {
+    "a", "az", "egy", "és", "hogy", "nem", "is", "de", "meg", "van", "volt", "mint", "ez", "azt",
+    "ha", "vagy", "már", "csak", "még", "ki", "mi", "el", "be", "fel", "le", "sem", "pedig",
+    "the", "and", "of", "to", "in", "is", "it", "on", "for", "with", "as", "at", "by", "an",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Kisbetűs szavak, stop szavak és egybetűsek nélkül."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOP_WORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """Durva LLM-token becslés (~4 karakter / token)."""
+    return len(text) // 4 + 1
+
+
+def chunk_text(text: str) -> List[str]:
+    """Bekezdésenként összefűzött, kb. CHUNK_WORDS szavas darabok."""
+    chunks, current, size = [], [], 0
+    for para in re.split(r"\n\s*\n", text):
+        words = para.split()
+        if not words:
+            continue
+        if len(words) > CHUNK_WORDS:
+            # Túl hosszú bekezdés: csúszóablakos darabolás átfedéssel
+            if current:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            step = CHUNK_WORDS - CHUNK_OVERLAP
+            for start in range(0, len(words), step):
+                chunks.append(" ".join(words[start:start + CHUNK_WORDS]))
+                if start + CHUNK_WORDS >= len(words):
+                    break
+            continue
+        if size + len(words) > CHUNK_WORDS and current:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(para.strip())
+        size += len(words)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+class LoreIndex:
+    """Lemezen tárolt fordított index a Kódex darabjaira, BM25 rangsorolással.
+
+    A kiírás késleltetett: a változások (feltöltés, újraépítés) csak jelölnek, és egy
+    háttér-időzítő save_delay másodperc múlva egyszer írja ki az indexet, így egy
+    feltöltés költsége nem nő az index méretével. Ha a kiírás elmarad (összeomlás),
+    a lemezen lévő index régi source_stamp-je miatt a következő sync újraépíti.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75, save_delay: float = SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self.k1 = k1
+        self.b = b
+        self.source_stamp = None                       # a Kódex (mtime_ns, méret) párja indexeléskor
+        self.chunks: List[Tuple[str, str]] = []        # (forrás, szöveg)
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}  # szó -> {chunk_id: előfordulás}
+        self.total_length = 0
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._dirty = False
+        self._load()
+
+    # --- Perzisztencia ---
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        self.source_stamp = tuple(data["source_stamp"])
+        self.chunks = [tuple(c) for c in data["chunks"]]
+        self.lengths = data["lengths"]
+        self.postings = {t: {int(i): tf for i, tf in plist} for t, plist in data["postings"].items()}
+        self.total_length = sum(self.lengths)
+
+    def _schedule_save(self):
+        """A hívó tartja a _lock-ot."""
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """A függő változások kiírása (időzítőből, kiürítéskor, leállításkor vagy kézzel)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = {
+                "version": INDEX_VERSION,
+                "source_stamp": self.source_stamp,
+                "chunks": list(self.chunks),
+                "lengths": list(self.lengths),
+                "postings": {t: list(p.items()) for t, p in self.postings.items()},
+            }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)  # atomikus csere, félkész index nem maradhat
+
+    # --- Építés ---
+    def clear(self):
+        self.chunks, self.lengths, self.postings, self.total_length = [], [], {}, 0
+
+    def _add_chunk(self, source: str, text: str):
+        terms = tokenize(text)
+        if not terms:
+            return
+        chunk_id = len(self.chunks)
+        self.chunks.append((source, text))
+        self.lengths.append(len(terms))
+        self.total_length += len(terms)
+        for term, tf in Counter(terms).items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+
+    def add_document(self, source: str, text: str, source_stamp: Tuple[int, int] = None):
+        """Új bejegyzés hozzáadása (inkrementálisan, a teljes index újraépítése nélkül)."""
+        with self._lock:
+            for chunk in chunk_text(text):
+                self._add_chunk(source, chunk)
+            if source_stamp is not None:
+                self.source_stamp = tuple(source_stamp)
+            self._schedule_save()
+
+    def sync(self, source_stamp: Tuple[int, int], entries: List[Tuple[str, str]]):
+        """Ha a Kódex azóta kívülről megváltozott (pl. kézzel szerkesztették), újraépítjük."""
+        if tuple(source_stamp) == self.source_stamp:
+            return
+        with self._lock:
+            self.clear()
+            for source, entry in entries:
+                for chunk in chunk_text(entry):
+                    self._add_chunk(source, chunk)
+            self.source_stamp = tuple(source_stamp)
+            self._schedule_save()
+
+    # --- Keresés ---
+    def search(self, query: str, top_k: int = 8) -> List[Tuple[float, int]]:
+        """A legrelevánsabb darabok (pontszám, chunk_id) listája BM25 szerint."""
+        n = len(self.chunks)
+        if not n:
+            return []
+        avg_len = self.total_length / n
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for chunk_id, tf in plist.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / avg_len)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(((s, i) for i, s in scores.items()), reverse=True)[:top_k]
+
+    def context(self, query: str, token_budget: int = 2000, top_k: int = 8) -> str:
+        """A prompthoz illesztendő releváns részletek, a token-kereten belül."""
+        parts, used = [], 0
+        for _, chunk_id in self.search(query, top_k):
+            source, text = self.chunks[chunk_id]
+            part = f"[{source}]\n{text}"
+            cost = estimate_tokens(part)
+            if used + cost > token_budget:
+                continue
+            parts.append(part)
+            used += cost
+        return "\n\n".join(parts)
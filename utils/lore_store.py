@@ -0,0 +1,78 @@
+import os
+import re
+import threading
+from typing import List, Optional, Tuple
+
+# A Kódex bejegyzéseit ez a jelölő választja el (lásd /api/lore/upload)
+ENTRY_RE = re.compile(r"^--- Új bejegyzés: (.*?) ---$", re.MULTILINE)
+
+
+def split_entries(text: str) -> List[Tuple[str, str]]:
+    """A Kódex szövegének felbontása (forrás, tartalom) bejegyzésekre."""
+    entries = []
+    matches = list(ENTRY_RE.finditer(text))
+    head = text[:matches[0].start()] if matches else text
+    if head.strip():
+        entries.append(("Kódex", head))
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        entries.append((m.group(1), text[m.end():end]))
+    return entries
+
+
+class LoreStore:
+    """Folyamatszintű, memóriában tartott Kódex.
+
+    Csak akkor olvassa újra a fájlt, ha annak mtime-ja vagy mérete megváltozott
+    (pl. kézzel szerkesztették); a feltöltések memóriában fűződnek hozzá, a fájlba
+    pedig azonnal kiíródnak (write-through).
+    """
+
+    def __init__(self, path: str, header: str = ""):
+        self.path = path
+        self.entries: List[Tuple[str, str]] = []
+        self._stamp: Optional[Tuple[int, int]] = None  # (mtime_ns, méret)
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(header)
+        self.refresh()
+
+    @property
+    def stamp(self) -> Tuple[int, int]:
+        return self._stamp
+
+    def _stat(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _reload(self, stamp: Tuple[int, int]):
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.entries = split_entries(f.read())
+        self._stamp = stamp
+
+    def refresh(self) -> bool:
+        """Újraolvasás, ha a fájl kívülről megváltozott. True, ha volt változás."""
+        if self._stat() == self._stamp:
+            return False
+        with self._lock:
+            stamp = self._stat()
+            if stamp == self._stamp:
+                return False
+            self._reload(stamp)
+            return True
+
+    def append(self, source: str, text: str):
+        """Új bejegyzés: memóriában hozzáfűzzük és azonnal a fájlba is kiírjuk."""
+        with self._lock:
+            stale = self._stat() != self._stamp
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(f"\n--- Új bejegyzés: {source} ---\n")
+                f.write(text)
+                f.write("\n")
+            if stale:
+                # Közben kívülről is módosult: egyszerűbb mindent újraolvasni
+                self._reload(self._stat())
+                return
+            self.entries.append((source, f"\n{text}\n"))
+            self._stamp = self._stat()
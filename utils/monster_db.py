@@ -0,0 +1,173 @@
+import bisect
+import difflib
+import json
+import os
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "srd_monsters.json")
+
+ABILITIES = ("str", "dex", "con", "int", "wis", "cha")
+DAMAGE_TYPES = ("acid", "bludgeoning", "cold", "fire", "force", "lightning", "necrotic", "piercing",
+                "poison", "psychic", "radiant", "slashing", "thunder")
+# Feltételes védelem ("... from nonmagical weapons", "damage from spells"): varázslatra nem érvényes
+_CONDITIONAL_RE = re.compile(r"(?:bludgeoning, piercing,? and slashing|piercing|damage)(?: damage)? from [^;]*")
+_DAMAGE_TYPE_RE = re.compile(r"\b(" + "|".join(DAMAGE_TYPES) + r")\b")
+
+
+def slugify(name: str) -> str:
+    """'Adult Red Dragon' -> 'adult-red-dragon' (a dnd5eapi index formátuma)."""
+    return re.sub(r"[^a-z0-9]+", "-", name.lower().replace("'", "")).strip("-")
+
+
+def _trigrams(text: str) -> set:
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class MonsterDB:
+    """Helyi, memóriában indexelt SRD szörny adatbázis (offline, külső szolgáltatás nélkül).
+
+    Indexek: slug -> szörny, rendezett névlista (prefix keresés bisecttel),
+    trigram index (elgépelés-tűrő keresés), típus / méret / CR szerinti szűrés.
+    """
+
+    def __init__(self, monsters: List[dict]):
+        self.monsters = monsters
+        self.by_index: Dict[str, dict] = {m["index"]: m for m in monsters}
+        self._ids: Dict[str, int] = {m["index"]: i for i, m in enumerate(monsters)}
+        self._names = sorted((m["name"].lower(), i) for i, m in enumerate(monsters))
+        self._name_keys = [n for n, _ in self._names]
+        self._words = sorted((w, i) for i, m in enumerate(monsters) for w in re.findall(r"[a-z0-9]+", m["name"].lower()))
+        self._word_keys = [w for w, _ in self._words]
+        self._trigrams: Dict[str, List[int]] = defaultdict(list)
+        self._trigram_counts = []
+        for i, m in enumerate(monsters):
+            grams = _trigrams(m["name"].lower())
+            self._trigram_counts.append(len(grams))
+            for g in grams:
+                self._trigrams[g].append(i)
+        self.by_type: Dict[str, set] = defaultdict(set)
+        self.by_size: Dict[str, set] = defaultdict(set)
+        for i, m in enumerate(monsters):
+            self.by_type[m["type"].lower()].add(i)
+            self.by_size[m["size"].lower()].add(i)
+        self._by_cr = sorted((m["cr"], i) for i, m in enumerate(monsters))
+        self._cr_keys = [cr for cr, _ in self._by_cr]
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH) -> "MonsterDB":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["monsters"])
+
+    # --- Keresések ---
+    def prefix(self, text: str) -> List[int]:
+        """Név eleji egyezés, majd bármely szó eleji egyezés ('drag' -> minden sárkány)."""
+        text = text.lower()
+        start = bisect.bisect_left(self._name_keys, text)
+        end = bisect.bisect_left(self._name_keys, text + "\uffff")
+        found = [i for _, i in self._names[start:end]]
+        start = bisect.bisect_left(self._word_keys, text)
+        end = bisect.bisect_left(self._word_keys, text + "\uffff")
+        return found + [i for _, i in self._words[start:end]]
+
+    def fuzzy(self, text: str, limit: int = 10, threshold: float = 0.2) -> List[int]:
+        """Elgépelés-tűrő keresés: trigram jelöltek, SequenceMatcher szerint rangsorolva."""
+        text = text.lower()
+        grams = _trigrams(text)
+        overlap: Dict[int, int] = defaultdict(int)
+        for g in grams:
+            for i in self._trigrams.get(g, ()):
+                overlap[i] += 1
+        candidates = [i for i, common in overlap.items()
+                      if common / (len(grams) + self._trigram_counts[i] - common) >= threshold]
+        scored = sorted(
+            (-difflib.SequenceMatcher(None, text, self.monsters[i]["name"].lower()).ratio(), i)
+            for i in candidates)
+        return [i for _, i in scored[:limit]]
+
+    def _filter_ids(self, cr_min=None, cr_max=None, type=None, size=None) -> Optional[set]:
+        ids = None
+        if type:
+            ids = set(self.by_type.get(type.lower(), ()))
+        if size:
+            sized = self.by_size.get(size.lower(), set())
+            ids = sized if ids is None else ids & sized
+        if cr_min is not None or cr_max is not None:
+            lo = bisect.bisect_left(self._cr_keys, cr_min) if cr_min is not None else 0
+            hi = bisect.bisect_right(self._cr_keys, cr_max) if cr_max is not None else len(self._cr_keys)
+            by_cr = {i for _, i in self._by_cr[lo:hi]}
+            ids = by_cr if ids is None else ids & by_cr
+        return ids
+
+    def search(self, query: str = "", cr_min: float = None, cr_max: float = None,
+               type: str = None, size: str = None, limit: int = 20) -> List[dict]:
+        """Pontos slug -> prefix -> elgépelés-tűrő találatok, szűrőkkel."""
+        allowed = self._filter_ids(cr_min, cr_max, type, size)
+        query = query.strip()
+        if query:
+            ordered, seen = [], set()
+            exact = self._ids.get(slugify(query))
+            candidates = ([exact] if exact is not None else []) + self.prefix(query) + self.fuzzy(query, limit=max(limit, 50))
+            for i in candidates:
+                if i not in seen:
+                    seen.add(i)
+                    ordered.append(i)
+        else:
+            ordered = [i for _, i in self._by_cr]
+        if allowed is not None:
+            ordered = [i for i in ordered if i in allowed]
+        return [self.monsters[i] for i in ordered[:limit]]
+
+    def get(self, name_or_index: str) -> Optional[dict]:
+        """Egy szörny slug vagy név alapján; ha nincs pontos egyezés, a legjobb közelítés."""
+        monster = self.by_index.get(slugify(name_or_index))
+        if monster:
+            return monster
+        found = self.search(name_or_index, limit=1)
+        return found[0] if found else None
+
+    def for_combatant(self, name: str) -> Optional[dict]:
+        """A harcos nevéhez ('Goblin 3') tartozó szörny, csak pontos egyezéssel (sorszám nélkül).
+        Elgépelés-tűrés nincs: egy egyedi NJK ('Bob') ne kapja meg egy hasonló nevű szörny adatait."""
+        return self.by_index.get(slugify(name.rstrip(" 0123456789")))
+
+
+def summary(m: dict) -> dict:
+    """Rövid kivonat listázáshoz (a teljes stat block nélkül)."""
+    return {
+        "index": m["index"], "name": m["name"], "size": m["size"], "type": m["type"],
+        "cr": m["cr"], "ac": m["ac"], "hp": m["hp"], "hit_dice": m["hit_dice"],
+    }
+
+
+def attack_profile(m: dict) -> Optional[dict]:
+    """A szörny első támadása szimulációhoz: találati bónusz, sebzés, támadások száma / kör."""
+    for action in m["actions"]:
+        if action.get("attack_bonus") is not None and action.get("damage"):
+            return {"attack_bonus": action["attack_bonus"], "damage": action["damage"],
+                    "attacks": m.get("multiattack") or 1,
+                    "initiative_bonus": (m["abilities"]["dex"] - 10) // 2}
+    return None
+
+
+def damage_types(text: str) -> List[str]:
+    """'fire, poison; bludgeoning, piercing, and slashing from nonmagical attacks' -> ['fire', 'poison']."""
+    return _DAMAGE_TYPE_RE.findall(_CONDITIONAL_RE.sub("", (text or "").lower()))
+
+
+def defense_profile(m: dict) -> dict:
+    """Mentődobás-bónuszok (a tulajdonságmódosító; az SRD adat nem jelöli a mentő-jártasságot)
+    és a feltétel nélküli sebzés-ellenállások / -immunitások / -sebezhetőségek."""
+    return {"save_bonus": {a: (m["abilities"][a] - 10) // 2 for a in ABILITIES},
+            "resistances": damage_types(m["damage_resistances"]),
+            "immunities": damage_types(m["damage_immunities"]),
+            "vulnerabilities": damage_types(m["damage_vulnerabilities"])}
+
+
+@lru_cache(maxsize=1)
+def load_monster_db() -> MonsterDB:
+    """Folyamatonként egyszer betöltött közös példány (API és Streamlit)."""
+    return MonsterDB.load()
@@ -0,0 +1,126 @@
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Kisbetű, egységes szóközök, záró írásjelek nélkül: 'Grapple?' == 'grapple'."""
+    return re.sub(r"\s+", " ", prompt.lower()).strip().rstrip("?!. ")
+
+
+def make_key(mode: str, model: str, prompt: str) -> str:
+    """Cache kulcs: mód + modell + normalizált kérdés."""
+    raw = json.dumps([mode, model, normalize_prompt(prompt)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache az alacsony hőmérsékletű (determinisztikus) AI válaszokhoz.
+
+    Opcionálisan lemezre is ment (JSON), így újraindítás után is megmaradnak a válaszok.
+    A mentés késleltetett: a set() csak jelöl, és egy háttér-időzítő flush_delay másodperc
+    múlva egyszerre írja ki a közben összegyűlt változásokat (nem az event loopon).
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 24 * 3600, path: Optional[str] = None,
+                 flush_delay: float = 2.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.flush_delay = flush_delay
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # kulcs -> (lejárat, válasz)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._dirty = False
+        self._load()
+        if path:
+            atexit.register(self.flush)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.time():
+                if item is not None:
+                    del self._data[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            self._schedule_save()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._schedule_save()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    # --- Perzisztencia ---
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, expires, value in items[-self.max_size:]:
+            if expires > now:
+                self._data[key] = (expires, value)
+
+    def _schedule_save(self):
+        """A hívó tartja a _lock-ot."""
+        if not self.path:
+            return
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """A függő változások kiírása (időzítőből, leállításkor vagy kézzel)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            items = [[k, exp, v] for k, (exp, v) in self._data.items()]
+        with self._save_lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(items, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
@@ -0,0 +1,115 @@
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.state_db import StateDB
+
+
+class RollLog:
+    """Fix méretű gyűrűpuffer a dobásokhoz, játékosonkénti másodlagos indexszel.
+
+    Minden dobás egy szigorúan növekvő sorszámot (seq) kap; a puffer a seq % capacity
+    helyen tárolja, így a beszúrás O(1), a legrégebbi bejegyzés magától íródik felül.
+    A játékos-indexek seq listák, amikből a kiesett bejegyzéseket lustán takarítjuk.
+    StateDB-vel a dobások késleltetve lemezre kerülnek, induláskor onnan töltődnek vissza.
+    """
+
+    def __init__(self, capacity: int = 100_000, db: Optional[StateDB] = None, campaign: str = "default"):
+        self.capacity = capacity
+        self._buf: List[Optional[dict]] = [None] * capacity
+        self._next = 0
+        self._by_player: Dict[str, List[int]] = {}
+        self._player_start: Dict[str, int] = {}  # az első még érvényes elem helye a listában
+        self._lock = threading.Lock()
+        self.db = db
+        self.campaign = campaign
+        if db is not None:
+            self._restore(db.load_rolls(capacity, campaign))
+
+    def _restore(self, entries: List[dict]):
+        """Mentett dobások visszatöltése az eredeti sorszámukkal."""
+        for entry in entries:
+            self._buf[entry["seq"] % self.capacity] = entry
+            self._by_player.setdefault(entry.get("player", ""), []).append(entry["seq"])
+        if entries:
+            self._next = entries[-1]["seq"] + 1
+            for player in list(self._by_player):
+                self._prune(player)
+
+    def __len__(self) -> int:
+        return self._next - self.oldest
+
+    @property
+    def oldest(self) -> int:
+        return max(0, self._next - self.capacity)
+
+    def append(self, entry: dict) -> dict:
+        """Új dobás rögzítése; a bejegyzés 'seq' és 'timestamp' mezőt kap."""
+        with self._lock:
+            seq = self._next
+            entry = dict(entry, seq=seq, timestamp=entry.get("timestamp", time.time()))
+            evicted = self._buf[seq % self.capacity]
+            self._buf[seq % self.capacity] = entry
+            self._next += 1
+            self._by_player.setdefault(entry.get("player", ""), []).append(seq)
+            if evicted is not None:
+                # A kiesett bejegyzés játékosának indexét is rendben tartjuk
+                self._prune(evicted.get("player", ""))
+            if self.db is not None:
+                self.db.append_roll(entry, keep=self.capacity, campaign=self.campaign)
+            return entry
+
+    def _prune(self, player: str):
+        """A puffertől már kiesett seq-ek leválasztása a játékos indexéről."""
+        seqs = self._by_player.get(player)
+        if seqs is None:
+            return
+        start = bisect.bisect_left(seqs, self.oldest, lo=self._player_start.get(player, 0))
+        if start >= len(seqs):
+            del self._by_player[player]
+            self._player_start.pop(player, None)
+        elif start > len(seqs) // 2:
+            # Ritkán tömörítünk, hogy a takarítás amortizáltan O(1) maradjon
+            del seqs[:start]
+            self._player_start[player] = 0
+        else:
+            self._player_start[player] = start
+
+    def clear(self):
+        with self._lock:
+            self._buf = [None] * self.capacity
+            self._next = 0
+            self._by_player.clear()
+            self._player_start.clear()
+            if self.db is not None:
+                self.db.clear_rolls(self.campaign)
+
+    def query(self, player: Optional[str] = None, since: Optional[float] = None,
+              before: Optional[int] = None, limit: int = 50) -> Tuple[List[dict], Optional[int]]:
+        """Legfrissebb elöl, lapozva: (bejegyzések, a következő oldal 'before' kurzora vagy None).
+
+        player: csak az ő dobásai; since: unix idő, ennél nem régebbiek;
+        before: csak ennél kisebb seq-ű bejegyzések (az előző oldal next_before értéke).
+        """
+        with self._lock:
+            if player is None:
+                seqs, lo = range(self.oldest, self._next), 0
+            else:
+                if player not in self._by_player:
+                    return [], None
+                self._prune(player)
+                if player not in self._by_player:
+                    return [], None
+                seqs, lo = self._by_player[player], self._player_start.get(player, 0)
+
+            hi = len(seqs)
+            if before is not None:
+                hi = bisect.bisect_left(seqs, before, lo=lo)
+            if since is not None:
+                lo = bisect.bisect_left(seqs, since, lo=lo, hi=hi,
+                                        key=lambda s: self._buf[s % self.capacity]["timestamp"])
+            start = max(lo, hi - limit)
+            page = [self._buf[s % self.capacity] for s in reversed(seqs[start:hi])]
+            next_before = seqs[start] if start > lo else None
+            return page, next_before
@@ -0,0 +1,62 @@
+import json
+
+import pandas as pd
+import streamlit as st
+
+from utils.campaigns import DEFAULT_CAMPAIGN, namespace, validate_campaign_id
+from utils.state_db import _dumps, open_state_db
+
+# A legutóbb mentett JSON (névtér, kulcs) szerint: változatlan állapotot nem írunk újra
+_last_saved = {}
+
+
+def current_namespace() -> str:
+    """A kampányt az URL ?campaign= paramétere választja ki (alapértelmezés: 'default')."""
+    campaign = st.query_params.get("campaign", DEFAULT_CAMPAIGN)
+    try:
+        validate_campaign_id(campaign)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    return namespace("session", campaign)
+
+
+def _encode(value):
+    if isinstance(value, pd.DataFrame):
+        # to_json: a numpy típusok (int64, float64) is rendes JSON számok lesznek
+        return {"__dataframe__": json.loads(value.to_json(orient="split", force_ascii=False))}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and "__dataframe__" in value:
+        frame = value["__dataframe__"]
+        return pd.DataFrame(frame["data"], columns=frame["columns"], index=frame["index"])
+    return value
+
+
+def init_state(key, default):
+    """st.session_state[key] beállítása: a mentett érték, ha van, különben az alapértelmezett."""
+    if key in st.session_state:
+        return
+    ns = current_namespace()
+    saved = open_state_db().get(ns, key)
+    if saved is not None:
+        _last_saved[(ns, key)] = _dumps(saved)
+        st.session_state[key] = _decode(saved)
+    else:
+        st.session_state[key] = default
+
+
+def persist_state(*keys):
+    """A megadott session_state kulcsok mentése (csak ha változtak; a kiírás a háttérben történik)."""
+    db = open_state_db()
+    ns = current_namespace()
+    for key in keys:
+        if key not in st.session_state:
+            continue
+        value = _encode(st.session_state[key])
+        encoded = _dumps(value)
+        if _last_saved.get((ns, key)) != encoded:
+            _last_saved[(ns, key)] = encoded
+            db.put(ns, key, value)
@@ -0,0 +1,136 @@
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+Position = Tuple[float, float]
+
+LINEAR_SCAN = 32  # ennyi token alatt a nearest() egyszerűen mindet végignézi
+
+
+def grid_distance(a: Position, b: Position) -> int:
+    """Rácstávolság cellában (5e: az átlós lépés is egy cella), a tokenek cellái között."""
+    return max(abs(math.floor(a[0]) - math.floor(b[0])), abs(math.floor(a[1]) - math.floor(b[1])))
+
+
+class TokenGrid:
+    """Tokenpozíciók (cella-koordinátában) grid-hash indexben: bucket -> token id-k halmaza.
+
+    A mozgatás O(1) (csak a régi és az új bucket változik); a lekérdezések csak a
+    keresett terület bucketjeit nézik végig, nem az összes tokent.
+    """
+
+    def __init__(self, bucket: int = 4):
+        self.bucket = bucket
+        self.positions: Dict[str, Position] = {}
+        self._buckets: Dict[Tuple[int, int], Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, token_id: str) -> bool:
+        return token_id in self.positions
+
+    def _key(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.bucket), int(y // self.bucket)
+
+    def move(self, token_id: str, x: float, y: float):
+        """Beszúrás vagy mozgatás."""
+        old = self.positions.get(token_id)
+        key = self._key(x, y)
+        if old is not None:
+            old_key = self._key(*old)
+            if old_key != key:
+                bucket = self._buckets[old_key]
+                bucket.discard(token_id)
+                if not bucket:
+                    del self._buckets[old_key]
+        self._buckets.setdefault(key, set()).add(token_id)
+        self.positions[token_id] = (x, y)
+
+    def remove(self, token_id: str) -> bool:
+        pos = self.positions.pop(token_id, None)
+        if pos is None:
+            return False
+        key = self._key(*pos)
+        bucket = self._buckets[key]
+        bucket.discard(token_id)
+        if not bucket:
+            del self._buckets[key]
+        return True
+
+    def _ring(self, bx: int, by: int, r: int) -> Iterable[str]:
+        """Az (bx, by) bucket körüli r. gyűrű bucketjeinek tokenjei."""
+        if r == 0:
+            yield from self._buckets.get((bx, by), ())
+            return
+        for x in range(bx - r, bx + r + 1):
+            for y in (by - r, by + r):
+                yield from self._buckets.get((x, y), ())
+        for y in range(by - r + 1, by + r):
+            for x in (bx - r, bx + r):
+                yield from self._buckets.get((x, y), ())
+
+    def query_rect(self, x0: float, y0: float, x1: float, y1: float) -> List[str]:
+        """A téglalapba (széleket is beleértve) eső tokenek."""
+        (bx0, by0), (bx1, by1) = self._key(x0, y0), self._key(x1, y1)
+        found = []
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                for token_id in self._buckets.get((bx, by), ()):
+                    x, y = self.positions[token_id]
+                    if x0 <= x <= x1 and y0 <= y <= y1:
+                        found.append(token_id)
+        return found
+
+    def within(self, x: float, y: float, radius: int, exclude: Optional[str] = None) -> List[Tuple[str, int]]:
+        """A (x, y) cellától legfeljebb radius cellára álló tokenek (id, távolság), távolság szerint."""
+        cx, cy = math.floor(x), math.floor(y)
+        found = [(grid_distance((x, y), self.positions[t]), t)
+                 for t in self.query_rect(cx - radius, cy - radius, cx + radius + 1 - 1e-9, cy + radius + 1 - 1e-9)
+                 if t != exclude]
+        return [(t, d) for d, t in sorted(found) if d <= radius]
+
+    def nearest(self, x: float, y: float, k: int = 1, exclude: Optional[str] = None) -> List[Tuple[str, int]]:
+        """A k legközelebbi token (id, távolság). Gyűrűnként bővítve keres: ha a k. legjobb
+        távolság nem nagyobb a még át nem nézett bucketek minimális távolságánál, leáll.
+        Kevés token, k >= tokenszám, vagy ritka elhelyezés esetén (a gyűrűk már több bucketet
+        néznének, mint ahány foglalt van) egyszerű lineáris keresés."""
+        if k <= 0:
+            return []
+        total = len(self.positions) - (exclude in self.positions)
+        if total <= LINEAR_SCAN or k >= total:
+            return self._nearest_linear(x, y, k, exclude)
+        bx, by = self._key(x, y)
+        candidates: List[Tuple[int, str]] = []
+        r = 0
+        while True:
+            candidates.extend((grid_distance((x, y), self.positions[t]), t)
+                              for t in self._ring(bx, by, r) if t != exclude)
+            if len(candidates) == total:
+                break
+            if len(candidates) >= k:
+                best = heapq.nsmallest(k, candidates)
+                # Az r+1. gyűrűtől kifelé minden token legalább r * bucket + 1 cellára van
+                if best[-1][0] <= r * self.bucket:
+                    return [(t, d) for d, t in best]
+            r += 1
+            if (2 * r + 1) ** 2 > len(self._buckets):
+                return self._nearest_linear(x, y, k, exclude)
+        return [(t, d) for d, t in heapq.nsmallest(k, candidates)]
+
+    def _nearest_linear(self, x: float, y: float, k: int, exclude: Optional[str]) -> List[Tuple[str, int]]:
+        best = heapq.nsmallest(k, ((grid_distance((x, y), pos), t) for t, pos in self.positions.items()
+                                   if t != exclude))
+        return [(t, d) for d, t in best]
+
+
+def opportunity_attacks(index: TokenGrid, mover: str, start: Position, end: Position,
+                        enemies: Dict[str, int]) -> List[str]:
+    """Azok az ellenfelek (id -> elérés cellában), akiknek az elérését a mozgó token a köre
+    alatt elhagyta: a kezdő cellájától elértek, a mostanitól már nem (5e: alkalmi támadás)."""
+    if not enemies:
+        return []
+    reach = max(enemies.values())
+    return [token_id for token_id, d in index.within(start[0], start[1], reach, exclude=mover)
+            if token_id in enemies and d <= enemies[token_id]
+            and grid_distance(end, index.positions[token_id]) > enemies[token_id]]
@@ -0,0 +1,211 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_DB_PATH = os.getenv("CAMPAIGN_DB", "campaign.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rolls (
+    campaign TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (campaign, seq)
+) WITHOUT ROWID;
+"""
+
+
+def _default(obj: Any):
+    # numpy skalárok (pl. a data_editor int64-ei) -> Python szám; minden más (pl. datetime.time) -> szöveg
+    return obj.item() if hasattr(obj, "item") else str(obj)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=_default)
+
+
+class StateDB:
+    """SQLite (WAL) alapú tartós tároló, késleltetett (write-behind) kötegelt írással.
+
+    A kérések csak egy memóriabeli pufferbe írnak; egy háttérszál flush_interval
+    másodpercenként egyetlen tranzakcióban menti ki. Ugyanarra a kulcsra jutó
+    többszöri írásból (pl. HP kattintgatás) csak az utolsó kerül lemezre.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, flush_interval: float = 0.5, max_pending: int = 1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._migrate()
+        self._conn.executescript(SCHEMA)
+        # (namespace, key) -> JSON vagy None (törlés); a törölt névterek a kötegben elöl
+        self._pending: Dict[Tuple[str, str], Optional[str]] = {}
+        self._cleared: set = set()
+        self._rolls: List[tuple] = []
+        self._rolls_keep: Dict[str, int] = {}
+        self._rolls_cleared: set = set()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="state-db-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _migrate(self):
+        """A régi, egykampányos dobás-tábla átemelése az alapértelmezett kampány alá."""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(rolls)")]
+        if columns and "campaign" not in columns:
+            self._conn.executescript("ALTER TABLE rolls RENAME TO rolls_v1;" + SCHEMA +
+                                     "INSERT INTO rolls SELECT 'default', seq, player, timestamp, data FROM rolls_v1;"
+                                     "DROP TABLE rolls_v1;")
+
+    # --- Kulcs-érték (kampány állapot, harc) ---
+    def put(self, namespace: str, key: str, value: Any):
+        with self._lock:
+            self._pending[(namespace, key)] = _dumps(value)
+        self._kick()
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._pending[(namespace, key)] = None
+        self._kick()
+
+    def clear(self, namespace: str):
+        with self._lock:
+            self._pending = {k: v for k, v in self._pending.items() if k[0] != namespace}
+            self._cleared.add(namespace)
+        self._kick()
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        return self.get_all(namespace).get(key, default)
+
+    def get_all(self, namespace: str) -> Dict[str, Any]:
+        """Egy névtér teljes tartalma (a még ki nem írt módosításokkal együtt)."""
+        with self._lock:
+            cleared = namespace in self._cleared
+            overlay = {k: v for (ns, k), v in self._pending.items() if ns == namespace}
+        rows = [] if cleared else self._query("SELECT key, value FROM kv WHERE namespace = ?", (namespace,))
+        raw = dict(rows)
+        raw.update(overlay)
+        return {k: json.loads(v) for k, v in raw.items() if v is not None}
+
+    # --- Dobások ---
+    def append_roll(self, entry: dict, keep: Optional[int] = None, campaign: str = "default"):
+        """Dobás naplózása; keep: a kampány ennyi legutóbbi dobásánál régebbit a flush törli."""
+        with self._lock:
+            self._rolls.append((campaign, entry["seq"], entry.get("player", ""), entry["timestamp"], _dumps(entry)))
+            if keep:
+                self._rolls_keep[campaign] = keep
+        self._kick()
+
+    def clear_rolls(self, campaign: str = "default"):
+        with self._lock:
+            self._rolls = [r for r in self._rolls if r[0] != campaign]
+            self._rolls_cleared.add(campaign)
+        self._kick()
+
+    def load_rolls(self, limit: int, campaign: str = "default") -> List[dict]:
+        """A kampány legutóbbi limit darab dobása, seq szerint növekvő sorrendben (meleg indításhoz)."""
+        self.flush()
+        rows = self._query("SELECT data FROM (SELECT seq, data FROM rolls WHERE campaign = ? "
+                           "ORDER BY seq DESC LIMIT ?) ORDER BY seq", (campaign, limit))
+        return [json.loads(data) for (data,) in rows]
+
+    # --- Kiírás ---
+    def _kick(self):
+        self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._rolls) + len(self._cleared)
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait()
+            # Rövid várakozás, hogy az egymás utáni írások egy tranzakcióba kerüljenek
+            # (ha már sok gyűlt össze, azonnal írunk)
+            if not self._closed and self.pending() < self.max_pending:
+                time.sleep(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"❌ HIBA: Nem sikerült menteni az állapotot: {e}")
+
+    def flush(self):
+        """A puffer kiírása egyetlen tranzakcióban."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            cleared, self._cleared = self._cleared, set()
+            rolls, self._rolls = self._rolls, []
+            rolls_cleared, self._rolls_cleared = self._rolls_cleared, set()
+            keep = dict(self._rolls_keep)
+        if not (pending or cleared or rolls or rolls_cleared):
+            return
+        with self._db_lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.executemany("DELETE FROM kv WHERE namespace = ?", [(ns,) for ns in cleared])
+                cur.executemany("INSERT OR REPLACE INTO kv (namespace, key, value) VALUES (?, ?, ?)",
+                                [(ns, k, v) for (ns, k), v in pending.items() if v is not None])
+                cur.executemany("DELETE FROM kv WHERE namespace = ? AND key = ?",
+                                [(ns, k) for (ns, k), v in pending.items() if v is None])
+                cur.executemany("DELETE FROM rolls WHERE campaign = ?", [(c,) for c in rolls_cleared])
+                cur.executemany("INSERT OR REPLACE INTO rolls (campaign, seq, player, timestamp, data) "
+                                "VALUES (?, ?, ?, ?, ?)", rolls)
+                last_seq = {r[0]: r[1] for r in rolls}
+                cur.executemany("DELETE FROM rolls WHERE campaign = ? AND seq <= ?",
+                                [(c, seq - keep[c]) for c, seq in last_seq.items() if c in keep])
+                cur.execute("COMMIT")
+            except sqlite3.Error:
+                cur.execute("ROLLBACK")
+                self._requeue(pending, cleared, rolls, rolls_cleared)
+                raise
+
+    def _requeue(self, pending, cleared, rolls, rolls_cleared):
+        """Sikertelen kiírás után a köteg visszakerül a pufferbe (az újabb írások nyernek)."""
+        with self._lock:
+            for k, v in pending.items():
+                if k[0] not in self._cleared:
+                    self._pending.setdefault(k, v)
+            self._cleared |= cleared
+            self._rolls = [r for r in rolls if r[0] not in self._rolls_cleared] + self._rolls
+            self._rolls_cleared |= rolls_cleared
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._writer.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+
+@lru_cache(maxsize=None)
+def open_state_db(path: str = DEFAULT_DB_PATH) -> StateDB:
+    """Folyamatonként egy közös példány (API és Streamlit)."""
+    return StateDB(path)
@@ -0,0 +1,100 @@
+import json
+import math
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+TILE_SIZE = 256
+TILE_FORMAT = "webp"
+TILE_QUALITY = int(os.getenv("TILE_QUALITY", "80"))
+MANIFEST = "manifest.json"
+
+
+def build_pyramid(src_path: str, out_dir: str, tile_size: int = TILE_SIZE, quality: int = TILE_QUALITY) -> dict:
+    """Deep-zoom csempe-piramis: szintenként tile_size méretű WebP csempék + manifest.json.
+
+    A szintek számozása a Deep Zoom (DZI) szerinti: a max_level az eredeti felbontás,
+    minden szinttel lejjebb feleződik a kép, egészen addig, amíg egyetlen csempébe belefér.
+    A manifest utolsóként, atomikusan íródik ki, így a megléte jelenti a kész piramist.
+    """
+    with Image.open(src_path) as opened:
+        opened.seek(0)  # Animált GIF: az első képkocka
+        img = opened.convert("RGBA" if opened.mode in ("RGBA", "LA", "P") else "RGB")
+    width, height = img.size
+    max_level = max(0, math.ceil(math.log2(max(width, height))))
+
+    levels = []
+    level = max_level
+    while True:
+        w, h = img.size
+        cols, rows = math.ceil(w / tile_size), math.ceil(h / tile_size)
+        level_dir = os.path.join(out_dir, str(level))
+        os.makedirs(level_dir, exist_ok=True)
+        for col in range(cols):
+            for row in range(rows):
+                box = (col * tile_size, row * tile_size, min(w, (col + 1) * tile_size), min(h, (row + 1) * tile_size))
+                img.crop(box).save(os.path.join(level_dir, f"{col}_{row}.{TILE_FORMAT}"), TILE_FORMAT, quality=quality)
+        levels.append({"level": level, "width": w, "height": h, "cols": cols, "rows": rows})
+        if max(w, h) <= tile_size or level == 0:
+            break
+        # A következő szint a mostaniból készül (2x2 átlagolás), nem újra az eredetiből
+        img = img.reduce(2)
+        level -= 1
+
+    manifest = {
+        "width": width, "height": height, "tile_size": tile_size, "format": TILE_FORMAT,
+        "min_level": levels[-1]["level"], "max_level": max_level, "levels": levels[::-1],
+    }
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+def load_manifest(out_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(out_dir, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class TileBuilder:
+    """Háttérben futó csempézés, korlátozott számú szálon; ugyanazt a térképet nem építjük kétszer."""
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tiles")
+        self._jobs: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, src_path: str, out_dir: str) -> str:
+        """Csempézés indítása, ha még nincs kész / folyamatban (a hibás képet nem próbáljuk újra)."""
+        with self._lock:
+            if os.path.exists(os.path.join(out_dir, MANIFEST)):
+                return "ready"
+            if out_dir not in self._jobs:
+                self._jobs[out_dir] = self._executor.submit(build_pyramid, src_path, out_dir)
+                return "pending"
+        return self.status(out_dir)[0]
+
+    def status(self, out_dir: str) -> Tuple[str, Optional[dict]]:
+        """('ready', manifest) | ('pending', None) | ('failed', {'error': ...}) | ('missing', None)"""
+        manifest = load_manifest(out_dir)
+        if manifest is not None:
+            self._jobs.pop(out_dir, None)
+            return "ready", manifest
+        job = self._jobs.get(out_dir)
+        if job is None:
+            return "missing", None
+        if not job.done():
+            return "pending", None
+        if job.exception() is not None:
+            return "failed", {"error": str(job.exception())}
+        return "missing", None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
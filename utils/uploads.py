@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from starlette.staticfiles import StaticFiles
+
+CHUNK_SIZE = 1024 * 1024
+MAX_MAP_BYTES = int(os.getenv("MAX_MAP_BYTES", str(50 * 1024 * 1024)))
+MAX_TOKEN_BYTES = int(os.getenv("MAX_TOKEN_BYTES", str(5 * 1024 * 1024)))
+
+# Fájl-aláírások: a típust a tartalomból döntjük el, nem a kliens által küldött kiterjesztésből
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+]
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class StoredFile:
+    sha256: str
+    ext: str
+    size: int
+    deduplicated: bool
+
+    @property
+    def filename(self) -> str:
+        return f"{self.sha256}.{self.ext}"
+
+
+def sniff_image(head: bytes) -> Optional[str]:
+    """Kiterjesztés a fájl első bájtjaiból (png / jpg / gif / webp), vagy None."""
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _store(src: BinaryIO, dest_dir: str, max_bytes: int) -> StoredFile:
+    """Darabonkénti másolás ideiglenes fájlba, közben hash és méretkorlát; végül átnevezés a hash-re."""
+    tmp_path = os.path.join(dest_dir, f".upload-{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    size, ext = 0, None
+    try:
+        with open(tmp_path, "wb") as out:
+            while chunk := src.read(CHUNK_SIZE):
+                if ext is None:
+                    ext = sniff_image(chunk[:16])
+                    if ext is None:
+                        raise UploadError(415, "Csak PNG, JPEG, GIF vagy WebP kép tölthető fel.")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(413, f"A fájl túl nagy (max. {max_bytes / (1024 * 1024):g} MB).")
+                digest.update(chunk)
+                out.write(chunk)
+        if ext is None:
+            raise UploadError(400, "Üres fájl.")
+
+        stored = StoredFile(digest.hexdigest(), ext, size, deduplicated=False)
+        final_path = os.path.join(dest_dir, stored.filename)
+        if os.path.exists(final_path):
+            # Ugyanez a tartalom már megvan: nem tároljuk kétszer
+            stored.deduplicated = True
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+        return stored
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+async def store_upload(upload, dest_dir: str, max_bytes: int) -> StoredFile:
+    """Feltöltött kép tartalom-címzett tárolása (sha256.ext); azonos fájl csak egyszer kerül lemezre."""
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadError(413, f"A fájl túl nagy (max. {max_bytes / (1024 * 1024):g} MB).")
+    # A hash-elés és a lemezre írás szálon fut, hogy ne blokkolja az event loopot
+    return await asyncio.to_thread(_store, upload.file, dest_dir, max_bytes)
+
+
+def find_stored(dest_dir: str, sha256: str) -> Optional[str]:
+    """A már feltöltött fájl neve a hash alapján (feltöltés előtti ellenőrzéshez), vagy None."""
+    if not SHA256_RE.match(sha256):
+        return None
+    for ext in ("png", "jpg", "gif", "webp"):
+        name = f"{sha256}.{ext}"
+        if os.path.exists(os.path.join(dest_dir, name)):
+            return name
+    return None
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """A tartalom-címzett fájlok sosem változnak, így a böngésző örökre cache-elheti őket."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
@@ -0,0 +1,165 @@
+import math
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+LIGHTING = ("bright", "dark")
+# Sugár / kerület-cella: a legtávolabbi cellánál is legfeljebb fél cella a szögfelbontás hibája
+RAYS_PER_CELL = 1
+MIN_RAYS, MAX_RAYS = 360, 2048
+
+
+class WallIndex:
+    """Falszakaszok (cella-koordinátákban, [x0, y0, x1, y1]) bucket rácsba sorolva:
+    korlátozott látótávnál csak a közeli falak kerülnek a számításba."""
+
+    def __init__(self, bucket: int = 8):
+        self.bucket = bucket
+        self.segments = np.zeros((0, 4))
+        self.version = 0
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def _keys(self, x0: float, y0: float, x1: float, y1: float):
+        b = self.bucket
+        for bx in range(int(x0 // b), int(x1 // b) + 1):
+            for by in range(int(y0 // b), int(y1 // b) + 1):
+                yield bx, by
+
+    def set(self, segments: Iterable) -> bool:
+        """Az összes fal cseréje; ha semmi sem változott, a verzió (és a cache) marad."""
+        segs = np.asarray(segments, dtype=float).reshape(-1, 4)
+        if segs.shape == self.segments.shape and np.array_equal(segs, self.segments):
+            return False
+        self.segments = segs
+        self._buckets = {}
+        for i, (x0, y0, x1, y1) in enumerate(segs):
+            for key in self._keys(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)):
+                self._buckets.setdefault(key, []).append(i)
+        self.version += 1
+        return True
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        """A téglalapot érintő bucketek falai."""
+        ids = set()
+        for key in self._keys(x0, y0, x1, y1):
+            ids.update(self._buckets.get(key, ()))
+        return self.segments[sorted(ids)]
+
+
+@lru_cache(maxsize=32)
+def _ray_directions(rays: int) -> Tuple[np.ndarray, np.ndarray]:
+    angles = np.arange(rays) * (2 * math.pi / rays)
+    return np.cos(angles).astype(np.float32)[:, None], np.sin(angles).astype(np.float32)[:, None]
+
+
+def cast_rays(ox: float, oy: float, walls: np.ndarray, rays: int) -> np.ndarray:
+    """Sugaranként a legközelebbi fal távolsága (inf, ha nincs); sugár x fal mátrixként, egyszerre."""
+    if not len(walls):
+        return np.full(rays, np.inf)
+    dx, dy = _ray_directions(rays)
+    walls = walls.astype(np.float32)
+    ax, ay = walls[:, 0] - np.float32(ox), walls[:, 1] - np.float32(oy)
+    ex, ey = walls[:, 2] - walls[:, 0], walls[:, 3] - walls[:, 1]
+    # o + t*d = a + u*e  =>  t = (A x e) / (d x e),  u = (A x d) / (d x e)
+    denom = dx * ey - dy * ex
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (ax * ey - ay * ex) / denom
+        u = (ax * dy - ay * dx) / denom
+    hit = np.where((t > 0) & (u >= 0) & (u <= 1), t, np.inf)
+    return hit.min(axis=1)
+
+
+class VisionEngine:
+    """Látómező a rácson: falak mögé nem lát a token, sötétben csak a sötétlátása
+    és a fényforrások által megvilágított (és látott) cellák számítanak.
+
+    Koordináták és távolságok cellában. Tokenenként a látóvonal (LOS) cache-elve van
+    a falak verziójáig és a token pozíciójáig: egy token mozgatása csak a sajátját számolja újra.
+    """
+
+    def __init__(self, cols: int, rows: int, lighting: str = "bright"):
+        self.cols = cols
+        self.rows = rows
+        self.lighting = lighting
+        self.walls = WallIndex()
+        self.tokens: Dict[str, dict] = {}
+        self._xs = np.arange(cols) + 0.5
+        self._ys = (np.arange(rows) + 0.5)[:, None]
+        self._los: Dict[str, Tuple[tuple, np.ndarray, np.ndarray]] = {}
+        self._lit: Optional[Tuple[tuple, np.ndarray]] = None
+
+    def set_token(self, token_id: str, x: float, y: float, darkvision: float = 0, light: float = 0):
+        self.tokens[token_id] = {"x": x, "y": y, "darkvision": darkvision, "light": light}
+
+    def remove_token(self, token_id: str):
+        self.tokens.pop(token_id, None)
+        self._los.pop(token_id, None)
+
+    # --- Látóvonal ---
+    def _reach(self, token: dict) -> float:
+        """Sötétben fényforrás nélkül a sötétlátáson túl semmi sem látszik, ott elég kisebb ablak."""
+        if self.lighting == "bright" or any(t["light"] > 0 for t in self.tokens.values()):
+            return math.inf
+        return token["darkvision"]
+
+    def _line_of_sight(self, token_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(látható, távolság) a teljes rácson; a távolság a LOS ablakon kívül inf."""
+        token = self.tokens[token_id]
+        ox, oy, reach = token["x"], token["y"], self._reach(token)
+        key = (self.walls.version, ox, oy, reach)
+        cached = self._los.get(token_id)
+        if cached is not None and cached[0] == key:
+            return cached[1], cached[2]
+
+        mask = np.zeros((self.rows, self.cols), dtype=bool)
+        dist = np.full((self.rows, self.cols), np.inf)
+        if math.isinf(reach):
+            r0, c0, r1, c1 = 0, 0, self.rows, self.cols
+            walls = self.walls.segments
+        else:
+            c0, c1 = max(0, math.floor(ox - reach)), min(self.cols, math.ceil(ox + reach))
+            r0, r1 = max(0, math.floor(oy - reach)), min(self.rows, math.ceil(oy + reach))
+            walls = self.walls.query(ox - reach, oy - reach, ox + reach, oy + reach)
+        if r0 < r1 and c0 < c1:
+            ddx, ddy = self._xs[c0:c1] - ox, self._ys[r0:r1] - oy
+            d = np.hypot(ddx, ddy)
+            # A legtávolabbi sarokig elég sugarat lőni
+            radius = min(reach, math.hypot(max(ox, self.cols - ox), max(oy, self.rows - oy)))
+            rays = int(min(MAX_RAYS, max(MIN_RAYS, 2 * math.pi * radius * RAYS_PER_CELL)))
+            hit = cast_rays(ox, oy, walls, rays)
+            bins = np.rint(np.arctan2(ddy, ddx) * (rays / (2 * math.pi))).astype(int) % rays
+            mask[r0:r1, c0:c1] = d <= np.minimum(hit[bins], reach)
+            dist[r0:r1, c0:c1] = d
+        self._los[token_id] = (key, mask, dist)
+        return mask, dist
+
+    def _lit_cells(self) -> np.ndarray:
+        """A fényforrások (fényt hordozó tokenek) által megvilágított cellák uniója."""
+        sources = sorted((tid, t["x"], t["y"], t["light"]) for tid, t in self.tokens.items() if t["light"] > 0)
+        key = (self.walls.version, tuple(sources))
+        if self._lit is not None and self._lit[0] == key:
+            return self._lit[1]
+        lit = np.zeros((self.rows, self.cols), dtype=bool)
+        for tid, _, _, radius in sources:
+            mask, dist = self._line_of_sight(tid)
+            lit |= mask & (dist <= radius)
+        self._lit = (key, lit)
+        return lit
+
+    def visible(self, token_id: str) -> np.ndarray:
+        """A token által látott cellák (rows, cols) bool maszkja; KeyError ismeretlen tokennél."""
+        mask, dist = self._line_of_sight(token_id)
+        if self.lighting == "bright":
+            return mask
+        return mask & ((dist <= self.tokens[token_id]["darkvision"]) | self._lit_cells())
+
+    def party_view(self, token_ids: Optional[Iterable[str]] = None) -> np.ndarray:
+        """A megadott (alapból az összes) token látómezőinek uniója."""
+        view = np.zeros((self.rows, self.cols), dtype=bool)
+        for tid in (self.tokens if token_ids is None else token_ids):
+            view |= self.visible(tid)
+        return view
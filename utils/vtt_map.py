@@ -0,0 +1,252 @@
+import io
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from utils.aoe import template_cells
+from utils.fog import FogMask, FogOverlay, Region
+from utils.spatial import TokenGrid, opportunity_attacks
+from utils.state_db import StateDB
+from utils.vision import LIGHTING, VisionEngine
+
+# Pixel / rácsnégyzet (5 láb) alapértelmezés; térképenként átállítható
+DEFAULT_CELL_PX = int(os.getenv("VTT_CELL_PX", "50"))
+MAX_OVERLAY_CELL_PX = 16
+FEET_PER_CELL = 5
+# A token-index bucketje ennyi cella széles
+TOKEN_BUCKET_CELLS = 4
+
+
+class VttMap:
+    """Egy feltöltött térkép asztali modellje: rács, háború köde, falak, tokenek és
+    megvilágítás, StateDB-be mentve.
+
+    A kliensek a térkép eredeti pixel-koordinátáiban dolgoznak; a rács cell_px
+    pixelenként oszt egy 5 láb széles négyzetet. Távolságok (sötétlátás, fény) lábban.
+    """
+
+    def __init__(self, sha256: str, image_path: str, db: StateDB, namespace: str):
+        self.sha256 = sha256
+        with Image.open(image_path) as img:  # Csak a fejléc olvasódik be
+            self.width, self.height = img.size
+        self.db = db
+        self.namespace = namespace
+        self._overlays: Dict[int, FogOverlay] = {}
+        self._engine: Optional[VisionEngine] = None
+        self._lock = threading.Lock()
+        saved = db.get(namespace, sha256) or {}
+        self.cell_px = saved.get("cell_px", DEFAULT_CELL_PX)
+        self.walls: List[List[float]] = saved.get("walls", [])
+        self.tokens: Dict[str, dict] = saved.get("tokens", {})
+        self.lighting = saved.get("lighting", "bright")
+        self._build_index()
+        fog = saved.get("fog")
+        if fog and (fog["cols"], fog["rows"]) == (self.cols, self.rows):
+            self.fog = FogMask.from_dict(fog)
+        else:
+            self.fog = FogMask(self.cols, self.rows)
+
+    def _build_index(self):
+        """Token-index cella-koordinátákban (rácsváltáskor újraépül)."""
+        self.index = TokenGrid(TOKEN_BUCKET_CELLS)
+        for token_id, token in self.tokens.items():
+            self.index.move(token_id, token["x"] / self.cell_px, token["y"] / self.cell_px)
+
+    @property
+    def cols(self) -> int:
+        return math.ceil(self.width / self.cell_px)
+
+    @property
+    def rows(self) -> int:
+        return math.ceil(self.height / self.cell_px)
+
+    def grid(self) -> dict:
+        return {"width": self.width, "height": self.height, "cell_px": self.cell_px,
+                "cols": self.cols, "rows": self.rows}
+
+    def save(self):
+        self.db.put(self.namespace, self.sha256, {"cell_px": self.cell_px, "fog": self.fog.to_dict(),
+                                                  "walls": self.walls, "tokens": self.tokens,
+                                                  "lighting": self.lighting})
+
+    def set_grid(self, cell_px: int):
+        """Új rácsméret; a köd ilyenkor újraindul (teljesen takart)."""
+        with self._lock:
+            self.cell_px = cell_px
+            self.fog = FogMask(self.cols, self.rows, version=self.fog.version + 1)
+            self._overlays.clear()
+            self._engine = None
+            self._build_index()
+            self.save()
+
+    # --- Köd ---
+    def fog_op(self, shape: str, reveal: bool, x0: float = 0, y0: float = 0, x1: float = 0, y1: float = 0,
+               points=None, radius: float = 0) -> Optional[Region]:
+        """Felfedés / letakarás pixel-koordinátákkal; a változott cella-régió vagy None."""
+        s = 1.0 / self.cell_px
+        with self._lock:
+            if shape == "rect":
+                region = self.fog.rect(x0 * s, y0 * s, x1 * s, y1 * s, reveal)
+            elif shape == "circle":
+                region = self.fog.circle(x0 * s, y0 * s, radius * s, reveal)
+            elif shape == "polygon":
+                region = self.fog.polygon([(x * s, y * s) for x, y in points], reveal)
+            elif shape == "all":
+                region = self.fog.fill(reveal)
+            else:
+                raise ValueError(f"Ismeretlen alakzat: {shape}")
+            if region is not None:
+                self.save()
+            return region
+
+    def fog_png(self, cell_px: int = 1) -> bytes:
+        """A köd PNG rétegként (cellánként cell_px pixel); a kliens felnagyíthatja."""
+        cell_px = max(1, min(cell_px, MAX_OVERLAY_CELL_PX))
+        with self._lock:
+            overlay = self._overlays.setdefault(cell_px, FogOverlay(cell_px))
+            pixels = overlay.render(self.fog)
+            buf = io.BytesIO()
+            Image.fromarray(pixels, "RGBA").save(buf, "PNG", compress_level=1)
+        return buf.getvalue()
+
+    # --- Falak, tokenek, látómező ---
+    def _vision(self) -> VisionEngine:
+        """A látómotor a rács méretében, cellára váltott koordinátákkal (rácsváltáskor újraépül)."""
+        if self._engine is None:
+            s = 1.0 / self.cell_px
+            engine = VisionEngine(self.cols, self.rows, self.lighting)
+            engine.walls.set(np.asarray(self.walls, dtype=float).reshape(-1, 4) * s)
+            for token_id, token in self.tokens.items():
+                self._place(engine, token_id, token)
+            self._engine = engine
+        return self._engine
+
+    def _place(self, engine: VisionEngine, token_id: str, token: dict):
+        s = 1.0 / self.cell_px
+        engine.set_token(token_id, token["x"] * s, token["y"] * s,
+                         token["darkvision"] / FEET_PER_CELL, token["light"] / FEET_PER_CELL)
+
+    def set_walls(self, walls: Iterable[Iterable[float]]) -> bool:
+        """Az összes fal cseréje ([x0, y0, x1, y1] pixelben); True, ha változott."""
+        walls = [[float(v) for v in w] for w in walls]
+        if any(len(w) != 4 for w in walls):
+            raise ValueError("Egy fal négy koordináta: [x0, y0, x1, y1].")
+        with self._lock:
+            if walls == self.walls:
+                return False
+            self.walls = walls
+            self._vision().walls.set(np.asarray(walls, dtype=float).reshape(-1, 4) / self.cell_px)
+            self.save()
+            return True
+
+    def set_token(self, token_id: str, x: float, y: float, darkvision: Optional[int] = None,
+                  light: Optional[int] = None) -> dict:
+        """Token elhelyezése / mozgatása (a token középpontja pixelben); a meg nem adott látás marad."""
+        with self._lock:
+            old = self.tokens.get(token_id, {})
+            token = {"x": float(x), "y": float(y),
+                     "darkvision": old.get("darkvision", 0) if darkvision is None else darkvision,
+                     "light": old.get("light", 0) if light is None else light}
+            self.tokens[token_id] = token
+            self.index.move(token_id, token["x"] / self.cell_px, token["y"] / self.cell_px)
+            self._place(self._vision(), token_id, token)
+            self.save()
+            return token
+
+    def remove_token(self, token_id: str) -> bool:
+        with self._lock:
+            if self.tokens.pop(token_id, None) is None:
+                return False
+            self.index.remove(token_id)
+            self._vision().remove_token(token_id)
+            self.save()
+            return True
+
+    def set_lighting(self, lighting: str):
+        if lighting not in LIGHTING:
+            raise ValueError(f"Ismeretlen megvilágítás: {lighting}")
+        with self._lock:
+            self.lighting = lighting
+            self._vision().lighting = lighting
+            self.save()
+
+    def vision(self, token_ids: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, Dict[str, int]]:
+        """A tokenek közös látómezeje (rows, cols) + tokenenként a látott cellák száma.
+        KeyError ismeretlen tokennél."""
+        with self._lock:
+            engine = self._vision()
+            ids = list(engine.tokens if token_ids is None else token_ids)
+            view = np.zeros((self.rows, self.cols), dtype=bool)
+            counts = {}
+            for token_id in ids:
+                visible = engine.visible(token_id)
+                counts[token_id] = int(visible.sum())
+                view |= visible
+            return view, counts
+
+    def reveal_vision(self, token_ids: Optional[Iterable[str]] = None) -> Optional[Region]:
+        """A köd felszedése ott, ahová a tokenek ellátnak; a változott régió vagy None."""
+        view, _ = self.vision(token_ids)
+        with self._lock:
+            region = self.fog.reveal_mask(view)
+            if region is not None:
+                self.save()
+            return region
+
+    # --- AoE sablonok ---
+    def aoe(self, shape: str, x: float, y: float, size_ft: float, direction: float = 0.0,
+            width_ft: float = FEET_PER_CELL) -> dict:
+        """Az érintett cellák ([oszlop, sor]) és a bennük álló tokenek; a kiindulópont pixelben.
+        A jelölt tokeneket a token-index adja, csak azokat vetjük össze a cellamaszkkal."""
+        cp = self.cell_px
+        with self._lock:
+            region, inside = template_cells(shape, x / cp, y / cp, size_ft / FEET_PER_CELL, self.cols, self.rows,
+                                            direction, width_ft / FEET_PER_CELL)
+            if region is None:
+                return {"region": None, "cells": [], "tokens": []}
+            r0, c0, r1, c1 = region
+            rows, cols = np.nonzero(inside)
+            tokens = []
+            for token_id in self.index.query_rect(c0, r0, c1, r1):
+                tx, ty = self.index.positions[token_id]
+                col, row = int(tx), int(ty)
+                if r0 <= row < r1 and c0 <= col < c1 and inside[row - r0, col - c0]:
+                    tokens.append(token_id)
+            return {"region": list(region), "cells": np.stack([cols + c0, rows + r0], axis=1).tolist(),
+                    "tokens": sorted(tokens)}
+
+    # --- Közelség (elérés, aurák, alkalmi támadás) ---
+    def tokens_near(self, x: float, y: float, radius_ft: float, exclude: Optional[str] = None) -> List[dict]:
+        """A (pixel) ponttól legfeljebb radius_ft lábra álló tokenek, távolság szerint."""
+        with self._lock:
+            hits = self.index.within(x / self.cell_px, y / self.cell_px, int(radius_ft // FEET_PER_CELL), exclude)
+        return [{"id": t, "distance_ft": d * FEET_PER_CELL} for t, d in hits]
+
+    def around(self, token_id: str, radius_ft: float) -> List[dict]:
+        """A token körüli aura / elérés (pl. 10 láb); KeyError ismeretlen tokennél. Szomszédos: 5 láb."""
+        x, y = self.index.positions[token_id]
+        return self.tokens_near(x * self.cell_px, y * self.cell_px, radius_ft, exclude=token_id)
+
+    def nearest(self, token_id: str, k: int = 1) -> List[dict]:
+        """A k legközelebbi másik token; KeyError ismeretlen tokennél."""
+        with self._lock:
+            x, y = self.index.positions[token_id]
+            hits = self.index.nearest(x, y, k, exclude=token_id)
+        return [{"id": t, "distance_ft": d * FEET_PER_CELL} for t, d in hits]
+
+    def position(self, token_id: str) -> Optional[Tuple[float, float]]:
+        """A token cella-koordinátája (a kör eleji pozíció megjegyzéséhez), vagy None."""
+        return self.index.positions.get(token_id)
+
+    def opportunity_attacks(self, mover: str, start: Tuple[float, float], enemies: Dict[str, int]) -> List[str]:
+        """Akiknek az elérését (id -> láb) a mover a start cellától a mostani helyéig elhagyta."""
+        with self._lock:
+            end = self.index.positions.get(mover)
+            if end is None:
+                return []
+            reach = {t: max(1, ft // FEET_PER_CELL) for t, ft in enemies.items() if t in self.index}
+            return opportunity_attacks(self.index, mover, start, end, reach)